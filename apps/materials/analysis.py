@@ -0,0 +1,193 @@
+"""
+采购支出统计
+
+所有分组与求和都在一条 GROUP BY 查询中由数据库完成, 只返回分组结果;
+不按名称分组/过滤时改为查询 DailySpendRollup/MonthlySpendRollup 汇总表.
+"""
+import calendar
+import datetime
+import typing
+from decimal import Decimal
+
+from django.db import models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+from apps.materials.models import (
+    DailySpendRollup,
+    MonthlySpendRollup,
+    PurchaseRecord,
+)
+
+TIME_DIMENSIONS = ("day", "week", "month")
+DIMENSIONS = (*TIME_DIMENSIONS, "category", "supplier", "unit", "name")
+MEASURES = ("total_amount", "actual_paid", "quantity", "discount", "count")
+DEFAULT_MEASURES = ("total_amount", "actual_paid", "quantity", "discount")
+
+CENT = Decimal("0.01")
+
+# 汇总表中不存在的维度/过滤条件
+RECORD_ONLY_DIMENSIONS = {"name"}
+RECORD_ONLY_FILTERS = {"name"}
+
+
+def choose_source(
+    dimensions: typing.Sequence[str], query_data: dict
+) -> typing.Type[models.Model]:
+    """选择能回答本次统计的最小数据源"""
+    if RECORD_ONLY_DIMENSIONS.intersection(dimensions):
+        return PurchaseRecord
+    if any(query_data.get(name) not in (None, "") for name in RECORD_ONLY_FILTERS):
+        return PurchaseRecord
+
+    date_from: typing.Optional[datetime.date] = query_data.get("date_from")
+    date_to: typing.Optional[datetime.date] = query_data.get("date_to")
+    month_aligned = (date_from is None or date_from.day == 1) and (
+        date_to is None
+        or date_to.day == calendar.monthrange(date_to.year, date_to.month)[1]
+    )
+    if month_aligned and set(TIME_DIMENSIONS).intersection(dimensions) <= {"month"}:
+        return MonthlySpendRollup
+    return DailySpendRollup
+
+
+def date_field(source: typing.Type[models.Model]) -> str:
+    """数据源中表示日期的字段"""
+    return "date" if source is PurchaseRecord else "period"
+
+
+def dimension_columns(
+    source: typing.Type[models.Model], dimension: str
+) -> typing.Tuple[typing.Tuple[str, ...], typing.Dict[str, typing.Any]]:
+    """
+    维度对应的查询列
+
+    :return: (直接取值的字段名, {别名: 表达式})
+    """
+    date = date_field(source)
+    if dimension == "day":
+        return (), {"day": F(date)}
+    if dimension == "week":
+        return (), {"week": TruncWeek(date)}
+    if dimension == "month":
+        return (), {"month": F(date) if source is MonthlySpendRollup else TruncMonth(date)}
+    if dimension == "category":
+        return ("category_id",), {"category_name": F("category__name")}
+    if dimension == "supplier":
+        return ("supplier_id",), {"supplier_name": F("supplier__name")}
+    return (dimension,), {}
+
+
+def measure_expression(source: typing.Type[models.Model], measure: str):
+    if measure == "discount":
+        return Sum(F("total_amount") - F("actual_paid"))
+    if measure == "count":
+        return Count("id") if source is PurchaseRecord else Sum("record_count")
+    return Sum(measure)
+
+
+def output_columns(dimensions: typing.Sequence[str]) -> typing.List[str]:
+    """统计结果中维度部分的列名"""
+    columns = []
+    for dimension in dimensions:
+        fields, expressions = dimension_columns(PurchaseRecord, dimension)
+        columns.extend(fields)
+        columns.extend(expressions)
+    return columns
+
+
+def measure_aliases(measures: typing.Sequence[str]) -> typing.Dict[str, str]:
+    """聚合别名不能与模型字段同名, 查询时使用 sum_<指标名>, 查询后再改回指标名"""
+    return {f"sum_{measure}": measure for measure in measures}
+
+
+def grouped(
+    queryset: models.QuerySet,
+    dimensions: typing.Sequence[str],
+    measures: typing.Sequence[str],
+    order_by: typing.Sequence[str] = (),
+) -> models.QuerySet:
+    """按维度分组聚合的 values 查询集, 统计指标列名见 measure_aliases"""
+    source = queryset.model
+    columns, expressions = [], {}
+    for dimension in dimensions:
+        fields, _expressions = dimension_columns(source, dimension)
+        columns.extend(fields)
+        columns.extend(_expressions)
+        expressions.update(_expressions)
+
+    aliases = measure_aliases(measures)
+    reverse_aliases = {measure: alias for alias, measure in aliases.items()}
+    ordering = []
+    for name in order_by or columns:
+        descending = name.startswith("-")
+        column = reverse_aliases.get(name.lstrip("-"), name.lstrip("-"))
+        ordering.append(f"-{column}" if descending else column)
+    return (
+        queryset.order_by()
+        .annotate(**expressions)
+        .values(*columns)
+        .annotate(
+            **{alias: measure_expression(source, measure) for alias, measure in aliases.items()}
+        )
+        .order_by(*ordering)
+    )
+
+
+def aggregate(
+    queryset: models.QuerySet,
+    dimensions: typing.Sequence[str],
+    measures: typing.Sequence[str],
+    order_by: typing.Sequence[str] = (),
+) -> typing.List[dict]:
+    """
+    对已过滤的查询集执行一次分组聚合
+
+    :param queryset: PurchaseRecord 或汇总表的查询集
+    :param dimensions: 分组维度, 为空时对整个查询集求和
+    :param measures: 统计指标
+    :param order_by: 排序, 可使用维度列名或统计指标名, 默认按维度列升序
+    """
+    if not dimensions:
+        rows = [queryset.order_by().aggregate(**totals(queryset.model, measures))]
+    else:
+        rows = grouped(queryset, dimensions, measures, order_by)
+    return output_rows(rows, measures)
+
+
+async def aaggregate(
+    queryset: models.QuerySet,
+    dimensions: typing.Sequence[str],
+    measures: typing.Sequence[str],
+    order_by: typing.Sequence[str] = (),
+) -> typing.List[dict]:
+    """aggregate 的异步版本, 使用异步 ORM 查询"""
+    if not dimensions:
+        rows = [await queryset.order_by().aaggregate(**totals(queryset.model, measures))]
+    else:
+        rows = [row async for row in grouped(queryset, dimensions, measures, order_by)]
+    return output_rows(rows, measures)
+
+
+def totals(source: typing.Type[models.Model], measures: typing.Sequence[str]) -> dict:
+    """不分组时对整个查询集求和的聚合表达式"""
+    return {
+        alias: measure_expression(source, measure)
+        for alias, measure in measure_aliases(measures).items()
+    }
+
+
+def output_rows(rows: typing.Iterable[dict], measures: typing.Sequence[str]) -> typing.List[dict]:
+    """把统计指标列名改回指标名, 并统一小数位数"""
+    aliases = measure_aliases(measures)
+    return [
+        {aliases.get(key, key): normalize(value) for key, value in row.items()}
+        for row in rows
+    ]
+
+
+def normalize(value):
+    """SQLite 等数据库求和后会丢失小数位数, 统一保留两位小数"""
+    if isinstance(value, Decimal):
+        return value.quantize(CENT)
+    return value
@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class MaterialsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'materials'
+    name = 'apps.materials'
+
+    def ready(self):
+        import apps.materials.policies
+        import apps.materials.signals
@@ -0,0 +1,37 @@
+"""
+采购记录导出
+
+使用 values_list + iterator 分批读取, 不创建模型实例, 供导出接口和 export_purchase_records 命令使用
+"""
+import typing
+
+from django.db import models
+
+from utils.export import Column
+
+COLUMNS: typing.Tuple[Column, ...] = (
+    Column("date", "日期", "date"),
+    Column("category", "类别", "category__name"),
+    Column("name", "名称", "name"),
+    Column("specification", "规格", "specification"),
+    Column("unit", "单位", "unit"),
+    Column("quantity", "数量", "quantity"),
+    Column("unit_price", "单价", "unit_price"),
+    Column("total_amount", "应付金额", "total_amount"),
+    Column("actual_paid", "实付", "actual_paid"),
+    Column("supplier", "供货商", "supplier__name"),
+    Column("notes", "备注", "notes"),
+)
+
+CHUNK_SIZE = 2000
+
+
+def export_rows(
+    queryset: models.QuerySet,
+    columns: typing.Sequence[Column] = COLUMNS,
+    chunk_size: int = CHUNK_SIZE,
+) -> typing.Iterator[tuple]:
+    """按列逐行读取已过滤/排序的采购记录"""
+    return queryset.values_list(
+        *(column.lookup for column in columns)
+    ).iterator(chunk_size=chunk_size)
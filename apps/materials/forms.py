@@ -0,0 +1,39 @@
+from django import forms
+from django.core.exceptions import ValidationError
+
+from apps.materials import analysis
+from constants.code import Code
+
+
+class PurchaseRecordQueryForm(forms.Form):
+    """采购记录的过滤参数"""
+    date_from = forms.DateField(required=False)
+    date_to = forms.DateField(required=False)
+    category = forms.IntegerField(required=False)
+    supplier = forms.IntegerField(required=False)
+    name = forms.CharField(required=False, max_length=100)
+    unit = forms.CharField(required=False, max_length=20)
+
+
+class SpendAnalysisQueryForm(PurchaseRecordQueryForm):
+    """采购支出统计参数, 多个维度/指标用英语逗号隔开"""
+    group_by = forms.CharField(required=False)
+    measures = forms.CharField(required=False)
+
+    @staticmethod
+    def split(value: str) -> list:
+        return [item.strip() for item in value.split(",") if item.strip()]
+
+    def clean_group_by(self) -> list:
+        dimensions = self.split(self.cleaned_data["group_by"])
+        if not set(dimensions) <= set(analysis.DIMENSIONS) or len(set(dimensions)) != len(dimensions):
+            raise ValidationError(Code.message(Code.分组维度不正确))
+        if len(set(analysis.TIME_DIMENSIONS).intersection(dimensions)) > 1:
+            raise ValidationError(Code.message(Code.分组维度不正确))
+        return dimensions
+
+    def clean_measures(self) -> list:
+        measures = self.split(self.cleaned_data["measures"]) or list(analysis.DEFAULT_MEASURES)
+        if not set(measures) <= set(analysis.MEASURES) or len(set(measures)) != len(measures):
+            raise ValidationError(Code.message(Code.统计指标不正确))
+        return measures
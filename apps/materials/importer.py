@@ -0,0 +1,242 @@
+"""
+采购记录批量导入
+
+表格逐块解析; 每块内先校验所有行, 类别/供货商按名称一次查询并 bulk_create(ignore_conflicts=True)
+补齐, 应付金额在内存中计算, 再在一个事务中 bulk_create 采购记录并增量更新汇总表.
+不合法的行记录行号与错误原因后跳过, 不影响同一块中的其他行.
+"""
+import csv
+import datetime
+import io
+import itertools
+import os
+import typing
+from decimal import Decimal, InvalidOperation
+
+from django.db import models, transaction
+from django.utils.dateparse import parse_date
+
+from apps.materials import rollups
+from apps.materials.export import COLUMNS
+from apps.materials.models import Category, PurchaseRecord, Supplier, calculate_total_amount
+from utils.counting import CachedCount
+
+# 表头 -> 字段, 兼容导出文件的中英文表头; total_amount 总是重新计算
+HEADERS: typing.Dict[str, str] = {
+    **{column.title: column.key for column in COLUMNS},
+    **{column.key: column.key for column in COLUMNS},
+}
+REQUIRED = ("date", "category", "name", "unit", "quantity", "unit_price", "actual_paid", "supplier")
+DATE_FORMATS = ("%Y/%m/%d", "%Y.%m.%d", "%Y%m%d")
+CENT = Decimal("0.01")
+
+
+class RowError(typing.NamedTuple):
+    # 表格中的行号(含表头, 从 1 开始)
+    line: int
+    errors: typing.Dict[str, str]
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors: typing.List[RowError] = []
+
+    @property
+    def failed(self) -> int:
+        return len(self.errors)
+
+
+def read_csv(file: typing.BinaryIO) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    reader = csv.DictReader(io.TextIOWrapper(file, encoding="utf-8-sig", newline=""))
+    yield from reader
+
+
+def read_xlsx(file: typing.BinaryIO) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+    try:
+        import openpyxl
+    except ImportError:
+        raise ImportError("导入 xlsx 文件需要安装 openpyxl")
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        for row in rows:
+            yield dict(zip(header, row))
+    finally:
+        workbook.close()
+
+
+READERS = {"csv": read_csv, "xlsx": read_xlsx}
+
+
+def read_file(path: str, file_format: typing.Optional[str] = None) -> typing.Iterator[dict]:
+    """按扩展名(或指定格式)逐行读取表格"""
+    file_format = file_format or os.path.splitext(path)[1].lstrip(".").lower()
+    if file_format not in READERS:
+        raise ValueError(f"不支持的文件格式: {file_format}")
+    with open(path, "rb") as file:
+        yield from READERS[file_format](file)
+
+
+class PurchaseImporter:
+    """
+    用法::
+
+        result = PurchaseImporter().import_rows(read_file("2024.csv"))
+        result.created, result.errors
+    """
+
+    def __init__(self, chunk_size: int = 5000, batch_size: int = 1000):
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        # 名称 -> id, 跨块复用, 已知名称不再查询
+        self.categories: typing.Dict[str, int] = {}
+        self.suppliers: typing.Dict[str, int] = {}
+        self.max_lengths = {
+            name: PurchaseRecord._meta.get_field(name).max_length
+            for name in ("name", "specification", "unit")
+        }
+        self.max_lengths["category"] = Category._meta.get_field("name").max_length
+        self.max_lengths["supplier"] = Supplier._meta.get_field("name").max_length
+        self.max_amount = Decimal(10) ** (
+            PurchaseRecord._meta.get_field("total_amount").max_digits
+            - PurchaseRecord._meta.get_field("total_amount").decimal_places
+        )
+
+    def import_rows(self, rows: typing.Iterable[dict]) -> ImportResult:
+        result = ImportResult()
+        # 表头占第 1 行
+        numbered = enumerate(rows, start=2)
+        while True:
+            chunk = list(itertools.islice(numbered, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk, result)
+        return result
+
+    def import_chunk(self, chunk: typing.List[typing.Tuple[int, dict]], result: ImportResult) -> None:
+        cleaned = []
+        for line, row in chunk:
+            data, errors = self.clean_row(row)
+            if errors:
+                result.errors.append(RowError(line, errors))
+            else:
+                cleaned.append(data)
+        if not cleaned:
+            return
+
+        with transaction.atomic():
+            self.resolve(Category, self.categories, {data["category"] for data in cleaned})
+            self.resolve(Supplier, self.suppliers, {data["supplier"] for data in cleaned})
+            records = [
+                PurchaseRecord(
+                    date=data["date"],
+                    category_id=self.categories[data["category"]],
+                    supplier_id=self.suppliers[data["supplier"]],
+                    name=data["name"],
+                    specification=data["specification"],
+                    unit=data["unit"],
+                    quantity=data["quantity"],
+                    unit_price=data["unit_price"],
+                    actual_paid=data["actual_paid"],
+                    notes=data["notes"],
+                )
+                for data in cleaned
+            ]
+            PurchaseRecord.objects.bulk_create(records, batch_size=self.batch_size)
+            rollups.add_records(records)
+        CachedCount.invalidate(PurchaseRecord)
+        result.created += len(records)
+
+    def resolve(
+        self, model: typing.Type[models.Model], cache: typing.Dict[str, int], names: set
+    ) -> None:
+        """按名称取得 id, 不存在的一次性创建"""
+        missing = names - cache.keys()
+        if not missing:
+            return
+        cache.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+        missing -= cache.keys()
+        if missing:
+            model.objects.bulk_create(
+                [model(name=name) for name in missing],
+                batch_size=self.batch_size,
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts 时数据库不一定返回主键, 重新查询
+            cache.update(model.objects.filter(name__in=missing).values_list("name", "id"))
+
+    def clean_row(self, row: dict) -> typing.Tuple[dict, typing.Dict[str, str]]:
+        data = {
+            HEADERS[header.strip()]: value
+            for header, value in row.items()
+            if header and header.strip() in HEADERS
+        }
+        errors = {}
+        for name in REQUIRED:
+            if data.get(name) in (None, ""):
+                errors[name] = "不能为空"
+
+        for name in ("category", "supplier", "name", "specification", "unit", "notes"):
+            value = data.get(name)
+            data[name] = "" if value is None else str(value).strip()
+            max_length = self.max_lengths.get(name)
+            if max_length and len(data[name]) > max_length:
+                errors[name] = f"不能超过{max_length}个字符"
+
+        if "date" not in errors:
+            data["date"] = self.clean_date(data["date"])
+            if data["date"] is None:
+                errors["date"] = "日期格式不正确"
+
+        for name in ("quantity", "unit_price", "actual_paid"):
+            if name in errors:
+                continue
+            data[name] = self.clean_decimal(data[name])
+            if data[name] is None:
+                errors[name] = "数字格式不正确"
+            elif abs(data[name]) >= self.max_amount:
+                errors[name] = "数值过大"
+
+        if not errors:
+            data["total_amount"] = calculate_total_amount(data["quantity"], data["unit_price"])
+            if abs(data["total_amount"]) >= self.max_amount:
+                errors["total_amount"] = "数值过大"
+        return data, errors
+
+    @staticmethod
+    def clean_date(value) -> typing.Optional[datetime.date]:
+        if isinstance(value, datetime.datetime):
+            return value.date()
+        if isinstance(value, datetime.date):
+            return value
+        value = str(value).strip()
+        try:
+            date = parse_date(value)
+        except ValueError:
+            return None
+        if date is not None:
+            return date
+        for date_format in DATE_FORMATS:
+            try:
+                return datetime.datetime.strptime(value, date_format).date()
+            except ValueError:
+                continue
+        return None
+
+    @staticmethod
+    def clean_decimal(value) -> typing.Optional[Decimal]:
+        if isinstance(value, float):
+            value = repr(value)
+        try:
+            number = Decimal(str(value).strip().replace(",", ""))
+        except InvalidOperation:
+            return None
+        if not number.is_finite():
+            return None
+        try:
+            return number.quantize(CENT)
+        except InvalidOperation:
+            # 位数超出 Decimal 精度, 保留原值由调用方按数值过大处理
+            return number
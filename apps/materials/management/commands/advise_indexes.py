@@ -0,0 +1,213 @@
+import datetime
+import random
+import typing
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import NotSupportedError, connection, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.test import RequestFactory
+
+from apps.materials import analysis, rollups
+from apps.materials.models import Category, MonthlySpendRollup, PurchaseRecord, Supplier
+from apps.materials.views import (
+    PurchaseRecordExportView,
+    PurchaseRecordListView,
+    SpendAnalysisView,
+)
+from apps.user.models import TokenUser, User
+from utils.explain import FILESORT, explain
+from utils.paginator import CursorPaginator
+
+UNITS = ("kg", "箱", "袋", "件", "桶", "瓶")
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "对采购记录列表/导出/统计接口和后台列表的代表性查询执行 EXPLAIN, "
+        "标出全表扫描(seq_scan)和额外排序(filesort)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=0,
+            metavar="N",
+            help="先写入 N 条随机采购记录并收集统计信息, 检查结束后回滚; 默认使用现有数据",
+        )
+        parser.add_argument(
+            "--strict",
+            action="store_true",
+            help="存在全表扫描或额外排序时以非零状态退出",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options["seed"]:
+                    self.seed(options["seed"])
+                    self.analyze()
+                warnings = self.check_queries(options["verbosity"])
+                if options["seed"]:
+                    raise Rollback()
+        except Rollback:
+            pass
+        except NotSupportedError as e:
+            raise CommandError(str(e))
+
+        if warnings and options["strict"]:
+            raise CommandError(f"{warnings} 条查询未能完全利用索引")
+
+    def check_queries(self, verbosity: int) -> int:
+        sample = PurchaseRecord.objects.order_by("-date").first()
+        if sample is None:
+            raise CommandError("没有采购记录, 请使用 --seed 写入测试数据")
+
+        warnings = 0
+        for title, queryset, allowed in self.queries(sample):
+            result = explain(queryset)
+            problems = [finding for finding in result.findings if finding.kind not in allowed]
+            if problems:
+                warnings += 1
+                self.stdout.write(self.style.WARNING(f"[WARN] {title}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"[OK]   {title}"))
+            for finding in result.findings:
+                note = "" if finding in problems else " (预期)"
+                self.stdout.write(f"    {finding.kind}: {finding.detail}{note}")
+            if verbosity > 1:
+                self.stdout.write("    " + result.plan.replace("\n", "\n    "))
+        return warnings
+
+    def queries(
+        self, sample: PurchaseRecord
+    ) -> typing.Iterator[typing.Tuple[str, typing.Any, typing.Container[str]]]:
+        """
+        接口与后台实际会执行的查询
+
+        :return: (说明, 查询集, 可接受的问题类型)
+        """
+        month = sample.date.replace(day=1)
+        filters = {
+            "日期范围": {"date_from": month, "date_to": sample.date},
+            "类别": {"category": sample.category_id},
+            "供货商": {"supplier": sample.supplier_id},
+            "单位": {"unit": sample.unit},
+            "名称": {"name": sample.name},
+            "类别+日期范围": {"category": sample.category_id, "date_from": month},
+        }
+
+        view, queryset = self.view_queryset(PurchaseRecordListView, {})
+        paginator = CursorPaginator(queryset, view.order_by, 30)
+        yield "列表: 第一页", paginator.get_queryset(None, False), ()
+        cursor = paginator.page().next_cursor
+        if cursor:
+            _, values = paginator.decode(cursor)
+            yield "列表: 游标下一页", paginator.get_queryset(values, False), ()
+        for name, params in filters.items():
+            view, queryset = self.view_queryset(PurchaseRecordListView, params)
+            paginator = CursorPaginator(queryset, view.order_by, 30)
+            yield f"列表: 按{name}过滤", paginator.get_queryset(None, False), ()
+
+        for name in ("类别", "日期范围"):
+            view, queryset = self.view_queryset(PurchaseRecordExportView, filters[name])
+            yield f"导出: 按{name}过滤", queryset.order_by(*view.order_by), ()
+
+        for params in (
+            {"group_by": "month,category"},
+            {"group_by": "day,supplier", "date_from": month},
+            {"group_by": "category", "name": sample.name},
+        ):
+            view, queryset = self.view_queryset(SpendAnalysisView, params)
+            query_data = view.get_query_data(view.request)
+            view.Model = analysis.choose_source(query_data["group_by"], query_data)
+            view.date_field = analysis.date_field(view.Model)
+            queryset = view.filter_queryset(view.get_init_queryset(), query_data)
+            # 排序的是分组后的结果(按类别名称等关联列), 行数为分组数, 无需索引
+            yield (
+                f"统计: {params['group_by']} ({view.Model._meta.model_name})",
+                analysis.grouped(queryset, query_data["group_by"], query_data["measures"]),
+                (FILESORT,),
+            )
+
+        # 后台列表: 按模型默认排序并追加主键, 列表中显示类别和供货商
+        admin_queryset = PurchaseRecord.objects.select_related("category", "supplier")
+        admin_ordering = [*PurchaseRecord._meta.ordering, "-pk"]
+        next_month = (month + datetime.timedelta(days=32)).replace(day=1)
+        admin_filters = {
+            "列表": {},
+            "日期层级(月)": {"date__gte": month, "date__lt": next_month},
+            "按类别筛选": {"category_id": sample.category_id},
+            "按供货商筛选": {"supplier_id": sample.supplier_id},
+            "按单位筛选": {"unit": sample.unit},
+        }
+        for name, lookups in admin_filters.items():
+            yield (
+                f"后台: {name}",
+                admin_queryset.filter(**lookups).order_by(*admin_ordering)[:100],
+                (),
+            )
+
+        rebuild_queryset = (
+            PurchaseRecord.objects.order_by()
+            .annotate(period=TruncMonth("date"))
+            .values("period", "category_id", "supplier_id", "unit")
+            .annotate(**{f"sum_{name}": Sum(name) for name in rollups.MEASURES})
+        )
+        yield "汇总表重建(月)", rebuild_queryset, ()
+        rollup_queryset = MonthlySpendRollup.objects.filter(
+            period=month,
+            category_id=sample.category_id,
+            supplier_id=sample.supplier_id,
+            unit=sample.unit,
+        )
+        yield "汇总表: 增量更新定位", rollup_queryset, ()
+
+    @staticmethod
+    def view_queryset(view_class, params: dict):
+        """按 GET 参数构造视图并得到过滤后的查询集, 与接口中的处理一致"""
+        request = RequestFactory().get("/", params)
+        # 员工可以查看全部采购数据, 行级权限策略不增加查询条件
+        request.user = TokenUser({"user_id": 0, "level": User.LEVEL.员工})
+        view = view_class()
+        view.setup(request)
+        view.request = request
+        queryset = view.filter_queryset(view.get_init_queryset(), view.get_query_data(request))
+        return view, queryset
+
+    def seed(self, count: int) -> None:
+        rand = random.Random(0)
+        categories = Category.objects.bulk_create(
+            [Category(name=f"advise-category-{i}") for i in range(20)]
+        )
+        suppliers = Supplier.objects.bulk_create(
+            [Supplier(name=f"advise-supplier-{i}") for i in range(50)]
+        )
+        start = datetime.date.today() - datetime.timedelta(days=730)
+        records = [
+            PurchaseRecord(
+                date=start + datetime.timedelta(days=rand.randrange(730)),
+                category=rand.choice(categories),
+                supplier=rand.choice(suppliers),
+                name=f"商品{rand.randrange(500)}",
+                unit=rand.choice(UNITS),
+                quantity=Decimal(rand.randrange(1, 10000)) / 100,
+                unit_price=Decimal(rand.randrange(1, 100000)) / 100,
+                actual_paid=Decimal(rand.randrange(1, 100000)) / 100,
+            )
+            for _ in range(count)
+        ]
+        PurchaseRecord.objects.bulk_create(records, batch_size=1000)
+        rollups.rebuild()
+
+    @staticmethod
+    def analyze() -> None:
+        """收集统计信息, 使查询计划接近真实数据量下的选择"""
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
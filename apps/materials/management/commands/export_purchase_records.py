@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.materials import export as purchase_export
+from apps.materials.forms import PurchaseRecordQueryForm
+from apps.materials.views import PurchaseRecordExportView
+from utils import export
+from utils.api_exception import ApiError
+
+
+class Command(BaseCommand):
+    help = "流式导出采购记录, 过滤参数与导出接口相同"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=sorted(export.FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="输出文件, 默认输出到标准输出")
+        parser.add_argument("--chunk-size", type=int, default=purchase_export.CHUNK_SIZE)
+        for name in PurchaseRecordQueryForm.base_fields:
+            parser.add_argument(f"--{name.replace('_', '-')}", dest=name)
+
+    def handle(self, *args, **options):
+        view = PurchaseRecordExportView()
+        # 命令行导出没有当前用户, 不按行级权限策略限定
+        view.policy_action = None
+        query = {
+            name: options[name]
+            for name in PurchaseRecordQueryForm.base_fields
+            if options[name] is not None
+        }
+        form = PurchaseRecordQueryForm(query)
+        if not form.is_valid():
+            raise CommandError(form.errors.as_text())
+        try:
+            queryset = view.filter_queryset(view.get_init_queryset(), form.cleaned_data)
+        except ApiError as e:
+            raise CommandError(e.message)
+
+        rows = purchase_export.export_rows(
+            queryset.order_by(*view.order_by), chunk_size=options["chunk_size"]
+        )
+        stream = export.FORMATS[options["format"]].stream(purchase_export.COLUMNS, rows)
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                for chunk in stream:
+                    output.write(chunk)
+        else:
+            for chunk in stream:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -0,0 +1,68 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.materials import rollups
+from apps.materials.synthetic import SyntheticData, generate
+
+
+class Command(BaseCommand):
+    help = "生成合成的类别、供货商和采购记录, 用于性能测试; 相同参数和种子生成相同数据"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--records", type=int, default=100000, help="采购记录条数")
+        parser.add_argument("--categories", type=int, default=20, help="类别数")
+        parser.add_argument("--suppliers", type=int, default=500, help="供货商数")
+        parser.add_argument("--items", type=int, default=2000, help="商品数")
+        parser.add_argument("--seed", type=int, default=0, help="随机种子")
+        parser.add_argument(
+            "--start", type=datetime.date.fromisoformat, default=datetime.date(2022, 1, 1), help="最早日期"
+        )
+        parser.add_argument("--days", type=int, default=3 * 365, help="日期跨度(天)")
+        parser.add_argument("--chunk-size", type=int, default=10000, help="每个事务写入的行数")
+        parser.add_argument("--no-rollups", action="store_true", help="不重建采购汇总表")
+        parser.add_argument(
+            "--fast",
+            action="store_true",
+            help="SQLite 下关闭同步写盘和回滚日志以加快写入, 中途失败可能损坏数据库文件",
+        )
+
+    def handle(self, *args, **options):
+        for name in ("records", "categories", "suppliers", "items", "days", "chunk_size"):
+            if options[name] <= 0:
+                raise CommandError(f"--{name.replace('_', '-')} 必须大于 0")
+        data = SyntheticData(
+            categories=options["categories"],
+            suppliers=options["suppliers"],
+            items=options["items"],
+            start=options["start"],
+            days=options["days"],
+            seed=options["seed"],
+        )
+        if options["fast"] and connection.vendor == "sqlite":
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous = OFF")
+                cursor.execute("PRAGMA journal_mode = MEMORY")
+
+        total = options["records"]
+        start = time.perf_counter()
+
+        def progress(created: int) -> None:
+            if created == total or created % (options["chunk_size"] * 10) == 0:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{created}/{total} ({created / elapsed:.0f} 行/秒)")
+
+        created = generate(
+            data,
+            total,
+            chunk_size=options["chunk_size"],
+            progress=progress,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(f"生成 {created} 行, 耗时 {time.perf_counter() - start:.1f} 秒")
+        )
+        if not options["no_rollups"]:
+            for table, count in rollups.rebuild().items():
+                self.stdout.write(self.style.SUCCESS(f"{table}: {count} rows"))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.materials.importer import READERS, PurchaseImporter, read_file
+
+
+class Command(BaseCommand):
+    help = "批量导入采购记录表格(csv/xlsx), 表头可使用导出文件的中英文列名"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="表格文件路径")
+        parser.add_argument("--format", choices=sorted(READERS), help="默认按扩展名判断")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="每次校验并写入的行数")
+        parser.add_argument("--batch-size", type=int, default=1000, help="每条 INSERT 的行数")
+        parser.add_argument("--max-errors", type=int, default=100, help="最多输出多少条错误")
+
+    def handle(self, *args, **options):
+        importer = PurchaseImporter(
+            chunk_size=options["chunk_size"], batch_size=options["batch_size"]
+        )
+        try:
+            result = importer.import_rows(read_file(options["path"], options["format"]))
+        except (OSError, ValueError, ImportError) as e:
+            raise CommandError(str(e))
+
+        for error in result.errors[: options["max_errors"]]:
+            detail = "; ".join(f"{field}: {message}" for field, message in error.errors.items())
+            self.stderr.write(f"第{error.line}行: {detail}")
+        self.stdout.write(
+            self.style.SUCCESS(f"导入 {result.created} 行, 失败 {result.failed} 行")
+        )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from apps.materials import rollups
+
+
+class Command(BaseCommand):
+    help = "根据采购记录全量重建采购汇总表"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--period",
+            choices=["day", "month"],
+            action="append",
+            help="只重建指定周期的汇总表, 可重复指定, 默认全部重建",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="每批写入的汇总行数",
+        )
+
+    def handle(self, *args, **options):
+        periods = options["period"]
+        models = [
+            model for model in rollups.ROLLUP_MODELS
+            if not periods or model.PERIOD in periods
+        ]
+        result = rollups.rebuild(models, batch_size=options["batch_size"])
+        for table, count in result.items():
+            self.stdout.write(self.style.SUCCESS(f"{table}: {count} rows"))
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+import django.db.models.deletion
+import utils.models
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='类别名称')),
+                ('description', models.TextField(blank=True, verbose_name='类别描述')),
+            ],
+            options={
+                'verbose_name': '商品类别',
+                'verbose_name_plural': '商品类别',
+            },
+            bases=(models.Model, utils.models.ModelSerializationMixin, utils.models.ModelUpdateMixin),
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True, verbose_name='供货商名称')),
+                ('contact_person', models.CharField(blank=True, max_length=50, verbose_name='联系人')),
+                ('phone', models.CharField(blank=True, max_length=20, verbose_name='联系电话')),
+                ('address', models.TextField(blank=True, verbose_name='地址')),
+            ],
+            options={
+                'verbose_name': '供货商',
+                'verbose_name_plural': '供货商',
+            },
+            bases=(models.Model, utils.models.ModelSerializationMixin, utils.models.ModelUpdateMixin),
+        ),
+        migrations.CreateModel(
+            name='PurchaseRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('name', models.CharField(max_length=100, verbose_name='名称')),
+                ('specification', models.CharField(blank=True, max_length=100, verbose_name='规格')),
+                ('unit', models.CharField(max_length=20, verbose_name='单位')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='数量')),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='单价')),
+                ('actual_paid', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='实付')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), editable=False, max_digits=10, verbose_name='应付金额')),
+                ('notes', models.TextField(blank=True, verbose_name='备注')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='创建时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='materials.category', verbose_name='类别')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='materials.supplier', verbose_name='供货商')),
+            ],
+            options={
+                'verbose_name': '采购记录',
+                'verbose_name_plural': '采购记录',
+                'ordering': ['-date', '-created_at'],
+            },
+            bases=(models.Model, utils.models.ModelSerializationMixin, utils.models.ModelUpdateMixin),
+        ),
+        migrations.CreateModel(
+            name='MonthlySpendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='统计周期')),
+                ('unit', models.CharField(max_length=20, verbose_name='单位')),
+                ('quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='数量合计')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='应付金额合计')),
+                ('actual_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='实付合计')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='采购记录数')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='materials.category', verbose_name='类别')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='materials.supplier', verbose_name='供货商')),
+            ],
+            options={
+                'verbose_name': '采购月汇总',
+                'verbose_name_plural': '采购月汇总',
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('period', 'category', 'supplier', 'unit'), name='materials_monthlyspendrollup_unique_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySpendRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(verbose_name='统计周期')),
+                ('unit', models.CharField(max_length=20, verbose_name='单位')),
+                ('quantity', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='数量合计')),
+                ('total_amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='应付金额合计')),
+                ('actual_paid', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=20, verbose_name='实付合计')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='采购记录数')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='materials.category', verbose_name='类别')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='materials.supplier', verbose_name='供货商')),
+            ],
+            options={
+                'verbose_name': '采购日汇总',
+                'verbose_name_plural': '采购日汇总',
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(fields=('period', 'category', 'supplier', 'unit'), name='materials_dailyspendrollup_unique_key')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='purchaserecord',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='materials.category', verbose_name='类别'),
+        ),
+        migrations.AlterField(
+            model_name='purchaserecord',
+            name='supplier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='materials.supplier', verbose_name='供货商'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserecord',
+            index=models.Index(fields=['date', 'created_at', 'id'], name='purchase_date_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserecord',
+            index=models.Index(fields=['category', 'date', 'created_at', 'id'], name='purchase_category_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserecord',
+            index=models.Index(fields=['supplier', 'date', 'created_at', 'id'], name='purchase_supplier_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserecord',
+            index=models.Index(fields=['unit', 'date', 'created_at', 'id'], name='purchase_unit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserecord',
+            index=models.Index(fields=['name', 'date', 'created_at', 'id'], name='purchase_name_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchaserecord',
+            index=models.Index(fields=['category', 'supplier', 'unit', 'date', 'quantity', 'total_amount', 'actual_paid'], name='purchase_rollup_cover_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('materials', '0002_purchase_record_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='purchaserecord',
+            name='purchase_name_date_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='purchaserecord',
+            name='purchase_rollup_cover_idx',
+        ),
+    ]
@@ -1,10 +1,17 @@
-from django.db import models
-from decimal import Decimal
+import datetime
+import typing
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
 
-from utils.models import ModelUpdateMixin
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.expressions import Combinable
+from django.db.models.functions import Round, TruncMonth
 
+from utils.models import ModelSerializationMixin, ModelUpdateMixin
 
-class Category(models.Model, ModelUpdateMixin):
+
+class Category(models.Model, ModelSerializationMixin, ModelUpdateMixin):
     """商品类别"""
     name = models.CharField(max_length=50, verbose_name="类别名称", unique=True)
     description = models.TextField(blank=True, verbose_name="类别描述")
@@ -17,7 +24,7 @@ class Category(models.Model, ModelUpdateMixin):
         return self.name
 
 
-class Supplier(models.Model, ModelUpdateMixin):
+class Supplier(models.Model, ModelSerializationMixin, ModelUpdateMixin):
     """供货商"""
     name = models.CharField(max_length=100, verbose_name="供货商名称", unique=True)
     contact_person = models.CharField(max_length=50, blank=True, verbose_name="联系人")
@@ -32,12 +39,119 @@ class Supplier(models.Model, ModelUpdateMixin):
         return self.name
 
 
-class PurchaseRecord(models.Model, ModelUpdateMixin):
+# 参与计算应付金额的字段
+TOTAL_AMOUNT_SOURCES = frozenset({"quantity", "unit_price"})
+# 影响汇总表的字段(update 也可以用外键的列名)
+ROLLUP_SOURCES = frozenset(
+    {"date", "category", "category_id", "supplier", "supplier_id", "unit", "quantity", "total_amount", "actual_paid"}
+)
+
+
+def calculate_total_amount(quantity: Decimal, unit_price: Decimal) -> Decimal:
+    """应付金额 = 数量 × 单价, 四舍五入到分; 兼容赋值为 int/float 的字段"""
+    amount = Decimal(str(quantity)) * Decimal(str(unit_price))
+    return amount.quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+class PurchaseRecordQuerySet(models.QuerySet):
+    """
+    绕过 save 的批量写入同样维护应付金额:
+
+    * bulk_create: 写入前为每个对象计算 total_amount
+    * bulk_update: 更新数量或单价时一并计算并更新 total_amount
+    * update: 修改数量或单价时在同一条 UPDATE 中设置 total_amount
+
+    bulk_update/update 修改了汇总字段时, 在同一事务中锁定受影响的记录, 在数据库中按汇总键聚合修改前后的值,
+    将差值写入汇总表(apps.materials.rollups); delete 在删除前按汇总键聚合一次, 不再由 post_delete 逐条更新;
+    bulk_create 后仍需调用方调用 rollups.add_records
+    """
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = list(objs)
+        for obj in objs:
+            obj.total_amount = calculate_total_amount(obj.quantity, obj.unit_price)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        # Django 的 bulk_update 按批调用 update, 汇总表在 update 中维护
+        objs, fields = list(objs), list(fields)
+        if TOTAL_AMOUNT_SOURCES.intersection(fields):
+            for obj in objs:
+                obj.total_amount = calculate_total_amount(obj.quantity, obj.unit_price)
+            if "total_amount" not in fields:
+                fields.append("total_amount")
+        return super().bulk_update(objs, fields, *args, **kwargs)
+
+    def update(self, **kwargs):
+        from apps.materials import rollups
+
+        if TOTAL_AMOUNT_SOURCES.intersection(kwargs) and "total_amount" not in kwargs:
+            kwargs["total_amount"] = self.total_amount_expression(kwargs)
+        if not ROLLUP_SOURCES.intersection(kwargs):
+            return super().update(**kwargs)
+        with transaction.atomic(using=self.db):
+            # 先锁定记录, 在数据库中分别按修改前、修改后的值聚合, 查询次数与行数无关
+            locked = self.locked()
+            deltas = rollups.aggregate_deltas(defaultdict(rollups.Delta), locked, -1)
+            rollups.aggregate_deltas(deltas, locked, 1, kwargs)
+            updated = super().update(**kwargs)
+            rollups.apply_deltas(deltas)
+        return updated
+
+    update.alters_data = True
+
+    def delete(self):
+        from apps.materials import rollups
+
+        with transaction.atomic(using=self.db):
+            deltas = rollups.aggregate_deltas(defaultdict(rollups.Delta), self.locked(), -1)
+            token = rollups.bulk_deleting.set(True)
+            try:
+                deleted = super().delete()
+            finally:
+                rollups.bulk_deleting.reset(token)
+            rollups.apply_deltas(deltas)
+        return deleted
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def locked(self) -> "PurchaseRecordQuerySet":
+        """
+        在当前事务中锁定这些记录(数据库支持 SELECT ... FOR UPDATE 时), 返回按主键子查询过滤的查询集.
+        FOR UPDATE 不能与 GROUP BY 同用, 所以放在子查询中, 外层仍可以按汇总键聚合
+        """
+        return self.model._base_manager.using(self.db).filter(
+            pk__in=self.select_for_update().values("pk")
+        )
+
+    @staticmethod
+    def total_amount_expression(values: typing.Dict[str, typing.Any]) -> Combinable:
+        """
+        UPDATE 中 SET 右侧的列引用取的是更新前的值(MySQL 除外, 按赋值顺序取新值),
+        所以不能写 F('quantity') * F('unit_price'), 而是直接用新的数量/单价表达式相乘
+        """
+        operands = []
+        for name in ("quantity", "unit_price"):
+            value = values.get(name, F(name))
+            if not hasattr(value, "resolve_expression"):
+                value = Value(value, output_field=PurchaseRecord._meta.get_field(name))
+            operands.append(value)
+        return Round(
+            operands[0] * operands[1],
+            2,
+            output_field=PurchaseRecord._meta.get_field("total_amount"),
+        )
+
+
+class PurchaseRecord(models.Model, ModelSerializationMixin, ModelUpdateMixin):
     """采购记录"""
     date = models.DateField(verbose_name="日期")
+    # 外键的单列索引由 Meta.indexes 中以该列开头的组合索引代替
     category = models.ForeignKey(
         Category,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="类别"
     )
     name = models.CharField(max_length=100, verbose_name="名称")
@@ -61,6 +175,7 @@ class PurchaseRecord(models.Model, ModelUpdateMixin):
     supplier = models.ForeignKey(
         Supplier,
         on_delete=models.CASCADE,
+        db_index=False,
         verbose_name="供货商"
     )
 
@@ -80,15 +195,127 @@ class PurchaseRecord(models.Model, ModelUpdateMixin):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="创建时间")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新时间")
 
+    objects = PurchaseRecordQuerySet.as_manager()
+
     class Meta:
         verbose_name = "采购记录"
         verbose_name_plural = "采购记录"
         ordering = ['-date', '-created_at']  # 按日期倒序排列
+        # 只保留 advise_indexes 命令检查时去掉后会出现全表扫描或额外排序的索引, 每个索引都增加写入开销;
+        # 列表排序会追加主键, 索引末尾带上 id, 各过滤条件下都能按索引顺序读取.
+        # 类别/供货商的索引同时用于外键的级联删除
+        indexes = [
+            models.Index(fields=['date', 'created_at', 'id'], name='purchase_date_created_idx'),
+            models.Index(fields=['category', 'date', 'created_at', 'id'], name='purchase_category_date_idx'),
+            models.Index(fields=['supplier', 'date', 'created_at', 'id'], name='purchase_supplier_date_idx'),
+            models.Index(fields=['unit', 'date', 'created_at', 'id'], name='purchase_unit_date_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         # 自动计算应付金额（数量 × 单价）
-        self.total_amount = self.quantity * self.unit_price
+        self.total_amount = calculate_total_amount(self.quantity, self.unit_price)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and TOTAL_AMOUNT_SOURCES.intersection(update_fields):
+            kwargs["update_fields"] = {*update_fields, "total_amount"}
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.date} - {self.name} ({self.supplier.name})"
+
+
+class SpendRollup(models.Model):
+    """
+    采购金额汇总表(抽象)
+
+    按 (周期, 类别, 供货商, 单位) 预聚合 PurchaseRecord, 统计查询只需扫描分组数量级的行,
+    由 apps.materials.rollups 增量维护, 也可用 rebuild_spend_rollups 命令全量重建
+    """
+    period = models.DateField(verbose_name="统计周期")
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="类别"
+    )
+    supplier = models.ForeignKey(
+        Supplier,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="供货商"
+    )
+    unit = models.CharField(max_length=20, verbose_name="单位")
+    quantity = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="数量合计"
+    )
+    total_amount = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="应付金额合计"
+    )
+    actual_paid = models.DecimalField(
+        max_digits=20,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        verbose_name="实付合计"
+    )
+    record_count = models.PositiveIntegerField(default=0, verbose_name="采购记录数")
+
+    # 统计周期的粒度, 由子类指定
+    PERIOD: str = None
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'category', 'supplier', 'unit'],
+                name="%(app_label)s_%(class)s_unique_key",
+            ),
+        ]
+
+    @classmethod
+    def truncate(cls, date: datetime.date) -> datetime.date:
+        """将采购日期截断为所属统计周期"""
+        raise NotImplementedError()
+
+    @classmethod
+    def period_expression(cls):
+        """在数据库中计算统计周期的表达式"""
+        raise NotImplementedError()
+
+
+class DailySpendRollup(SpendRollup):
+    """采购金额日汇总"""
+    PERIOD = "day"
+
+    class Meta(SpendRollup.Meta):
+        verbose_name = "采购日汇总"
+        verbose_name_plural = "采购日汇总"
+
+    @classmethod
+    def truncate(cls, date: datetime.date) -> datetime.date:
+        return date
+
+    @classmethod
+    def period_expression(cls):
+        return F('date')
+
+
+class MonthlySpendRollup(SpendRollup):
+    """采购金额月汇总"""
+    PERIOD = "month"
+
+    class Meta(SpendRollup.Meta):
+        verbose_name = "采购月汇总"
+        verbose_name_plural = "采购月汇总"
+
+    @classmethod
+    def truncate(cls, date: datetime.date) -> datetime.date:
+        return date.replace(day=1)
+
+    @classmethod
+    def period_expression(cls):
+        return TruncMonth('date')
@@ -0,0 +1,15 @@
+from apps.materials.models import (
+    Category,
+    DailySpendRollup,
+    MonthlySpendRollup,
+    PurchaseRecord,
+    Supplier,
+)
+from apps.user.models import User
+from utils.policies import ALL, policies
+
+# 采购数据只对管理员和员工开放, 客户看不到
+STAFF_ONLY = {User.LEVEL.管理员: ALL, User.LEVEL.员工: ALL}
+
+for model in (PurchaseRecord, Supplier, Category, DailySpendRollup, MonthlySpendRollup):
+    policies.register(model, "view", STAFF_ONLY)
@@ -0,0 +1,306 @@
+"""
+采购汇总表的增量维护
+
+PurchaseRecord 的单条 save/delete 由 apps.materials.signals 调用本模块, 批量的 bulk_update/update/delete
+由 PurchaseRecordQuerySet 调用; bulk_create 等其他绕过信号的批量写入路径需在写入后自行调用
+add_records/remove_records.
+"""
+import typing
+from collections import defaultdict
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import Cast
+
+from apps.materials.models import (
+    DailySpendRollup,
+    MonthlySpendRollup,
+    PurchaseRecord,
+    SpendRollup,
+)
+
+ROLLUP_MODELS: typing.Tuple[typing.Type[SpendRollup], ...] = (
+    DailySpendRollup,
+    MonthlySpendRollup,
+)
+
+# 汇总表中累加的度量字段, 与 PurchaseRecord 字段同名
+MEASURES = ("quantity", "total_amount", "actual_paid")
+# 决定记录属于哪个汇总行的 PurchaseRecord 字段
+GROUP_FIELDS = ("date", "category_id", "supplier_id", "unit")
+# snapshot 读取的 PurchaseRecord 字段
+SNAPSHOT_FIELDS = (*GROUP_FIELDS, *MEASURES)
+
+# 分组数不超过该值时逐个 UPDATE
+SMALL_DELTA_SIZE = 4
+# 批量累加时每条 UPDATE 涉及的分组数
+BATCH_SIZE = 200
+
+RollupKey = typing.Tuple[typing.Type[SpendRollup], tuple]
+
+# PurchaseRecordQuerySet.delete 已按分组更新了汇总表, post_delete 信号不再逐条处理
+bulk_deleting: ContextVar[bool] = ContextVar("bulk_deleting", default=False)
+
+
+class Delta:
+    """某个汇总行需要累加的增量"""
+
+    __slots__ = ("quantity", "total_amount", "actual_paid", "record_count")
+
+    def __init__(self):
+        self.quantity = Decimal("0")
+        self.total_amount = Decimal("0")
+        self.actual_paid = Decimal("0")
+        self.record_count = 0
+
+    def add(self, values: dict, sign: int, count: int = 1) -> None:
+        """values 为 count 条记录的度量之和"""
+        for measure in MEASURES:
+            setattr(self, measure, getattr(self, measure) + sign * Decimal(values[measure]))
+        self.record_count += sign * count
+
+    def is_empty(self) -> bool:
+        return self.record_count == 0 and not any(getattr(self, m) for m in MEASURES)
+
+
+def record_values(record: PurchaseRecord) -> dict:
+    """取出汇总所需的字段值, 与 snapshot 返回的结构一致"""
+    return {
+        "date": record.date,
+        "category_id": record.category_id,
+        "supplier_id": record.supplier_id,
+        "unit": record.unit,
+        "quantity": record.quantity,
+        "total_amount": record.total_amount,
+        "actual_paid": record.actual_paid,
+    }
+
+
+def snapshot(pk) -> typing.Optional[dict]:
+    """读取数据库中记录当前的汇总字段, 用于 save 前后求差"""
+    return PurchaseRecord.objects.filter(pk=pk).values(*SNAPSHOT_FIELDS).first()
+
+
+def collect(
+    deltas: typing.Dict[RollupKey, Delta], values: dict, sign: int, count: int = 1
+) -> typing.Dict[RollupKey, Delta]:
+    """把一条记录(sign=1 加入, sign=-1 移除)的增量累计到 deltas; count 不为 1 时 values 为同一分组多条记录之和"""
+    for model in ROLLUP_MODELS:
+        key = (
+            model.truncate(values["date"]),
+            values["category_id"],
+            values["supplier_id"],
+            values["unit"],
+        )
+        deltas[(model, key)].add(values, sign, count)
+    return deltas
+
+
+def aggregate_deltas(
+    deltas: typing.Dict[RollupKey, Delta],
+    queryset,
+    sign: int,
+    values: typing.Optional[typing.Dict[str, typing.Any]] = None,
+) -> typing.Dict[RollupKey, Delta]:
+    """
+    在数据库中按日期、类别、供货商、单位聚合 queryset 中的记录, 累计到 deltas;
+    一次查询, 返回的行数与分组数相同, 与记录数无关.
+
+    values 为 QuerySet.update 的参数时, 在 UPDATE 之前按更新后的值聚合: SET 右侧的表达式取的是
+    更新前的值(MySQL 除外), 与在更新前的记录上求值的结果相同
+    """
+    columns = update_columns(values or {})
+    rows = (
+        queryset.order_by()
+        .annotate(**{f"rollup_{name}": columns[name] for name in GROUP_FIELDS})
+        .values(*[f"rollup_{name}" for name in GROUP_FIELDS])
+        .annotate(**{f"sum_{name}": Sum(columns[name]) for name in MEASURES}, num=Count("pk"))
+    )
+    for row in rows.iterator():
+        record = {name: row[f"rollup_{name}"] for name in GROUP_FIELDS}
+        record.update({name: row[f"sum_{name}"] for name in MEASURES})
+        collect(deltas, record, sign, row["num"])
+    return deltas
+
+
+def update_columns(values: typing.Dict[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+    """汇总所需的各列 -> 按 update 的参数 values 更新后的值的表达式"""
+    columns = {name: F(name) for name in SNAPSHOT_FIELDS}
+    for name, value in values.items():
+        field = PurchaseRecord._meta.get_field(name)
+        if field.attname not in columns:
+            continue
+        if hasattr(value, "resolve_expression"):
+            if field.attname == "date":
+                # 日期加减 timedelta 的结果在部分数据库中是 datetime
+                value = Cast(value, models.DateField())
+        else:
+            if isinstance(value, models.Model):
+                value = value.pk
+            value = Value(value, output_field=field.target_field if field.is_relation else field)
+        columns[field.attname] = value
+    return columns
+
+
+def apply_deltas(deltas: typing.Dict[RollupKey, Delta]) -> None:
+    """
+    将增量写入汇总表
+
+    仅在记录数增加时才会新建汇总行; 记录数减为 0 的汇总行会被删除.
+    分组较少时(单条 save/delete)逐个分组 UPDATE, 否则按批用 CASE 一次累加
+    """
+    grouped = defaultdict(dict)
+    for (model, key), delta in deltas.items():
+        if not delta.is_empty():
+            grouped[model][key] = delta
+
+    with transaction.atomic():
+        for model, model_deltas in grouped.items():
+            if len(model_deltas) <= SMALL_DELTA_SIZE:
+                for key, delta in model_deltas.items():
+                    apply_delta(model, key, delta)
+                continue
+            items = list(model_deltas.items())
+            for start in range(0, len(items), BATCH_SIZE):
+                apply_batch(model, dict(items[start:start + BATCH_SIZE]))
+
+
+def key_lookup(key: tuple) -> dict:
+    period, category_id, supplier_id, unit = key
+    return dict(period=period, category_id=category_id, supplier_id=supplier_id, unit=unit)
+
+
+def apply_delta(model: typing.Type[SpendRollup], key: tuple, delta: Delta) -> None:
+    """单个分组: UPDATE, 分组不存在时再 INSERT"""
+    lookup = key_lookup(key)
+    changes = {
+        name: F(name) + getattr(delta, name)
+        for name in (*MEASURES, "record_count")
+    }
+    updated = model.objects.filter(**lookup).update(**changes)
+    if not updated and delta.record_count > 0:
+        try:
+            with transaction.atomic():
+                model.objects.create(
+                    **lookup,
+                    **{name: getattr(delta, name) for name in MEASURES},
+                    record_count=delta.record_count,
+                )
+        except IntegrityError:
+            # 并发写入时其他事务已创建了该分组
+            model.objects.filter(**lookup).update(**changes)
+    if delta.record_count < 0:
+        model.objects.filter(**lookup, record_count__lte=0).delete()
+
+
+def apply_batch(model: typing.Type[SpendRollup], deltas: typing.Dict[tuple, Delta]) -> None:
+    """
+    一批分组: 先插入缺失分组的空行(ignore_conflicts), 查出各分组 id,
+    再用一条 UPDATE ... CASE 累加, 与并发写入同样安全
+    """
+    model.objects.bulk_create(
+        [model(**key_lookup(key)) for key, delta in deltas.items() if delta.record_count > 0],
+        ignore_conflicts=True,
+    )
+    rows = model.objects.filter(
+        period__in={key[0] for key in deltas},
+        category_id__in={key[1] for key in deltas},
+        supplier_id__in={key[2] for key in deltas},
+        unit__in={key[3] for key in deltas},
+    ).values_list("id", "period", "category_id", "supplier_id", "unit")
+    ids = {tuple(row[1:]): row[0] for row in rows}
+    matched = [(ids[key], delta) for key, delta in deltas.items() if key in ids]
+    if not matched:
+        return
+
+    changes = {}
+    for name in (*MEASURES, "record_count"):
+        field = model._meta.get_field(name)
+        changes[name] = F(name) + Case(
+            *[
+                When(pk=pk, then=Value(getattr(delta, name), output_field=field))
+                for pk, delta in matched
+            ],
+            default=Value(0, output_field=field),
+            output_field=field,
+        )
+    pks = [pk for pk, _ in matched]
+    model.objects.filter(pk__in=pks).update(**changes)
+    if any(delta.record_count < 0 for _, delta in matched):
+        model.objects.filter(pk__in=pks, record_count__lte=0).delete()
+
+
+def add_records(records: typing.Iterable[PurchaseRecord]) -> None:
+    """批量写入采购记录后更新汇总表"""
+    deltas = defaultdict(Delta)
+    for record in records:
+        collect(deltas, record_values(record), 1)
+    apply_deltas(deltas)
+
+
+def remove_records(records: typing.Iterable[PurchaseRecord]) -> None:
+    """批量删除采购记录后更新汇总表"""
+    deltas = defaultdict(Delta)
+    for record in records:
+        collect(deltas, record_values(record), -1)
+    apply_deltas(deltas)
+
+
+def replace_record(previous: typing.Optional[dict], record: PurchaseRecord) -> None:
+    """单条记录修改后更新汇总表, previous 为修改前的 snapshot"""
+    deltas = defaultdict(Delta)
+    if previous is not None:
+        collect(deltas, previous, -1)
+    collect(deltas, record_values(record), 1)
+    apply_deltas(deltas)
+
+
+def rebuild(
+    models: typing.Iterable[typing.Type[SpendRollup]] = ROLLUP_MODELS,
+    batch_size: int = 2000,
+) -> typing.Dict[str, int]:
+    """
+    清空并根据 PurchaseRecord 全量重建汇总表, 聚合在数据库中完成
+
+    :return: {汇总表名: 生成的汇总行数}
+    """
+    result = {}
+    with transaction.atomic():
+        for model in models:
+            model.objects.all().delete()
+            rows = (
+                PurchaseRecord.objects.order_by()
+                .annotate(period=model.period_expression())
+                .values("period", "category_id", "supplier_id", "unit")
+                .annotate(
+                    sum_quantity=Sum("quantity"),
+                    sum_total_amount=Sum("total_amount"),
+                    sum_actual_paid=Sum("actual_paid"),
+                    num=Count("id"),
+                )
+            )
+            batch, created = [], 0
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(
+                    model(
+                        period=row["period"],
+                        category_id=row["category_id"],
+                        supplier_id=row["supplier_id"],
+                        unit=row["unit"],
+                        quantity=row["sum_quantity"],
+                        total_amount=row["sum_total_amount"],
+                        actual_paid=row["sum_actual_paid"],
+                        record_count=row["num"],
+                    )
+                )
+                if len(batch) >= batch_size:
+                    model.objects.bulk_create(batch)
+                    created += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_create(batch)
+                created += len(batch)
+            result[model._meta.db_table] = created
+    return result
@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.materials import rollups
+from apps.materials.models import PurchaseRecord
+
+
+@receiver(pre_save, sender=PurchaseRecord)
+def remember_rollup_snapshot(sender, instance: PurchaseRecord, raw=False, **kwargs):
+    """记录修改前的汇总字段, 以便 post_save 时只累加差值"""
+    if raw:
+        return
+    if instance._state.adding or instance.pk is None:
+        instance._rollup_snapshot = None
+    else:
+        instance._rollup_snapshot = rollups.snapshot(instance.pk)
+
+
+@receiver(post_save, sender=PurchaseRecord)
+def update_rollups_on_save(sender, instance: PurchaseRecord, raw=False, **kwargs):
+    if raw:
+        return
+    rollups.replace_record(getattr(instance, "_rollup_snapshot", None), instance)
+    instance._rollup_snapshot = None
+
+
+@receiver(post_delete, sender=PurchaseRecord)
+def update_rollups_on_delete(sender, instance: PurchaseRecord, **kwargs):
+    if rollups.bulk_deleting.get():
+        return
+    rollups.remove_records([instance])
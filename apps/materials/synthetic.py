@@ -0,0 +1,251 @@
+"""
+合成采购数据
+
+用于性能测试和跨版本比较, 同样的参数和随机种子总是生成同样的数据:
+
+* 商品属于固定的类别, 单位、规格和基准单价随商品固定; 供货商和商品的出现频率服从 Zipf 分布
+* 日期有季节性: 年末和春节前采购多, 盛夏偏少, 周末少于工作日
+* 数量按单位生成: 称重单位为两位小数, 计件单位为整数; 单价在基准单价附近随季节和随机波动
+* 实付金额不超过应付金额: 多数记录没有折扣, 少数有小额折扣, 极少数折扣较大
+
+记录逐块生成并写入, 内存占用与总行数无关.
+"""
+import datetime
+import itertools
+import math
+import random
+import typing
+from decimal import Decimal
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from apps.materials.models import Category, PurchaseRecord, Supplier
+from utils.counting import CachedCount
+
+# 类别模板: 名称, 可用单位, 基准单价范围(元), 商品名
+CATALOG: typing.Tuple[typing.Tuple[str, typing.Tuple[str, ...], typing.Tuple[int, int], typing.Tuple[str, ...]], ...] = (
+    ("蔬菜", ("kg", "斤", "箱"), (2, 15), ("白菜", "土豆", "西红柿", "黄瓜", "青椒", "茄子", "胡萝卜", "洋葱", "芹菜", "菠菜")),
+    ("水果", ("kg", "斤", "箱"), (4, 30), ("苹果", "香蕉", "橙子", "葡萄", "西瓜", "梨", "桃子", "猕猴桃")),
+    ("肉类", ("kg", "斤"), (18, 90), ("猪肉", "牛肉", "羊肉", "鸡胸肉", "鸡腿", "排骨", "五花肉")),
+    ("水产", ("kg", "斤", "箱"), (15, 120), ("草鱼", "鲈鱼", "虾", "鱿鱼", "带鱼", "扇贝")),
+    ("粮油", ("袋", "桶", "kg"), (20, 200), ("大米", "面粉", "食用油", "挂面", "小米", "玉米面")),
+    ("调味品", ("瓶", "袋", "箱"), (3, 40), ("酱油", "醋", "盐", "白糖", "料酒", "蚝油", "鸡精", "辣椒酱")),
+    ("饮料", ("箱", "瓶"), (3, 120), ("矿泉水", "可乐", "果汁", "茶饮料", "牛奶", "豆奶")),
+    ("日用品", ("件", "包", "箱"), (5, 80), ("纸巾", "洗洁精", "垃圾袋", "手套", "抹布", "洗手液")),
+    ("办公用品", ("件", "包", "箱"), (2, 300), ("打印纸", "签字笔", "文件夹", "订书机", "便签", "墨盒")),
+)
+# 称重单位的数量有小数, 其余为整数
+WEIGHT_UNITS = frozenset({"kg", "斤"})
+# 按箱/桶等整件采购时单价相对零售单位的倍数
+BULK_UNITS = {"箱": 10, "桶": 4}
+SPECIFICATIONS = ("", "500g", "1kg", "5kg", "10kg", "一级", "特级", "散装", "12瓶/箱", "24瓶/箱")
+
+# 每次抽取随机数的行数
+BLOCK_SIZE = 1000
+
+# 折扣(万分比)的分布: (权重, 最小, 最大)
+DISCOUNTS = ((70, 0, 0), (25, 1, 500), (5, 500, 2000))
+
+
+class Item(typing.NamedTuple):
+    category: Category
+    name: str
+    specification: str
+    unit: str
+    # 基准单价, 单位为分
+    price: int
+
+
+def zipf_weights(n: int, s: float) -> typing.List[float]:
+    """Zipf 分布的累积权重, 供 random.choices 的 cum_weights 使用"""
+    return list(itertools.accumulate(1 / (rank ** s) for rank in range(1, n + 1)))
+
+
+def day_weight(day: datetime.date) -> float:
+    """某一天的相对采购量"""
+    day_of_year = day.timetuple().tm_yday
+    # 年末年初(含春节前)为高峰, 7 月底前后为低谷
+    weight = 1 + 0.35 * math.cos(2 * math.pi * (day_of_year - 15) / 365)
+    if day.month in (1, 2) and day.day <= 20:
+        weight *= 1.3
+    if day.weekday() >= 5:
+        weight *= 0.5
+    return weight
+
+
+def cents(value: int) -> Decimal:
+    return Decimal(value).scaleb(-2)
+
+
+class SyntheticData:
+    def __init__(
+        self,
+        *,
+        categories: int = 20,
+        suppliers: int = 500,
+        items: int = 2000,
+        start: datetime.date = datetime.date(2022, 1, 1),
+        days: int = 3 * 365,
+        seed: int = 0,
+        supplier_skew: float = 1.1,
+        item_skew: float = 1.0,
+    ):
+        """
+        :param categories: 类别数, 超过模板数时按模板编号扩展
+        :param suppliers: 供货商数
+        :param items: 商品数(名称 + 规格 + 单位)
+        :param start: 最早的采购日期
+        :param days: 日期跨度
+        :param seed: 随机种子
+        :param supplier_skew: 供货商 Zipf 分布的指数, 越大越集中于头部供货商
+        :param item_skew: 商品 Zipf 分布的指数
+        """
+        self.category_count = categories
+        self.supplier_count = suppliers
+        self.item_count = items
+        self.start = start
+        self.days = days
+        self.seed = seed
+        self.supplier_skew = supplier_skew
+        self.item_skew = item_skew
+
+    def category_names(self) -> typing.List[str]:
+        names = []
+        for i in range(self.category_count):
+            name = CATALOG[i % len(CATALOG)][0]
+            names.append(name if i < len(CATALOG) else f"{name}{i // len(CATALOG) + 1}")
+        return names
+
+    def supplier_names(self) -> typing.List[str]:
+        return [f"供货商{i + 1:05d}" for i in range(self.supplier_count)]
+
+    @staticmethod
+    def ensure(model, names: typing.List[str]) -> list:
+        """按名称补齐类别/供货商, 按 names 的顺序返回"""
+        model.objects.bulk_create([model(name=name) for name in names], ignore_conflicts=True)
+        existing = model.objects.in_bulk(names, field_name="name")
+        return [existing[name] for name in names]
+
+    def build_items(self, rand: random.Random, categories: typing.List[Category]) -> typing.List[Item]:
+        items = []
+        for i in range(self.item_count):
+            index = i % len(categories)
+            _, units, (low, high), nouns = CATALOG[index % len(CATALOG)]
+            unit = rand.choice(units)
+            # 基准单价在类别范围内按对数均匀分布, 整件单位乘以倍数
+            price = math.exp(rand.uniform(math.log(low), math.log(high))) * BULK_UNITS.get(unit, 1)
+            items.append(
+                Item(
+                    category=categories[index],
+                    name=f"{nouns[(i // len(categories)) % len(nouns)]}{i // len(categories) // len(nouns) + 1:03d}",
+                    specification=rand.choice(SPECIFICATIONS),
+                    unit=unit,
+                    price=max(1, round(price * 100)),
+                )
+            )
+        return items
+
+    def rows(self, count: int, chunk_size: int = 10000) -> typing.Iterator[typing.List[tuple]]:
+        """
+        逐块生成采购记录, 每行是按 COLUMNS 排列的字段值(外键为 id), 类别和供货商在第一块生成前写入数据库
+        """
+        rand = random.Random(self.seed)
+        categories = self.ensure(Category, self.category_names())
+        suppliers = [supplier.pk for supplier in self.ensure(Supplier, self.supplier_names())]
+        items = self.build_items(rand, categories)
+        item_weights = zipf_weights(len(items), self.item_skew)
+        supplier_weights = zipf_weights(len(suppliers), self.supplier_skew)
+        dates = [self.start + datetime.timedelta(days=offset) for offset in range(self.days)]
+        date_weights = list(itertools.accumulate(day_weight(day) for day in dates))
+        # 单价的季节系数: 冬季略贵
+        seasonal = {
+            day: 1 + 0.08 * math.cos(2 * math.pi * (day.timetuple().tm_yday - 15) / 365)
+            for day in dates
+        }
+        discount_weights = list(itertools.accumulate(weight for weight, _, _ in DISCOUNTS))
+
+        def block() -> typing.Iterator[tuple]:
+            # 批量写入时 created_at/updated_at 不会自动填充, 同一块使用同一时间
+            now = timezone.now()
+            for item, supplier, day, discount in zip(
+                rand.choices(items, cum_weights=item_weights, k=BLOCK_SIZE),
+                rand.choices(suppliers, cum_weights=supplier_weights, k=BLOCK_SIZE),
+                rand.choices(dates, cum_weights=date_weights, k=BLOCK_SIZE),
+                rand.choices(DISCOUNTS, cum_weights=discount_weights, k=BLOCK_SIZE),
+            ):
+                if item.unit in WEIGHT_UNITS:
+                    quantity = min(999999, max(1, round(rand.lognormvariate(math.log(800), 0.9))))
+                else:
+                    quantity = min(500, 1 + int(rand.expovariate(1 / 6))) * 100
+                price = max(1, round(item.price * seasonal[day] * rand.uniform(0.9, 1.1)))
+                # 与 calculate_total_amount 相同的四舍五入, 以分为单位
+                total = (quantity * price + 50) // 100
+                paid = total * (10000 - rand.randint(discount[1], discount[2])) // 10000
+                yield (
+                    day, item.category.pk, supplier, item.name, item.specification, item.unit,
+                    cents(quantity), cents(price), cents(total), cents(paid), "", now, now,
+                )
+
+        # 随机数按固定大小的块抽取, 生成的数据与 count 和 chunk_size 无关, 较少的行数是较多行数的前缀
+        blocks = itertools.chain.from_iterable(block() for _ in itertools.count())
+        stream = itertools.islice(blocks, count)
+        while True:
+            chunk = list(itertools.islice(stream, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def records(self, count: int, chunk_size: int = 10000) -> typing.Iterator[typing.List[PurchaseRecord]]:
+        """与 rows 相同的数据, 以未保存的 PurchaseRecord 返回"""
+        for chunk in self.rows(count, chunk_size):
+            yield [PurchaseRecord(**dict(zip(FIELDS, row))) for row in chunk]
+
+
+# rows 中每行字段的顺序, 外键为 id
+FIELDS = (
+    "date", "category_id", "supplier_id", "name", "specification", "unit", "quantity",
+    "unit_price", "total_amount", "actual_paid", "notes", "created_at", "updated_at",
+)
+
+
+def generate(
+    data: SyntheticData,
+    count: int,
+    *,
+    chunk_size: int = 10000,
+    using: str = DEFAULT_DB_ALIAS,
+    progress: typing.Optional[typing.Callable[[int], None]] = None,
+) -> int:
+    """
+    生成 count 条采购记录并写入数据库, 返回写入的行数
+
+    千万行级别的数据逐个构造模型实例再 bulk_create 太慢(每个字段都要经过 get_db_prep_save),
+    这里每块直接 executemany 一条参数化的 INSERT. 写入不经过模型和信号, 应付金额由 rows 按
+    calculate_total_amount 的规则算好, 汇总表需要之后用 rollups.rebuild 重建
+
+    :param chunk_size: 每个事务写入的行数
+    :param progress: 每写入一块后以累计行数调用
+    """
+    connection = connections[using]
+    opts = PurchaseRecord._meta
+    columns = [opts.get_field(name).column for name in FIELDS]
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        connection.ops.quote_name(opts.db_table),
+        ", ".join(connection.ops.quote_name(column) for column in columns),
+        ", ".join(["%s"] * len(columns)),
+    )
+    adapt_date = connection.ops.adapt_datefield_value
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+
+    created = 0
+    for chunk in data.rows(count, chunk_size):
+        now = adapt_datetime(chunk[0][-1])
+        params = [(adapt_date(row[0]), *row[1:-2], now, now) for row in chunk]
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.executemany(sql, params)
+        created += len(chunk)
+        if progress is not None:
+            progress(created)
+    CachedCount.invalidate(PurchaseRecord)
+    return created
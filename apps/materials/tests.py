@@ -1,3 +1,489 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import os
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from apps.materials import rollups
+from apps.materials.importer import PurchaseImporter, read_csv
+from apps.materials.models import (
+    Category,
+    DailySpendRollup,
+    MonthlySpendRollup,
+    PurchaseRecord,
+    Supplier,
+)
+from apps.user.models import User
+from apps.user.utils import generate_jwt_token
+from constants.code import Code
+from utils.counting import CachedCount, CountResult, EstimatedCount, ExactCount
+from utils.query_budget import BudgetedRoute, assert_query_budget, registered_budgets
+
+
+class ApiTestCase(TestCase):
+    """以员工身份请求接口"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = User.objects.create(phone="13900000001", level=User.LEVEL.员工)
+
+    def get(self, path, user=None, **params):
+        headers = {"token": generate_jwt_token(user or self.employee)}
+        return self.client.get(path, params, headers=headers)
+
+
+class BadRequestTests(ApiTestCase):
+    def test_form_errors_keep_messages(self):
+        response = self.get("/api/materials/analysis/", measures="bogus")
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual(body["code"], Code.CLIENT_ERROR)
+        self.assertEqual(body["message"], {"measures": [Code.message(Code.统计指标不正确)]})
+
+
+class PurchaseDataMixin:
+    """两个类别、两个供货商, 跨两个月的采购记录, 汇总表由 save 的信号维护"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.categories = [Category.objects.create(name=name) for name in ("办公", "食品")]
+        cls.suppliers = [Supplier.objects.create(name=name) for name in ("甲", "乙")]
+        cls.records = []
+        for i in range(12):
+            record = PurchaseRecord(
+                date=datetime.date(2024, 1 + i % 2, 1 + i),
+                category=cls.categories[i % 2],
+                supplier=cls.suppliers[i // 6],
+                name=f"商品{i % 3}",
+                unit="个",
+                quantity=Decimal(i + 1),
+                unit_price=Decimal("2.50"),
+                actual_paid=Decimal(i + 1) * 2,
+            )
+            record.save()
+            cls.records.append(record)
+
+    @staticmethod
+    def rollup_rows():
+        return {
+            model: sorted(
+                model.objects.values_list(
+                    "period", "category_id", "supplier_id", "unit",
+                    "quantity", "total_amount", "actual_paid", "record_count",
+                )
+            )
+            for model in rollups.ROLLUP_MODELS
+        }
+
+    def assertRollupsMatchRebuild(self):
+        incremental = self.rollup_rows()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rollup_rows())
+
+
+class RollupTests(PurchaseDataMixin, TestCase):
+    def test_save_and_delete(self):
+        self.assertEqual(MonthlySpendRollup.objects.count(), 4)
+        record = self.records[0]
+        record.quantity = Decimal("7.5")
+        record.category = self.categories[1]
+        record.save()
+        self.records[1].delete()
+        self.assertRollupsMatchRebuild()
+
+    def test_bulk_update(self):
+        for record in self.records[:8]:
+            record.quantity += 1
+            record.date = record.date.replace(month=3)
+        PurchaseRecord.objects.bulk_update(self.records[:8], ["quantity", "date"])
+        self.assertRollupsMatchRebuild()
+        self.assertTrue(DailySpendRollup.objects.filter(period__month=3).exists())
+
+    def test_update(self):
+        PurchaseRecord.objects.filter(date__month=1).update(unit_price=Decimal("3.00"), date=datetime.date(2024, 2, 29))
+        self.assertRollupsMatchRebuild()
+        self.assertFalse(MonthlySpendRollup.objects.filter(period=datetime.date(2024, 1, 1)).exists())
+
+    def test_update_expressions(self):
+        PurchaseRecord.objects.bulk_create(
+            [
+                PurchaseRecord(
+                    date=datetime.date(2024, 3, 1 + i % 28),
+                    category=self.categories[i % 2],
+                    supplier=self.suppliers[i % 2],
+                    name="批量",
+                    unit="箱",
+                    quantity=Decimal(i + 1),
+                    unit_price=Decimal("1.25"),
+                    actual_paid=Decimal(i),
+                )
+                for i in range(200)
+            ]
+        )
+        rollups.rebuild()
+        # 修改前后各聚合一次, 查询次数与行数无关
+        with CaptureQueriesContext(connection) as queries:
+            PurchaseRecord.objects.filter(date__year=2024).update(quantity=F("quantity") + 1)
+        self.assertLess(len(queries), 20)
+        # 采购记录只在数据库中分组聚合, 不逐行读出
+        selects = [
+            query["sql"] for query in queries.captured_queries
+            if query["sql"].startswith("SELECT") and '"materials_purchaserecord"' in query["sql"]
+        ]
+        self.assertEqual(len(selects), 2)
+        self.assertTrue(all("GROUP BY" in sql for sql in selects))
+        self.assertRollupsMatchRebuild()
+
+        PurchaseRecord.objects.filter(unit="箱").update(
+            category=self.categories[0], supplier_id=self.suppliers[1].pk, actual_paid=F("quantity") * 2
+        )
+        self.assertRollupsMatchRebuild()
+        PurchaseRecord.objects.filter(unit="箱", date__day__lte=10).update(
+            date=F("date") + datetime.timedelta(days=31), unit="包"
+        )
+        self.assertRollupsMatchRebuild()
+        self.assertTrue(DailySpendRollup.objects.filter(period__month=4, unit="包").exists())
+
+    def test_update_without_rollup_fields(self):
+        rows = self.rollup_rows()
+        with self.assertNumQueries(1):
+            PurchaseRecord.objects.update(notes="备注")
+        self.assertEqual(rows, self.rollup_rows())
+
+    def test_add_records_after_bulk_create(self):
+        records = PurchaseRecord.objects.bulk_create(
+            [
+                PurchaseRecord(
+                    date=datetime.date(2024, 3, day),
+                    category=self.categories[0],
+                    supplier=self.suppliers[day % 2],
+                    name="批量",
+                    unit="箱",
+                    quantity=Decimal(day),
+                    unit_price=Decimal("1.25"),
+                    actual_paid=Decimal(day),
+                )
+                for day in range(1, 21)
+            ]
+        )
+        rollups.add_records(records)
+        self.assertRollupsMatchRebuild()
+        rollups.remove_records(records[:10])
+        PurchaseRecord.objects.filter(pk__in=[record.pk for record in records[:10]])._raw_delete("default")
+        self.assertRollupsMatchRebuild()
+
+
+    def test_bulk_delete(self):
+        records = PurchaseRecord.objects.bulk_create(
+            [
+                PurchaseRecord(
+                    date=datetime.date(2024, 3, 1 + i % 28),
+                    category=self.categories[i % 2],
+                    supplier=self.suppliers[i % 2],
+                    name="批量",
+                    unit="箱",
+                    quantity=Decimal(i + 1),
+                    unit_price=Decimal("1.25"),
+                    actual_paid=Decimal(i),
+                )
+                for i in range(200)
+            ]
+        )
+        rollups.add_records(records)
+        # 查询次数与删除的行数无关: 聚合、取出记录、删除, 汇总表每张按批更新
+        with CaptureQueriesContext(connection) as queries:
+            deleted, _ = PurchaseRecord.objects.filter(date__month=3).delete()
+        self.assertEqual(deleted, 200)
+        self.assertLess(len(queries), 20)
+        self.assertRollupsMatchRebuild()
+        self.assertFalse(DailySpendRollup.objects.filter(period__month=3).exists())
+
+        PurchaseRecord.objects.filter(category=self.categories[0], date__month=1).delete()
+        self.records[1].delete()
+        self.assertRollupsMatchRebuild()
+
+
+class SpendAnalysisTests(PurchaseDataMixin, ApiTestCase):
+    def analyse(self, **params):
+        response = self.get("/api/materials/analysis/", **params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_rollup_source_after_update(self):
+        PurchaseRecord.objects.filter(category=self.categories[0]).update(quantity=Decimal("10"))
+        body = self.analyse(group_by="month", measures="total_amount,quantity")
+        self.assertEqual(body["source"], "monthlyspendrollup")
+        by_name = self.analyse(group_by="month,name", measures="total_amount,quantity")
+        self.assertEqual(by_name["source"], "purchaserecord")
+        totals = {}
+        for row in by_name["results"]:
+            month = totals.setdefault(row["month"], [Decimal(0), Decimal(0)])
+            month[0] += Decimal(row["total_amount"])
+            month[1] += Decimal(row["quantity"])
+        self.assertEqual(
+            {row["month"]: [Decimal(row["total_amount"]), Decimal(row["quantity"])] for row in body["results"]},
+            totals,
+        )
+
+
+class PurchaseListTests(PurchaseDataMixin, ApiTestCase):
+    def follow(self, link):
+        """按返回的 next/previous 链接请求下一页"""
+        path, _, query = link.partition("?")
+        response = self.client.get(
+            f"{path.removeprefix('http://testserver')}?{query}",
+            headers={"token": generate_jwt_token(self.employee)},
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_cursor_pages(self):
+        body = self.get("/api/materials/purchases/", page_size=5, unit="个").json()
+        self.assertFalse(body["previous"])
+        self.assertIsNone(body["count"])
+        pages = [[row["id"] for row in body["results"]]]
+        while body["next"]:
+            body = self.follow(body["next"])
+            pages.append([row["id"] for row in body["results"]])
+        expected = list(PurchaseRecord.objects.order_by("-date", "-created_at", "-pk").values_list("pk", flat=True))
+        self.assertEqual([len(page) for page in pages], [5, 5, 2])
+        self.assertEqual(sum(pages, []), expected)
+
+        previous = [pages[-1]]
+        while body["previous"]:
+            body = self.follow(body["previous"])
+            previous.append([row["id"] for row in body["results"]])
+        self.assertEqual(previous[::-1], pages)
+
+    def test_invalid_cursor(self):
+        response = self.get("/api/materials/purchases/", cursor="bad")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["code"], Code.游标不正确)
+
+
+class CountStrategyTests(PurchaseDataMixin, ApiTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_exact(self):
+        queryset = PurchaseRecord.objects.filter(category=self.categories[0])
+        self.assertEqual(ExactCount().count(queryset), CountResult(6, "exact"))
+
+    def test_cached(self):
+        strategy = CachedCount()
+        queryset = PurchaseRecord.objects.filter(category=self.categories[0])
+        self.assertEqual(strategy.count(queryset), CountResult(6, "exact"))
+        with self.assertNumQueries(0):
+            self.assertEqual(strategy.count(queryset), CountResult(6, "cached"))
+        # 过滤条件不同的查询各自缓存
+        self.assertEqual(strategy.count(PurchaseRecord.objects.all()), CountResult(12, "exact"))
+
+        self.records[0].delete()
+        self.assertEqual(strategy.count(queryset), CountResult(5, "exact"))
+        self.records[1].category = self.categories[0]
+        self.records[1].save()
+        self.assertEqual(strategy.count(queryset), CountResult(6, "exact"))
+
+        # update 不发送信号, 需要调用 invalidate
+        PurchaseRecord.objects.filter(pk=self.records[2].pk).update(category=self.categories[1])
+        self.assertEqual(strategy.count(queryset), CountResult(6, "cached"))
+        CachedCount.invalidate(PurchaseRecord)
+        self.assertEqual(strategy.count(queryset), CountResult(5, "exact"))
+
+    def test_cached_empty(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedCount().count(PurchaseRecord.objects.none()), CountResult(0, "exact"))
+
+    def test_estimated(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+        queryset = PurchaseRecord.objects.all()
+        self.assertEqual(EstimatedCount(threshold=10).count(queryset), CountResult(12, "estimated"))
+        # 低于阈值或有过滤条件时精确统计
+        self.assertEqual(EstimatedCount(threshold=100).count(queryset), CountResult(12, "exact"))
+        filtered = queryset.filter(category=self.categories[0])
+        self.assertEqual(EstimatedCount(threshold=1).count(filtered), CountResult(6, "exact"))
+
+    def test_list_count(self):
+        body = self.get("/api/materials/purchases/", with_count=1).json()
+        self.assertEqual((body["count"], body["count_type"]), (12, "exact"))
+        body = self.get("/api/materials/purchases/", with_count=1).json()
+        self.assertEqual((body["count"], body["count_type"]), (12, "cached"))
+
+
+class PurchasePolicyTests(PurchaseDataMixin, ApiTestCase):
+    def test_customer_sees_no_purchases(self):
+        customer = User.objects.create(phone="13900000002", level=User.LEVEL.用户)
+        admin = User.objects.create(phone="13900000000", level=User.LEVEL.管理员)
+        for user, count in ((admin, 12), (self.employee, 12), (customer, 0)):
+            with self.subTest(level=user.level):
+                body = self.get("/api/materials/purchases/", user, page_size=50, with_count=1).json()
+                self.assertEqual((body["count"], len(body["results"])), (count, count))
+                body = self.get("/api/materials/analysis/", user, group_by="category", measures="count").json()
+                self.assertEqual(sum(row["count"] for row in body["results"]), count)
+
+
+class ImporterTests(PurchaseDataMixin, ApiTestCase):
+    HEADER = "日期,类别,名称,规格,单位,数量,单价,应付金额,实付,供货商,备注\n"
+
+    def rows(self, text):
+        return read_csv(io.BytesIO(text.encode("utf-8-sig")))
+
+    def test_import(self):
+        text = self.HEADER + (
+            "2024-03-01,办公,纸,A4,包,10,2.5,999,20,甲,\n"
+            "2024/03/02,新类别,笔,,支,\"1,000\",0.333,,300,新供货商,备注\n"
+            ",办公,纸,A4,包,abc,2.5,,20,甲,\n"
+            "2024-13-01,办公,纸,A4,包,1,2.5,,20,甲,\n"
+            "20240303,办公,订书机,,个,2,99999999.99,,1,甲,\n"
+            "2024.03.04,新类别,本,,本,3,1.005,,3,新供货商,\n"
+            "2024-03-05,办公,纸,A4,包,1e30,2.5,,1e30,甲,\n"
+        )
+        importer = PurchaseImporter(chunk_size=2)
+        result = importer.import_rows(self.rows(text))
+        self.assertEqual(result.created, 3)
+        self.assertEqual(result.errors[-1].errors["quantity"], "数值过大")
+        self.assertEqual(
+            [(error.line, sorted(error.errors)) for error in result.errors],
+            [(4, ["date", "quantity"]), (5, ["date"]), (6, ["total_amount"]), (8, ["actual_paid", "quantity"])],
+        )
+        self.assertEqual(Category.objects.filter(name="新类别").count(), 1)
+        self.assertEqual(Supplier.objects.filter(name="新供货商").count(), 1)
+        imported = {
+            record.name: record
+            for record in PurchaseRecord.objects.filter(date__month=3).select_related("category", "supplier")
+        }
+        # 应付金额总是重新计算
+        self.assertEqual(imported["纸"].total_amount, Decimal("25.00"))
+        self.assertEqual(imported["笔"].quantity, Decimal("1000.00"))
+        self.assertEqual(imported["笔"].total_amount, Decimal("330.00"))
+        # 单价先保留两位小数再计算应付金额, 与数据库中保存的值一致
+        self.assertEqual(imported["本"].unit_price, Decimal("1.00"))
+        self.assertEqual(imported["本"].total_amount, Decimal("3.00"))
+        self.assertEqual(imported["本"].date, datetime.date(2024, 3, 4))
+        self.assertEqual(imported["本"].category.name, "新类别")
+        self.assertRollupsMatchRebuild()
+
+    def test_export_round_trip(self):
+        response = self.get("/api/materials/purchases/export/", format="csv")
+        self.assertEqual(response.status_code, 200)
+        exported = b"".join(response.streaming_content)
+        PurchaseRecord.objects.all().delete()
+        result = PurchaseImporter().import_rows(read_csv(io.BytesIO(exported)))
+        self.assertEqual((result.created, result.errors), (12, []))
+        self.assertEqual(
+            sorted(PurchaseRecord.objects.values_list("date", "category_id", "name", "quantity", "actual_paid")),
+            sorted(
+                (record.date, record.category_id, record.name, record.quantity, record.actual_paid)
+                for record in self.records
+            ),
+        )
+        self.assertRollupsMatchRebuild()
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", encoding="utf-8", delete=False) as file:
+            file.write(self.HEADER + "2024-03-01,办公,纸,A4,包,10,2.5,,20,甲,\n2024-03-01,,纸,A4,包,10,2.5,,20,甲,\n")
+        self.addCleanup(os.unlink, file.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command("import_purchase_records", file.name, stdout=stdout, stderr=stderr)
+        self.assertIn("导入 1 行, 失败 1 行", stdout.getvalue())
+        self.assertIn("第3行: category: 不能为空", stderr.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("import_purchase_records", file.name + ".txt")
+
+
+class AsyncViewTests(PurchaseDataMixin, ApiTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.expected = list(PurchaseRecord.objects.order_by("-date", "-created_at", "-pk").values_list("pk", flat=True))
+
+    async def aget(self, path, **params):
+        return await self.async_client.get(path, params, headers={"token": generate_jwt_token(self.employee)})
+
+    async def test_list(self):
+        response = await self.aget("/api/materials/purchases/", page_size=5, with_count=1)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["count"], 12)
+        self.assertEqual(len(body["results"]), 5)
+        self.assertEqual([row["id"] for row in body["results"]], self.expected[:5])
+        assert_query_budget(response)
+
+        path, _, query = body["next"].partition("?")
+        response = await self.async_client.get(
+            f"{path.removeprefix('http://testserver')}?{query}",
+            headers={"token": generate_jwt_token(self.employee)},
+        )
+        self.assertEqual([row["id"] for row in response.json()["results"]], self.expected[5:10])
+
+    async def test_stream(self):
+        response = await self.aget("/api/materials/purchases/", page_size=50, stream=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        content = b"".join([chunk async for chunk in response.streaming_content])
+        body = json.loads(content)
+        self.assertEqual([row["id"] for row in body["results"]], self.expected)
+        assert_query_budget(response)
+
+    async def test_analysis(self):
+        response = await self.aget("/api/materials/analysis/", group_by="category", measures="count,total_amount")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["source"], "monthlyspendrollup")
+        self.assertEqual([row["count"] for row in body["results"]], [6, 6])
+        assert_query_budget(response)
+
+    async def test_login_required(self):
+        response = await self.async_client.get("/api/materials/purchases/")
+        self.assertEqual(response.status_code, 401)
+        response = await self.async_client.get("/api/materials/purchases/", headers={"token": "bad"})
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(QUERY_BUDGET_ACTION="raise")
+class QueryBudgetSweepTests(PurchaseDataMixin, ApiTestCase):
+    """对每个设置了预算的路由发送有代表性的请求, 新增预算路由时需在 requests 中补充"""
+
+    requests = {
+        "user:register": ("post", {"phone": "13900000009", "password": "Qwert654321"}),
+        "user:login": ("post", {"phone": "13900000001", "password": "Qwert654321"}),
+        "user:user-list": ("get", {}),
+        "materials:purchase-list": ("get", {"with_count": 1, "page_size": 5}),
+        "materials:purchase-export": ("get", {}),
+        "materials:spend-analysis": ("get", {"group_by": "category,supplier", "measures": "count,total_amount"}),
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.employee.set_password("Qwert654321")
+        cls.employee.save()
+
+    def request(self, route: BudgetedRoute):
+        method, params = self.requests[route.name]
+        headers = {"token": generate_jwt_token(self.employee)}
+        if method == "post":
+            return self.client.post(f"/{route.route}", params, content_type="application/json", headers=headers)
+        return self.client.get(f"/{route.route}", params, headers=headers)
+
+    def test_all_routes_covered(self):
+        self.assertEqual({route.name for route in registered_budgets()}, set(self.requests))
+
+    def test_within_budget(self):
+        for route in registered_budgets():
+            with self.subTest(route=route.name):
+                response = self.request(route)
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                self.assertLess(response.status_code, 300, response.content if not response.streaming else "")
+                assert_query_budget(response)
@@ -0,0 +1,11 @@
+from django.urls import path
+
+from apps.materials import views
+
+app_name = "materials"
+
+urlpatterns = [
+    path("purchases/", views.PurchaseRecordListView.as_view(), name="purchase-list"),
+    path("purchases/export/", views.PurchaseRecordExportView.as_view(), name="purchase-export"),
+    path("analysis/", views.SpendAnalysisView.as_view(), name="spend-analysis"),
+]
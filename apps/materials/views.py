@@ -1,3 +1,163 @@
-from django.shortcuts import render
+import typing
 
-# Create your views here.
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+
+from apps.materials import analysis
+from apps.materials import export as purchase_export
+from apps.materials.forms import PurchaseRecordQueryForm, SpendAnalysisQueryForm
+from apps.materials.models import PurchaseRecord
+from constants.code import Code
+from utils import export, restful
+from utils.api_exception import ApiError
+from utils.counting import CachedCount
+from utils.decorators import login_required
+from utils.query_budget import QueryBudget
+from utils.serialization import plan_queryset
+from utils.types import Request
+from utils.views import AsyncFilterApiView, FilterApiView
+
+
+class PurchaseRecordFilterMixin:
+    """采购记录及其汇总表通用的过滤方法, 配合 FilterApiView.filter_queryset 使用"""
+
+    # 查询集中表示采购日期的字段, 汇总表中为 period
+    date_field = "date"
+
+    def filter_date_from(self, filter_value, queryset):
+        """过滤:起始日期"""
+        return queryset.filter(**{f"{self.date_field}__gte": filter_value})
+
+    def filter_date_to(self, filter_value, queryset):
+        """过滤:截止日期"""
+        return queryset.filter(**{f"{self.date_field}__lte": filter_value})
+
+    def filter_category(self, filter_value, queryset):
+        """过滤:类别"""
+        return queryset.filter(category_id=filter_value)
+
+    def filter_supplier(self, filter_value, queryset):
+        """过滤:供货商"""
+        return queryset.filter(supplier_id=filter_value)
+
+    def filter_name(self, filter_value, queryset):
+        """过滤:名称"""
+        return queryset.filter(name=filter_value)
+
+    def filter_unit(self, filter_value, queryset):
+        """过滤:单位"""
+        return queryset.filter(unit=filter_value)
+
+
+class PurchaseRecordListView(PurchaseRecordFilterMixin, AsyncFilterApiView):
+    """采购记录列表, 使用游标分页"""
+    Model = PurchaseRecord
+    QueryForm = PurchaseRecordQueryForm
+    order_by: typing.Sequence[str] = ["-date", "-created_at"]
+    pagination_mode = "cursor"
+    count_strategy = CachedCount(timeout=300)
+    # 当前用户、总数、当前页; 关联数据随当前页一起查询
+    query_budget = QueryBudget(queries=3, duplicates=0)
+    # to_dict 参数, 同时用于规划查询集的关联查询
+    serialize_options = {"relation": True, "relation_data": True}
+    raw_data = True
+
+    @method_decorator(login_required)
+    async def get(self, request: Request, *args, **kwargs):
+        return await self.list(request)
+
+    def serialization(self, object_list) -> list:
+        # 保留 Decimal/date 等原始值, 由 restful 的 JSON 编码器一次完成格式化
+        return [record.to_dict(raw_data=True, **self.serialize_options) for record in object_list]
+
+    def get_init_queryset(self):
+        return plan_queryset(super().get_init_queryset(), **self.serialize_options)
+
+
+class PurchaseRecordExportView(PurchaseRecordFilterMixin, FilterApiView):
+    """
+    导出采购记录, 流式输出, 内存占用与行数无关
+
+    GET 参数:
+        format: csv(默认), ndjson, xlsx
+        其余过滤参数同采购记录列表
+    """
+    Model = PurchaseRecord
+    QueryForm = PurchaseRecordQueryForm
+    # 与 purchase_date_created_idx 的列顺序一致, 导出时不需要额外排序
+    order_by: typing.Sequence[str] = ["date", "created_at", "id"]
+    # 当前用户、分块读取的全部数据
+    query_budget = QueryBudget(queries=2, duplicates=0)
+
+    @method_decorator(login_required)
+    def get(self, request: Request, *args, **kwargs):
+        return self.export(request)
+
+    def export(self, request: Request):
+        export_format = export.FORMATS.get(request.GET.get("format", "csv"))
+        if export_format is None:
+            return restful.bad_request(Code.导出格式不正确, message=Code.message(Code.导出格式不正确))
+        try:
+            queryset = self.filter_queryset(
+                self.get_init_queryset(), self.get_query_data(request)
+            )
+        except ApiError as e:
+            return restful.bad_request(e.code, message=e.message)
+
+        rows = purchase_export.export_rows(queryset.order_by(*self.order_by))
+        response = StreamingHttpResponse(
+            export_format.stream(purchase_export.COLUMNS, rows),
+            content_type=export_format.content_type,
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="purchase_records.{export_format.extension}"'
+        )
+        return response
+
+
+class SpendAnalysisView(PurchaseRecordFilterMixin, AsyncFilterApiView):
+    """
+    采购支出统计
+
+    GET 参数:
+        group_by: day/week/month(至多一个), category, supplier, unit, name
+        measures: total_amount, actual_paid, quantity, discount, count
+        order_by: 维度列名或统计指标名, 前缀 - 表示倒序
+        date_from, date_to, category, supplier, name, unit: 过滤条件
+    """
+    Model = PurchaseRecord
+    QueryForm = SpendAnalysisQueryForm
+    order_by: typing.Sequence[str] = []
+    query_budget = QueryBudget(queries=3, duplicates=0)
+
+    @method_decorator(login_required)
+    async def get(self, request: Request, *args, **kwargs):
+        return await self.analyse(request)
+
+    async def analyse(self, request: Request):
+        await self.load_user(request)
+        try:
+            query_data = self.get_query_data(request)
+            dimensions, measures = query_data["group_by"], query_data["measures"]
+            self.Model = analysis.choose_source(dimensions, query_data)
+            self.date_field = analysis.date_field(self.Model)
+            order_by = self.get_order_by(dimensions, measures)
+            queryset = self.filter_queryset(self.get_init_queryset(), query_data)
+        except ApiError as e:
+            return restful.bad_request(e.code, message=e.message)
+
+        results = await analysis.aaggregate(queryset, dimensions, measures, order_by)
+        return restful.ok(
+            group_by=dimensions,
+            measures=measures,
+            source=self.Model._meta.model_name,
+            results=results,
+        )
+
+    def get_order_by(self, dimensions: list, measures: list) -> list:
+        """校验排序字段, 仅允许按维度列或统计指标排序"""
+        allowed = {*analysis.output_columns(dimensions), *measures}
+        for name in self.order_by:
+            if name.lstrip("-") not in allowed:
+                raise ApiError(Code.排序字段不正确, message=Code.message(Code.排序字段不正确))
+        return self.order_by
@@ -6,4 +6,11 @@ class UserConfig(AppConfig):
     name = 'apps.user'
 
     def ready(self):
-        import apps.user.signals
\ No newline at end of file
+        import apps.user.policies
+        import apps.user.signals
+        from apps.user.cache import user_cache
+        from apps.user.utils import auth_tokens
+        from utils.instrumentation import metrics
+
+        metrics.register_cache("user", user_cache.stats)
+        metrics.register_cache("jwt", auth_tokens.cache.stats)
@@ -0,0 +1,101 @@
+"""
+进程内的 User 缓存
+
+ParsingJWTAuthMiddleware 每个已登录请求都要按 id 读取用户, 这里按 id 缓存 User 行(LRU + TTL),
+稳定状态下鉴权不再查询数据库. 本进程内 User 的 save/delete 通过 apps.user.signals 使缓存失效;
+其他进程的修改及 QuerySet.update 等不发信号的写入, 最迟在 USER_CACHE_TTL 秒后生效.
+"""
+import copy
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+from django.conf import settings
+
+from apps.user.models import User
+
+
+class UserCache:
+    def __init__(self, maxsize: typing.Optional[int] = None, ttl: typing.Optional[float] = None):
+        """
+        :param maxsize: 最多缓存的用户数, 默认 settings.USER_CACHE_SIZE
+        :param ttl: 缓存有效秒数, 默认 settings.USER_CACHE_TTL; 为 0 时不缓存
+        """
+        self.maxsize = maxsize if maxsize is not None else settings.USER_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.USER_CACHE_TTL
+        self.hits = 0
+        self.misses = 0
+        # id -> (过期时间, User), 按最近使用排序
+        self._users: typing.OrderedDict[int, typing.Tuple[float, User]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, pk: int) -> typing.Optional[User]:
+        """取用户, 不存在时返回 None; 返回的是副本, 修改它不影响缓存"""
+        user = self.lookup(pk)
+        return user if user is not None else self.load(pk)
+
+    async def aget(self, pk: int) -> typing.Optional[User]:
+        """get 的异步版本, 未命中时使用异步 ORM 读取"""
+        user = self.lookup(pk)
+        return user if user is not None else await self.aload(pk)
+
+    def lookup(self, pk: int) -> typing.Optional[User]:
+        """只查缓存, 未命中或已过期时返回 None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(pk)
+            if entry is not None and entry[0] > now:
+                self._users.move_to_end(pk)
+                self.hits += 1
+                return copy.copy(entry[1])
+            self.misses += 1
+        return None
+
+    def load(self, pk: int) -> typing.Optional[User]:
+        """从数据库读取用户并放入缓存"""
+        return self.store(pk, User.objects.filter(pk=pk).first())
+
+    async def aload(self, pk: int) -> typing.Optional[User]:
+        """load 的异步版本"""
+        return self.store(pk, await User.objects.filter(pk=pk).afirst())
+
+    def store(self, pk: int, user: typing.Optional[User]) -> typing.Optional[User]:
+        if user is None or self.ttl <= 0:
+            return user
+        with self._lock:
+            self._users[pk] = (time.monotonic() + self.ttl, user)
+            self._users.move_to_end(pk)
+            while len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+        return copy.copy(user)
+
+    def invalidate(self, pk: int) -> None:
+        with self._lock:
+            self._users.pop(pk, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._users.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> typing.Dict[str, typing.Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._users),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+            }
+
+
+user_cache = UserCache()
+
+
+def bypass_user_cache(view):
+    """
+    标记视图(函数或视图类)每次从数据库读取当前用户, 用于需要最新用户数据的接口, 如修改密码
+    """
+    view.bypass_user_cache = True
+    return view
@@ -1,28 +1,98 @@
-from django.core.exceptions import ObjectDoesNotExist
+from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
-from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
 
-from apps.user.models import User
+from apps.user.cache import user_cache
+from apps.user.models import TokenUser
 from apps.user.utils import decode_jwt_token
+from utils.instrumentation import stage
+from utils.middleware import AsyncMiddlewareMixin
 
 
-class ParsingJWTAuthMiddleware(MiddlewareMixin):
+class ParsingJWTAuthMiddleware(AsyncMiddlewareMixin):
+    """
+    按 token 设置 request.user, 每个请求只校验一次 token, 解析结果保存在 request.jwt_token/jwt_payload.
+
+    用户在首次访问 request.user 时才读取, 优先取自 user_cache; JWT_CLAIMS_ONLY 为真时直接由 token
+    中的用户信息构造 TokenUser, 不读取用户. 视图用 apps.user.cache.bypass_user_cache 标记后直接读数据库.
+    异步视图中使用 await request.auser(), 未命中缓存时用异步 ORM 读取.
+
+    process_request 只做 token 校验等 CPU 计算, ASGI 下直接在事件循环中执行
+    """
+
+    @staticmethod
+    def get_token(request):
+        token = request.META.get("HTTP_TOKEN", None)
+        if not token:
+            auth_header = request.META.get("HTTP_AUTHORIZATION", "")
+            if auth_header.startswith("Bearer "):
+                token = auth_header.split(" ")[1]
+        return token or request.COOKIES.get("token", None)  # js的websocket无法设置headers
+
     def process_request(self, request):
-        token = request.META.get("HTTP_TOKEN", None) \
-                or request.COOKIES.get("token", None)  # js的websocket无法设置headers
-        if token:
-            jwt_data = decode_jwt_token(token)
-        else:
-            jwt_data = None
+        with stage("auth"):
+            token = self.get_token(request)
+            if token:
+                jwt_data = decode_jwt_token(token)
+            else:
+                jwt_data = None
+        request.jwt_token = token
+        request.jwt_payload = jwt_data
 
+        # 没有解析出有效用户时沿用之前中间件设置的用户, 都没有则为匿名用户
+        fallback = getattr(request, "user", None)
+        if fallback is None:
+            fallback = AnonymousUser()
+        fallback_auser = getattr(request, "auser", None)
         if jwt_data:
-            try:
-                user = User.objects.get(pk=jwt_data["user_id"])
-                # 解析出有效用户则设置
-                setattr(request, "user", user)
-            except ObjectDoesNotExist:
-                pass
-
-        if getattr(request, "user", None) is None:
-            # 在这之前没有判断出身份则设为匿名用户
-            setattr(request, "user", AnonymousUser())
+            setattr(
+                request, "user", SimpleLazyObject(lambda: self.get_user(request, jwt_data, fallback))
+            )
+        else:
+            setattr(request, "user", fallback)
+
+        async def auser():
+            if not hasattr(request, "_acached_jwt_user"):
+                user = await self.aget_user(request, jwt_data) if jwt_data else None
+                if user is None:
+                    user = await fallback_auser() if fallback_auser is not None else fallback
+                request._acached_jwt_user = user
+            return request._acached_jwt_user
+
+        request.auser = auser
+
+    @staticmethod
+    def bypasses_user_cache(request) -> bool:
+        """当前视图是否用 bypass_user_cache 标记; 视图在 URL 解析后才确定"""
+        if getattr(request, "bypass_user_cache", False):
+            return True
+        match = getattr(request, "resolver_match", None)
+        if match is None:
+            return False
+        view_class = getattr(match.func, "view_class", None)
+        return getattr(match.func, "bypass_user_cache", False) or getattr(
+            view_class, "bypass_user_cache", False
+        )
+
+    @classmethod
+    def get_user(cls, request, jwt_data: dict, fallback):
+        user_id = jwt_data["user_id"]
+        with stage("user"):
+            if cls.bypasses_user_cache(request):
+                user = user_cache.load(user_id)
+            elif settings.JWT_CLAIMS_ONLY and "level" in jwt_data:
+                user = TokenUser(jwt_data)
+            else:
+                user = user_cache.get(user_id)
+        return user if user is not None else fallback
+
+    @classmethod
+    async def aget_user(cls, request, jwt_data: dict):
+        """get_user 的异步版本, 用户不存在时返回 None"""
+        user_id = jwt_data["user_id"]
+        with stage("user"):
+            if cls.bypasses_user_cache(request):
+                return await user_cache.aload(user_id)
+            if settings.JWT_CLAIMS_ONLY and "level" in jwt_data:
+                return TokenUser(jwt_data)
+            return await user_cache.aget(user_id)
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:04
+
+import django.core.validators
+import utils.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('name', models.CharField(blank=True, max_length=10, null=True, validators=[django.core.validators.MaxLengthValidator(limit_value=10, message='名字过长')], verbose_name='用户姓名')),
+                ('phone', models.CharField(error_messages={'unique': '用户已存在'}, max_length=11, unique=True, validators=[django.core.validators.RegexValidator(message='手机号格式不正确', regex='1[3456789]\\d{9}'), django.core.validators.MaxLengthValidator(limit_value=11, message='手机号格式不正确')], verbose_name='手机号码')),
+                ('level', models.PositiveSmallIntegerField(choices=[(0, '用户'), (1, '员工'), (2, '管理员')], default=0, verbose_name='级别')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='注册时间')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '用户基本信息',
+                'verbose_name_plural': '用户基本信息',
+            },
+            bases=(models.Model, utils.models.ModelUpdateMixin),
+        ),
+    ]
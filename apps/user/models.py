@@ -58,3 +58,30 @@ class User(AbstractBaseUser, ModelUpdateMixin):
     def update_last_login(self):
         self.last_login = timezone.now()
         self.save(update_fields=["last_login"])
+
+
+class TokenUser:
+    """
+    JWT_CLAIMS_ONLY 模式下由 token 中的用户信息构造的用户, 不查询数据库
+
+    只提供鉴权与权限判断所需的 id/level/name, 需要完整用户数据的视图应使用
+    apps.user.cache.bypass_user_cache. level 等信息在 token 过期前不会随用户修改而变化.
+    """
+    is_active = True
+    is_anonymous = False
+    is_authenticated = True
+    LEVEL = User.LEVEL
+
+    def __init__(self, claims: dict):
+        self.id = self.pk = claims["user_id"]
+        self.level = claims["level"]
+        self.name = claims.get("name")
+
+    def __str__(self):
+        return f"TokenUser({self.id})"
+
+    def __eq__(self, other):
+        return isinstance(other, (TokenUser, User)) and self.pk == other.pk
+
+    def __hash__(self):
+        return hash(self.pk)
@@ -0,0 +1,11 @@
+from django.db.models import Q
+
+from apps.user.models import User
+from utils.policies import ALL, CurrentUser, policies
+
+# 管理员可以查看所有用户, 员工可以查看员工和客户, 客户只能查看自己
+policies.register(User, "view", {
+    User.LEVEL.管理员: ALL,
+    User.LEVEL.员工: Q(level__lt=User.LEVEL.管理员),
+    User.LEVEL.用户: Q(pk=CurrentUser("id")),
+})
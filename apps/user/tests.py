@@ -0,0 +1,624 @@
+import datetime
+import json
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import FieldError
+from django.db.models import Q
+from django.http import HttpResponse
+from django.core.exceptions import MiddlewareNotUsed, RequestDataTooBig
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from apps.user.cache import user_cache
+from apps.user.models import User
+from apps.user.utils import auth_tokens, decode_jwt_token, generate_jwt_token
+from apps.user.views import UserListView
+from constants.code import Code
+from utils import ChoiceEnum, instrumentation, jsoncodec, profiling
+from utils.api_exception import ApiError
+from utils.instrumentation import BUCKETS, InstrumentationMiddleware, Metrics, Timings, metrics, stage
+from utils.middleware import (
+    BODY_CHUNK_SIZE,
+    ExceptionMiddleware,
+    ParsedRequestMixin,
+    RequestParsingError,
+    RequestParsingMiddleware,
+    read_body,
+)
+from utils.paginator import CursorPaginator
+from utils.policies import ALL, CurrentUser, PolicyRegistry, policies
+from utils.profiling import ProfileStore, ProfilingMiddleware
+from utils.query_budget import QueryBudget, QueryBudgetExceeded, assert_query_budget
+from utils.tokens import TokenService
+
+
+class ChoiceEnumTests(SimpleTestCase):
+    def test_level_choices(self):
+        self.assertEqual(User.LEVEL.管理员, 2)
+        self.assertEqual(list(User.LEVEL), [(0, "用户"), (1, "员工"), (2, "管理员")])
+        self.assertEqual(User._meta.get_field("level").choices, list(User.LEVEL))
+
+    def test_alias(self):
+        class Status(ChoiceEnum):
+            active = 1
+            enabled = 1
+            disabled = 2
+
+            @staticmethod
+            def __admin__():
+                return {"disabled": "停用"}
+
+        self.assertEqual(Status.enabled, 1)
+        self.assertEqual(list(Status), [(1, "active"), (2, "停用")])
+        self.assertEqual(list(Status.iter()), [(1, "active"), (2, "disabled")])
+
+
+class ApiTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(phone="13900000000", level=User.LEVEL.管理员)
+        cls.employee = User.objects.create(phone="13900000001", level=User.LEVEL.员工)
+        cls.customer = User.objects.create(phone="13900000002", level=User.LEVEL.用户)
+        User.objects.bulk_create([User(phone=f"1380000{i:04d}", level=i % 2) for i in range(20)])
+
+    def get(self, path, user, **params):
+        return self.client.get(path, params, headers={"token": generate_jwt_token(user)})
+
+
+@override_settings(QUERY_BUDGET_ACTION="raise")
+class QueryBudgetTests(ApiTestCase):
+    def test_within_budget(self):
+        response = self.get("/api/user/users/", self.admin)
+        self.assertEqual(response.status_code, 200)
+        assert_query_budget(response)
+        self.assertEqual(response.wsgi_request.query_stats.duplicates, 0)
+
+    def test_assert_requires_test_client_response(self):
+        with self.assertRaisesMessage(AssertionError, "测试客户端"):
+            assert_query_budget(HttpResponse())
+        response = self.get("/api/user/users/", self.admin)
+        del response.wsgi_request.query_stats
+        with self.assertRaisesMessage(AssertionError, "QueryBudgetMiddleware"):
+            assert_query_budget(response)
+
+    @override_settings(QUERY_BUDGET_ACTION="log")
+    def test_log_action(self):
+        with mock.patch.object(UserListView, "query_budget", QueryBudget(queries=1)):
+            with self.assertLogs("utils.query_budget", "WARNING"):
+                response = self.get("/api/user/users/", self.admin)
+        self.assertEqual(response.status_code, 200)
+
+    def test_over_budget_raises(self):
+        with mock.patch.object(UserListView, "query_budget", QueryBudget(queries=1)):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.get("/api/user/users/", self.admin)
+
+    def test_streaming_over_budget_logs(self):
+        with mock.patch.object(UserListView, "query_budget", QueryBudget(queries=1)):
+            response = self.get("/api/user/users/", self.admin, stream=1)
+            self.assertEqual(response.status_code, 200)
+            with self.assertLogs("utils.query_budget", "WARNING") as logs:
+                content = b"".join(response.streaming_content)
+            # 测试中检查时仍然抛出异常
+            with self.assertRaises(QueryBudgetExceeded):
+                assert_query_budget(response)
+        self.assertEqual(len(json.loads(content)["results"]), 23)
+        self.assertIn("queries > 1", logs.output[0])
+
+
+class CursorPaginatorTests(ApiTestCase):
+    def walk(self, ordering, per_page=4):
+        """从第一页向后翻到底, 再从最后一页向前翻回第一页"""
+        paginator = CursorPaginator(User.objects.all(), ordering, per_page)
+        forward, page = [], paginator.page()
+        self.assertFalse(page.has_previous())
+        while True:
+            forward.append([user.pk for user in page.object_list])
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        backward = [[user.pk for user in page.object_list]]
+        while page.has_previous():
+            page = paginator.page(page.previous_cursor)
+            backward.append([user.pk for user in page.object_list])
+        return forward, backward[::-1]
+
+    def test_pages_follow_ordering(self):
+        for ordering in (["level"], ["-level", "phone"], ["-created_at"], ["pk"]):
+            with self.subTest(ordering=ordering):
+                expected = list(
+                    User.objects.order_by(*CursorPaginator.get_ordering(User, ordering)).values_list("pk", flat=True)
+                )
+                forward, backward = self.walk(ordering)
+                self.assertEqual(sum(forward, []), expected)
+                self.assertTrue(all(len(page) == 4 for page in forward[:-1]))
+                self.assertEqual(backward, forward)
+
+    def test_unique_ordering(self):
+        self.assertEqual(CursorPaginator.get_ordering(User, ["-level"]), ["-level", "-pk"])
+        self.assertEqual(CursorPaginator.get_ordering(User, ["level", "-id"]), ["level", "-id"])
+
+    def test_invalid_cursor(self):
+        paginator = CursorPaginator(User.objects.all(), ["level"], 4)
+        cursor = paginator.page().next_cursor
+        other = CursorPaginator(User.objects.all(), ["-level"], 4)
+        for value in ("bad", cursor[:-3], "e30"):
+            with self.subTest(cursor=value), self.assertRaises(ApiError) as error:
+                paginator.page(value)
+            self.assertEqual(error.exception.code, Code.游标不正确)
+        with self.assertRaises(ApiError):
+            other.page(cursor)
+
+    def test_invalid_ordering(self):
+        with self.assertRaises(ApiError) as error:
+            CursorPaginator(User.objects.all(), ["password__len"], 4)
+        self.assertEqual(error.exception.code, Code.排序字段不正确)
+
+    def test_nullable_ordering(self):
+        User.objects.filter(pk=self.admin.pk).update(
+            last_login=datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc)
+        )
+        for ordering in (["last_login"], ["-level", "-last_login"]):
+            with self.subTest(ordering=ordering), self.assertRaises(ApiError) as error:
+                CursorPaginator(User.objects.all(), ordering, 4)
+            self.assertEqual(error.exception.code, Code.排序字段不正确)
+        with mock.patch.object(UserListView, "pagination_mode", "cursor"):
+            response = self.get("/api/user/users/", self.admin, order_by="-last_login")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["code"], Code.排序字段不正确)
+
+
+class PolicyTests(ApiTestCase):
+    def visible(self, user):
+        return set(policies.scope(User.objects.all(), user).values_list("pk", flat=True))
+
+    def test_scope_per_level(self):
+        everyone = set(User.objects.values_list("pk", flat=True))
+        self.assertEqual(self.visible(self.admin), everyone)
+        self.assertEqual(
+            self.visible(self.employee),
+            set(User.objects.exclude(level=User.LEVEL.管理员).values_list("pk", flat=True)),
+        )
+        self.assertEqual(self.visible(self.customer), {self.customer.pk})
+        self.assertEqual(self.visible(AnonymousUser()), set())
+        self.assertEqual(self.visible(None), set())
+
+    def test_user_list(self):
+        for user, count in ((self.admin, 23), (self.employee, 22), (self.customer, 1)):
+            with self.subTest(level=user.level):
+                response = self.get("/api/user/users/", user, page_size=50)
+                self.assertEqual(response.status_code, 200, response.content)
+                body = response.json()
+                self.assertEqual(body["count"], count)
+                self.assertEqual(len(body["results"]), count)
+                self.assertNotIn("password", body["results"][0])
+
+    def test_registry(self):
+        registry = PolicyRegistry()
+        template = Q(level__gte=1) & Q(Q(pk=CurrentUser("id")) | Q(name=CurrentUser("name")))
+        registry.register(User, "edit", {User.LEVEL.员工: template, User.LEVEL.管理员: ALL})
+        self.assertTrue(registry.is_registered(User, "edit"))
+        self.assertFalse(registry.is_registered(User))
+        self.assertEqual(registry.q(User, self.customer), ALL)
+        self.assertIsNone(registry.q(User, self.customer, "edit"))
+        self.assertEqual(registry.q(User, self.admin, "edit"), ALL)
+        self.assertEqual(
+            registry.q(User, self.employee, "edit"),
+            Q(level__gte=1) & Q(Q(pk=self.employee.pk) | Q(name=None)),
+        )
+        # 模板本身不被修改, 不引用用户的部分原样复用
+        self.assertIsInstance(template.children[1].children[0][1], CurrentUser)
+        self.assertIs(registry.q(User, self.employee, "edit").children[0], template.children[0])
+
+    def test_invalid_lookup(self):
+        with self.assertRaises(FieldError):
+            PolicyRegistry().register(User, "view", {User.LEVEL.员工: Q(levle=1)})
+
+
+class TokenServiceTests(SimpleTestCase):
+    def service(self, key="k" * 32, **kwargs):
+        kwargs.setdefault("lifetime", datetime.timedelta(hours=1))
+        return TokenService("HS256", lambda: key, **kwargs)
+
+    def test_verified_once(self):
+        service = self.service()
+        token = service.encode({"user_id": 1})
+        payload = service.decode(token)
+        self.assertEqual(payload["user_id"], 1)
+        payload["user_id"] = 2
+        with mock.patch("utils.tokens.jwt.decode") as decode:
+            self.assertEqual(service.decode(token)["user_id"], 1)
+        decode.assert_not_called()
+        self.assertEqual(service.cache.stats(), {"hits": 1, "misses": 1, "size": 1, "maxsize": 1024})
+
+    def test_keys_load_lazily(self):
+        signing, verifying = mock.Mock(return_value="k" * 32), mock.Mock(return_value="k" * 32)
+        service = TokenService("HS256", signing, verifying, lifetime=datetime.timedelta(hours=1))
+        token = service.encode({"user_id": 1})
+        verifying.assert_not_called()
+        service.decode(token)
+        service.decode(service.encode({"user_id": 2}))
+        signing.assert_called_once()
+        verifying.assert_called_once()
+
+    def test_invalid_tokens_not_cached(self):
+        service = self.service()
+        expired = self.service(lifetime=datetime.timedelta(seconds=-1)).encode({"user_id": 1})
+        forged = self.service(key="x" * 32).encode({"user_id": 1})
+        for token in (expired, forged, "garbage"):
+            self.assertIsNone(service.decode(token))
+        self.assertEqual(service.cache.stats()["size"], 0)
+
+    def test_cached_token_expires(self):
+        service = self.service()
+        token = service.encode({"user_id": 1})
+        service.decode(token)
+        exp = service.cache.get(token)["exp"]
+        with mock.patch("utils.tokens.time.time", return_value=exp):
+            self.assertIsNone(service.cache.get(token))
+        self.assertEqual(service.cache.stats()["size"], 0)
+
+    def test_lru(self):
+        service = self.service(cache_size=2)
+        tokens = [service.encode({"user_id": i}) for i in range(3)]
+        for token in (tokens[0], tokens[1], tokens[0], tokens[2]):
+            service.decode(token)
+        self.assertIsNotNone(service.cache.get(tokens[0]))
+        self.assertIsNone(service.cache.get(tokens[1]))
+        self.assertIsNotNone(service.cache.get(tokens[2]))
+
+    def test_cache_disabled(self):
+        service = self.service(cache_size=0)
+        token = service.encode({"user_id": 1})
+        self.assertIsNotNone(service.decode(token))
+        self.assertEqual(service.cache.stats()["size"], 0)
+
+    def test_key_rotation(self):
+        key = ["k" * 32]
+        service = TokenService("HS256", lambda: key[0], lifetime=datetime.timedelta(hours=1))
+        token = service.encode({"user_id": 1})
+        service.decode(token)
+        key[0] = "n" * 32
+        del service.signing_key, service.verifying_key
+        # 更换密钥后旧 token 在清空缓存前仍然有效
+        self.assertIsNotNone(service.decode(token))
+        service.cache.clear()
+        self.assertIsNone(service.decode(token))
+        self.assertIsNotNone(service.decode(service.encode({"user_id": 1})))
+
+
+class AuthenticationTests(ApiTestCase):
+    def setUp(self):
+        user_cache.clear()
+        auth_tokens.cache.clear()
+
+    def test_cached_user(self):
+        self.assertEqual(self.get("/api/user/users/", self.admin).status_code, 200)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get("/api/user/users/", self.admin).status_code, 200)
+
+    def test_level_change_applies_immediately(self):
+        token = generate_jwt_token(self.employee)
+        headers = {"token": token}
+        self.assertEqual(self.client.get("/api/user/users/", headers=headers).json()["count"], 22)
+        self.employee.level = User.LEVEL.用户
+        self.employee.save()
+        self.assertEqual(self.client.get("/api/user/users/", headers=headers).json()["count"], 1)
+
+    def test_deleted_user_token_rejected(self):
+        token = generate_jwt_token(self.employee)
+        self.assertEqual(self.client.get("/api/user/users/", headers={"token": token}).status_code, 200)
+        self.employee.delete()
+        response = self.client.get("/api/user/users/", headers={"token": token})
+        self.assertNotEqual(response.status_code, 200)
+        self.assertFalse(response.wsgi_request.user.is_authenticated)
+
+    @override_settings(JWT_CLAIMS_ONLY=True)
+    def test_claims_only(self):
+        token = generate_jwt_token(self.employee)
+        with self.assertNumQueries(2):
+            body = self.client.get("/api/user/users/", headers={"token": token}).json()
+        self.assertEqual(body["count"], 22)
+        # 用户信息取自 token, 修改在 token 过期前不生效
+        User.objects.filter(pk=self.employee.pk).update(level=User.LEVEL.用户)
+        self.assertEqual(self.client.get("/api/user/users/", headers={"token": token}).json()["count"], 22)
+
+
+class RequestParsingTests(SimpleTestCase):
+    factory = RequestFactory()
+
+    def parse(self, request):
+        self.assertIsNone(RequestParsingMiddleware(lambda r: None).process_request(request))
+        return request
+
+    def test_body_parsed_on_first_access(self):
+        request = self.parse(self.factory.post("/", {"phone": "13900000000"}, content_type="application/json"))
+        self.assertFalse(hasattr(request, "_body"))
+        self.assertNotIn("JSON", request.__dict__)
+        with mock.patch("utils.jsoncodec.loads", wraps=jsoncodec.loads) as loads:
+            self.assertEqual(request.DATA, {"phone": "13900000000"})
+            self.assertIs(request.JSON, request.DATA)
+        loads.assert_called_once()
+        # 读取后 request.body 仍然可用
+        self.assertEqual(json.loads(request.body), {"phone": "13900000000"})
+
+    def test_form_data(self):
+        request = self.parse(
+            self.factory.put("/", "name=a&name=b", content_type="application/x-www-form-urlencoded")
+        )
+        self.assertIsNone(request.JSON)
+        self.assertEqual(request.DATA.getlist("name"), ["a", "b"])
+        self.assertEqual(request.method, "PUT")
+
+    def test_invalid_json(self):
+        request = self.parse(self.factory.post("/", "{bad", content_type="application/json"))
+        with self.assertRaises(RequestParsingError):
+            request.DATA
+        response = ExceptionMiddleware(lambda r: None).process_exception(request, RequestParsingError("bad"))
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(REQUEST_BODY_MAX_SIZE=16)
+    def test_body_too_large(self):
+        request = self.parse(self.factory.post("/", {"name": "x" * 32}, content_type="application/json"))
+        with self.assertRaises(RequestDataTooBig):
+            request.JSON
+        # 没有 Content-Length(如分块传输)时读取到超出部分即中止
+        request = self.parse(self.factory.post("/", {"name": "x" * 32}, content_type="application/json"))
+        del request.META["CONTENT_LENGTH"]
+        request._stream = BytesIO(b"x" * (BODY_CHUNK_SIZE * 2))
+        with self.assertRaises(RequestDataTooBig):
+            read_body(request, BODY_CHUNK_SIZE)
+
+    @override_settings(REQUEST_BODY_MAX_SIZE=16)
+    def test_form_body_too_large(self):
+        body = "name=" + "x" * 32
+        for method in ("post", "put", "patch"):
+            with self.subTest(method=method):
+                request = self.parse(
+                    getattr(self.factory, method)("/", body, content_type="application/x-www-form-urlencoded")
+                )
+                with self.assertRaises(RequestDataTooBig):
+                    request.DATA
+        request = self.parse(self.factory.post("/", "name=x", content_type="application/x-www-form-urlencoded"))
+        self.assertEqual(request.DATA["name"], "x")
+        # multipart 由 Django 流式解析, 不整体读入
+        request = self.parse(self.factory.post("/", {"name": "x" * 32}))
+        self.assertEqual(request.DATA["name"], "x" * 32)
+
+    def test_octet_stream_rejected(self):
+        request = self.factory.post("/", b"data", content_type="application/octet-stream")
+        response = RequestParsingMiddleware(lambda r: None).process_request(request)
+        self.assertEqual(response.status_code, 400)
+
+    def test_request_class_reused(self):
+        first = self.parse(self.factory.get("/"))
+        second = self.parse(self.factory.get("/"))
+        self.assertIs(first.__class__, second.__class__)
+        self.assertIsInstance(first, ParsedRequestMixin)
+
+
+class LoginTests(ApiTestCase):
+    def test_register_and_login(self):
+        response = self.client.post(
+            "/api/user/register/", {"phone": "13700000000", "password": "Secret654321"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        response = self.client.post(
+            "/api/user/login/", {"phone": "13700000000", "password": "Secret654321"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(decode_jwt_token(response.json()["result"]["token"])["user_id"], response.json()["result"]["id"])
+
+
+class JsonCodecTests(ApiTestCase):
+    def test_default_matches_django_encoder(self):
+        value = {
+            "datetime": datetime.datetime(2026, 10, 18, 18, 16, 3, 695123, tzinfo=datetime.timezone.utc),
+            "date": datetime.date(2026, 10, 18),
+            "time": datetime.time(12, 30, 15),
+            "decimal": Decimal("1.50"),
+        }
+        expected = json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(",", ":")).encode()
+        for backend in ("json", "orjson"):
+            with self.subTest(backend=backend), override_settings(JSON_BACKEND=backend):
+                self.assertEqual(jsoncodec.dumps(value), expected)
+                self.assertEqual(
+                    json.loads(jsoncodec.dumps(value, raw_data=True)),
+                    {"datetime": "2026-10-18 18:16:03", "date": "2026-10-18", "time": "12:30", "decimal": "1.50"},
+                )
+
+    def test_last_login_format(self):
+        User.objects.filter(pk=self.admin.pk).update(
+            last_login=datetime.datetime(2026, 10, 18, 18, 16, 3, 695123, tzinfo=datetime.timezone.utc)
+        )
+        response = self.get("/api/user/users/", self.admin, page_size=50)
+        self.assertEqual(response.status_code, 200)
+        users = {user["id"]: user for user in response.json()["results"]}
+        self.assertEqual(users[self.admin.pk]["last_login"], "2026-10-18T18:16:03.695Z")
+
+        self.admin.refresh_from_db()
+        self.admin.set_password("Secret654321")
+        self.admin.save()
+        response = self.client.post(
+            "/api/user/login/", {"phone": self.admin.phone, "password": "Secret654321"}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["result"]["last_login"], "2026-10-18T18:16:03.695Z")
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0.0, PROFILING_MODE="cprofile")
+class ProfilingTests(ApiTestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        override = override_settings(PROFILING_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def profile(self, user, mode="cprofile", **params):
+        return self.client.get(
+            "/api/user/users/", params, headers={"token": generate_jwt_token(user), "X-Profile": mode}
+        )
+
+    def test_header_admin_only(self):
+        response = self.profile(self.employee)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+        response = self.profile(self.admin)
+        name = response.headers["X-Profile-Id"]
+        self.assertTrue(name.endswith(".prof"))
+        self.assertTrue((self.directory / name).is_file())
+
+        response = self.profile(self.admin, "sample")
+        name = response.headers["X-Profile-Id"]
+        self.assertTrue(name.endswith(".speedscope.json"))
+        self.assertEqual(json.loads((self.directory / name).read_text())["profiles"][0]["type"], "sampled")
+
+    @override_settings(PROFILING_SAMPLE_RATE=1.0)
+    def test_sample_rate(self):
+        response = self.get("/api/user/users/", self.employee)
+        self.assertTrue(response.headers["X-Profile-Id"].endswith(".prof"))
+
+    def test_busy(self):
+        # 其他请求正在分析时照常处理, 不分析
+        with profiling._busy:
+            response = self.profile(self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertIn("X-Profile-Id", self.profile(self.admin).headers)
+
+    def test_prune(self):
+        store = ProfileStore(self.directory, max_files=3)
+        names = [f"20260101-00000{i}-000-1-GET-api-{i}ms.prof" for i in range(5)]
+        for name in names:
+            (self.directory / name).write_bytes(b"")
+        (self.directory / "其他 文件").write_bytes(b"")
+        store.prune()
+        self.assertEqual([path.name for path in store.files()], names[:1:-1])
+        self.assertTrue((self.directory / "其他 文件").exists())
+
+    def test_path(self):
+        store = ProfileStore(self.directory)
+        (self.directory / "a.prof").write_bytes(b"")
+        (self.directory / ".hidden").write_bytes(b"")
+        self.assertEqual(store.path("a.prof"), self.directory / "a.prof")
+        self.assertIsNone(store.path("missing.prof"))
+        self.assertIsNone(store.path(".hidden"))
+        self.assertIsNone(store.path("../a.prof"))
+        self.assertIsNone(store.path(".."))
+
+    def test_views_admin_only(self):
+        name = self.profile(self.admin).headers["X-Profile-Id"]
+        for user in (self.employee, self.customer):
+            for path in ("/api/profiles/", f"/api/profiles/{name}"):
+                response = self.get(path, user)
+                self.assertEqual(response.status_code, 403)
+                self.assertEqual(response.json()["code"], Code.无权查看性能分析)
+
+        response = self.get("/api/profiles/", self.admin)
+        self.assertEqual([profile["name"] for profile in response.json()["results"]], [name])
+        response = self.get(f"/api/profiles/{name}", self.admin)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), (self.directory / name).read_bytes())
+        response = self.get("/api/profiles/missing.prof", self.admin)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()["code"], Code.性能分析不存在)
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(lambda request: None)
+        response = self.profile(self.admin)
+        self.assertNotIn("X-Profile-Id", response.headers)
+
+
+class InstrumentationTests(ApiTestCase):
+    def setUp(self):
+        metrics.clear()
+        self.addCleanup(metrics.clear)
+
+    def test_render(self):
+        registry = Metrics()
+        registry.observe("http_request_duration_seconds", 0.003, view="user:user-list", method="GET")
+        registry.observe("http_request_duration_seconds", 20, view="user:user-list", method="GET")
+        registry.observe("http_request_stage_duration_seconds", 0.0001, stage='a"b\nc')
+        registry.register_cache("user", lambda: {"hits": 3, "misses": 1, "size": 1, "maxsize": 8})
+        lines = registry.render().splitlines()
+        labels = 'method="GET",view="user:user-list"'
+        for line in (
+            "# HELP http_request_duration_seconds Request duration by view",
+            "# TYPE http_request_duration_seconds histogram",
+            f'http_request_duration_seconds_bucket{{{labels},le="0.0025"}} 0',
+            f'http_request_duration_seconds_bucket{{{labels},le="0.005"}} 1',
+            f'http_request_duration_seconds_bucket{{{labels},le="10.0"}} 1',
+            f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            f"http_request_duration_seconds_sum{{{labels}}} 20.003",
+            f"http_request_duration_seconds_count{{{labels}}} 2",
+            'http_request_stage_duration_seconds_count{stage="a\\"b\\nc"} 1',
+            "# TYPE cache_hits_total counter",
+            'cache_hits_total{cache="user"} 3',
+            'cache_maxsize{cache="user"} 8',
+        ):
+            self.assertIn(line, lines)
+        buckets = [line for line in lines if line.startswith("http_request_duration_seconds_bucket")]
+        self.assertEqual(len(buckets), len(BUCKETS) + 1)
+
+    def test_stage(self):
+        self.assertIs(stage("filter").__enter__(), None)
+        timings = Timings()
+        token = instrumentation._current.set(timings)
+        try:
+            with stage("outer"):
+                with stage("inner"):
+                    time.sleep(0.001)
+                with stage("inner"):
+                    pass
+            with self.assertRaises(ValueError):
+                with stage("failed"):
+                    raise ValueError()
+        finally:
+            instrumentation._current.reset(token)
+        self.assertEqual(set(timings.stages), {"outer", "inner", "failed"})
+        self.assertGreaterEqual(timings.stages["outer"], timings.stages["inner"])
+        self.assertGreaterEqual(timings.stages["inner"], 0.001)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = self.get("/api/user/users/", self.admin)
+        entries = dict(entry.split(";dur=") for entry in response.headers["Server-Timing"].split(", "))
+        self.assertLessEqual({"auth", "filter", "count", "serialize", "encode", "db", "total"}, set(entries))
+
+    @override_settings(SERVER_TIMING=True)
+    async def test_server_timing_async(self):
+        response = await self.async_client.get(
+            "/api/user/users/", headers={"token": generate_jwt_token(self.admin)}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("total;dur=", response.headers["Server-Timing"])
+        self.assertIn("serialize;dur=", response.headers["Server-Timing"])
+
+    def test_middleware_not_used(self):
+        with override_settings(METRICS_ENABLED=False, SERVER_TIMING=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                InstrumentationMiddleware(lambda request: None)
+            self.assertNotIn("Server-Timing", self.get("/api/user/users/", self.admin).headers)
+        with override_settings(METRICS_ENABLED=True, SERVER_TIMING=False):
+            InstrumentationMiddleware(lambda request: None)
+
+    @override_settings(METRICS_ENABLED=True)
+    def test_metrics_view(self):
+        self.get("/api/user/users/", self.admin)
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('view="user:user-list"', response.content.decode())
+        self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.1").status_code, 404)
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get("/metrics").status_code, 404)
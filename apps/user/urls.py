@@ -0,0 +1,11 @@
+from django.urls import path
+
+from apps.user import views
+
+app_name = "user"
+
+urlpatterns = [
+    path("register/", views.UserRegisterView.as_view(), name="register"),
+    path("login/", views.UserLoginView.as_view(), name="login"),
+    path("users/", views.UserListView.as_view(), name="user-list"),
+]
@@ -1,3 +1,5 @@
+import typing
+
 from django.contrib.auth.models import AnonymousUser
 from django.db.models import query, QuerySet
 
@@ -10,16 +12,18 @@ from apps.user.user_permissions.base_permissions import PermissionsError
 from constants.code import Code
 
 
+# 级别 -> 权限类, 其余级别为 CustomerAction
+LEVEL_ACTIONS = {
+    User.LEVEL.管理员: AdminAction,
+    User.LEVEL.员工: EmployeeAction,
+}
+
+
 class UserActionMixin:
     def __init__(self, user: User):
         if isinstance(user, AnonymousUser):
             raise PermissionsError(Code.CLIENT_UNAUTHORIZED, Code.message(Code.CLIENT_UNAUTHORIZED))
-        if user.level == User.LEVEL.管理员:
-            self.action = AdminAction(user)
-        elif user.level == User.LEVEL.员工:
-            self.action = EmployeeAction(user)
-        else:
-            self.action = CustomerAction(user)
+        self.action = LEVEL_ACTIONS.get(user.level, CustomerAction)(user)
 
 
 class UserSheetActionMixin(UserActionMixin):
@@ -47,4 +51,17 @@ class UserSheetActionMixin(UserActionMixin):
 class UserAction(
     UserSheetActionMixin,
 ):
-    pass
\ No newline at end of file
+    pass
+
+
+def get_user_action(request) -> UserAction:
+    """
+    当前请求用户的 UserAction, 每个请求只构造一次并保存在 request 上,
+    permit 装饰器与视图共用; request.user 被替换后重新构造
+    """
+    cached: typing.Optional[typing.Tuple[typing.Any, UserAction]] = getattr(request, "_user_action", None)
+    if cached is not None and cached[0] is request.user:
+        return cached[1]
+    action = UserAction(request.user)
+    request._user_action = (request.user, action)
+    return action
@@ -1,9 +1,12 @@
 import abc
+import typing
 
 from django.db.models import QuerySet
 
 from apps.user.models import User
+from constants.code import Code
 from utils.api_exception import ApiError
+from utils.policies import policies
 
 
 class PermissionsError(ApiError):
@@ -11,27 +14,40 @@ class PermissionsError(ApiError):
 
 
 class BaseUserSheetPermissions:
-    """用户表权限"""
+    """
+    用户表权限
+
+    与具体用户无关的权限在 permits 中按级别预先列出: 权限名 -> 无权时的错误码, None 表示有权限,
+    has_permit_<权限名> 直接查表; 需要按用户或视图判断的权限由子类重写对应方法
+    """
+
+    permits: typing.Dict[str, typing.Optional[int]] = {}
+
+    def check_permit(self, name: str) -> bool:
+        code = self.permits[name]
+        if code is None:
+            return True
+        raise PermissionsError(code, Code.message(code))
 
     def get_user_sheet_queryset(self) -> QuerySet:
-        """根据权限预设用户表查询列表范围"""
-        raise NotImplementedError()
+        """根据权限预设用户表查询列表范围, 见 apps.user.policies"""
+        return policies.scope(User.objects.all(), self._user)
 
     def has_permit_read_user(self, view):
         """可否查询用户"""
-        raise NotImplementedError()
+        return self.check_permit("read_user")
 
     def has_permit_create_user(self):
         """可否创建用户"""
-        raise NotImplementedError()
+        return self.check_permit("create_user")
 
     def has_permit_edit_user(self):
         """可否编辑用户"""
-        raise NotImplementedError()
+        return self.check_permit("edit_user")
 
     def has_permit_del_user(self):
         """可否删除用户"""
-        raise NotImplementedError()
+        return self.check_permit("del_user")
 
 
 class PermissionsInitMixin(metaclass=abc.ABCMeta):
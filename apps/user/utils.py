@@ -1,38 +1,46 @@
 # accounts/utils.py  工具与鉴权
 
-import jwt  # 用于生成和解码JWT
 from django.http import JsonResponse  # 用于返回JSON响应
 from django.conf import settings  # 访问settings配置
-from datetime import datetime, timedelta, timezone  # 时间处理
+from datetime import timedelta  # 时间处理
+from utils.tokens import TokenService, setting_key
+from .cache import user_cache
 from .models import User  # 引入User模型
 
+# 登录 token; 非对称算法时 JWT_SECRET 为私钥, JWT_PUBLIC_KEY 为公钥
+auth_tokens = TokenService(
+    settings.JWT_ALGORITHM,
+    setting_key("JWT_SECRET"),
+    setting_key("JWT_PUBLIC_KEY", fallback="JWT_SECRET"),
+    lifetime=timedelta(hours=settings.JWT_EXP_DELTA_HOURS),
+    cache_size=settings.JWT_VERIFIED_CACHE_SIZE,
+)
+
+def user_claims(user):
+    """
+    写入 token 的用户信息; level/name 供 JWT_CLAIMS_ONLY 模式下不查询用户即可鉴权
+    """
+    return {
+        'user_id': user.id,  # 用户ID
+        'level': user.level,
+        'name': user.name,
+    }
+
 def generate_jwt_token(user):
     """
     生成JWT Token
     :param user: 用户对象
     :return: 加密后的JWT Token
     """
-    payload = {
-        'user_id': user.id,  # 用户ID
-        'exp': datetime.now(timezone.utc)+ timedelta(hours=settings.JWT_EXP_DELTA_HOURS),  # 过期时间
-        'iat': datetime.now(timezone.utc)  # 签发时间
-    }
-    token = jwt.encode(payload, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
-    return token
+    return auth_tokens.encode(user_claims(user))
 
 def decode_jwt_token(token):
     """
     解码JWT Token
     :param token: JWT Token字符串
-    :return: payload字典或None
+    :return: payload字典或None(过期或无效)
     """
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None  # Token过期
-    except jwt.InvalidTokenError:
-        return None  # Token无效
+    return auth_tokens.decode(token)
 
 def login_required(view_func):
     """
@@ -45,12 +53,16 @@ def login_required(view_func):
         if not auth_header.startswith('Bearer '):
             return JsonResponse({'detail': 'Unauthorized'}, status=401)  # 未授权
         token = auth_header.split(' ')[1]  # 获取Token
-        payload = decode_jwt_token(token)  # 解码Token
+        if getattr(request, 'jwt_token', None) == token:
+            # ParsingJWTAuthMiddleware 已解析过同一 token, 不再重复校验和查询用户
+            payload = request.jwt_payload
+            user = request.user if payload and request.user.is_authenticated else None
+        else:
+            payload = decode_jwt_token(token)  # 解码Token
+            user = user_cache.get(payload['user_id']) if payload else None
         if not payload:
             return JsonResponse({'detail': 'Token is invalid or expired'}, status=401)  # Token无效或过期
-        try:
-            user = User.objects.get(id=payload['user_id'])  # 获取用户对象
-        except User.DoesNotExist:
+        if user is None:
             return JsonResponse({'detail': 'User not found'}, status=401)  # 用户不存在
         request.user = user  # 将用户对象附加到请求
         return view_func(request, *args, **kwargs)  # 调用原视图函数
@@ -14,19 +14,20 @@ from django.http import JsonResponse, RawPostDataException
 from django.forms import model_to_dict
 from django.conf import settings
 
-from apps.user.user_permissions import UserAction
 from apps.user.utils import generate_jwt_token
 from apps.user.models import User
 from constants.code import Code
 from utils import restful
 from utils.api_exception import ApiError
 from utils.decorators import permit
+from utils.query_budget import QueryBudget, query_budget
 from utils.types import Request
 from utils.views import FilterApiView
 
 
 # Create your views here.
 class UserRegisterView(View):
+    @query_budget(queries=2)
     def post(self, request):
         """注册账号"""
         data = json.loads(request.body)
@@ -45,6 +46,7 @@ class UserRegisterView(View):
 
 
 class UserLoginView(View):
+    @query_budget(queries=1)
     def post(self, request):
         """登录"""
         data = json.loads(request.body)
@@ -63,6 +65,9 @@ class UserLoginView(View):
 
 
 class UserListView(FilterApiView):
+    Model = User
+    # 当前用户(未命中缓存时)、总数、当前页
+    query_budget = QueryBudget(queries=3, duplicates=0)
 
     def __init__(self, **kwargs: typing.Any):
         super().__init__()
@@ -85,6 +90,3 @@ class UserListView(FilterApiView):
 
     def serialization(self, object_list) -> list:
         return [model_to_dict(user, exclude=self.exclude) for user in object_list]
-
-    def get_init_queryset(self):
-        return UserAction(self.user).get_user_sheet_queryset()
@@ -0,0 +1,9 @@
+"""
+性能基准
+
+每个模块都可以直接运行, 例如::
+
+    python -m benchmarks.serialization
+
+数据库使用 benchmarks.settings 中的 SQLite(默认内存库), 可用环境变量 BENCHMARK_DB 指定文件.
+"""
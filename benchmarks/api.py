@@ -0,0 +1,180 @@
+"""
+API 端到端基准
+
+用 django.test.Client 在进程内经过完整的中间件、URL 解析和视图发送请求, 覆盖注册、登录、用户列表、
+采购记录列表和采购支出统计. 每个场景先预热, 再逐个发送请求并读完响应内容:
+
+* rps: 每秒请求数
+* p50_ms / p95_ms / p99_ms: 单个请求耗时的分位数
+* queries / duplicates / sql_ms: 平均每个请求执行的 SQL 条数、重复语句数和 SQL 耗时,
+  取自 utils.query_budget.QueryBudgetMiddleware 记录的 request.query_stats
+
+数据库为空时用 apps.materials.synthetic 生成采购记录; 设置 BENCHMARK_DB 指向 benchmarks.fixture
+生成的数据库时直接使用其中的数据. 设置 BENCHMARK_JSON 输出 JSON, 便于比较不同提交.
+
+注册和登录要计算密码哈希, 单个请求耗时长, 只发送 1/20 的请求.
+
+    python -m benchmarks.api [采购记录数] [每个场景的请求数]
+"""
+import itertools
+import statistics
+import sys
+import time
+import typing
+
+from benchmarks.base import report, setup_django
+
+setup_django()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.http import HttpResponse  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from apps.materials import rollups  # noqa: E402
+from apps.materials.models import PurchaseRecord  # noqa: E402
+from apps.materials.synthetic import SyntheticData, generate  # noqa: E402
+from apps.user.models import User  # noqa: E402
+from apps.user.utils import generate_jwt_token  # noqa: E402
+
+PASSWORD = "Bench654321"
+# 固定账号, 其余为按序号生成的客户和员工
+ADMIN_PHONE = "13900000000"
+EMPLOYEE_PHONE = "13900000001"
+
+
+class Scenario(typing.NamedTuple):
+    name: str
+    # 以客户端和请求序号发送一个请求
+    send: typing.Callable[[Client, int], HttpResponse]
+    status: int = 200
+    # 实际请求数相对于每个场景请求数的比例
+    scale: float = 1.0
+
+
+def seed(records: int, users: int = 2000) -> None:
+    if not User.objects.filter(phone=ADMIN_PHONE).exists():
+        password = make_password(PASSWORD)
+        User.objects.bulk_create(
+            [
+                User(phone=ADMIN_PHONE, password=password, level=User.LEVEL.管理员),
+                User(phone=EMPLOYEE_PHONE, password=password, level=User.LEVEL.员工),
+                *(
+                    User(phone=f"138{i:08d}", password=password, level=i % 2)
+                    for i in range(users)
+                ),
+            ],
+            batch_size=1000,
+        )
+    if not PurchaseRecord.objects.exists():
+        generate(SyntheticData(), records)
+        rollups.rebuild()
+
+
+def scenarios() -> typing.List[Scenario]:
+    admin = User.objects.get(phone=ADMIN_PHONE)
+    employee = User.objects.get(phone=EMPLOYEE_PHONE)
+    # 注册使用的手机号不能与已有账号重复, 重复运行时接着之前的序号
+    phones = (f"137{i:08d}" for i in itertools.count(User.objects.filter(phone__startswith="137").count()))
+    category = PurchaseRecord.objects.values_list("category_id", flat=True).first()
+
+    def get(path: str, user: User, **params) -> typing.Callable[[Client, int], HttpResponse]:
+        headers = {"token": generate_jwt_token(user)}
+        return lambda client, _: client.get(path, params, headers=headers)
+
+    def post(path: str, data: typing.Callable[[int], dict]) -> typing.Callable[[Client, int], HttpResponse]:
+        return lambda client, i: client.post(path, data(i), content_type="application/json")
+
+    return [
+        Scenario(
+            "register",
+            post("/api/user/register/", lambda _: {"phone": next(phones), "password": PASSWORD}),
+            status=201,
+            scale=0.05,
+        ),
+        Scenario(
+            "login",
+            post("/api/user/login/", lambda _: {"phone": EMPLOYEE_PHONE, "password": PASSWORD}),
+            scale=0.05,
+        ),
+        Scenario("users", get("/api/user/users/", admin)),
+        Scenario("users_deep_page", get("/api/user/users/", admin, page=50, page_size=30)),
+        Scenario("users_page_size_200", get("/api/user/users/", admin, page_size=200)),
+        Scenario("users_order_by_phone", get("/api/user/users/", admin, order_by="-phone,id")),
+        Scenario("users_as_employee", get("/api/user/users/", employee)),
+        Scenario("purchases", get("/api/materials/purchases/", employee)),
+        Scenario("purchases_page_size_200", get("/api/materials/purchases/", employee, page_size=200)),
+        Scenario("purchases_category", get("/api/materials/purchases/", employee, category=category)),
+        Scenario(
+            "purchases_stream_1000",
+            get("/api/materials/purchases/", employee, page_size=1000, stream=1),
+        ),
+        Scenario("analysis_month", get("/api/materials/analysis/", employee, group_by="month")),
+        Scenario(
+            "analysis_category_supplier",
+            get("/api/materials/analysis/", employee, group_by="category,supplier", order_by="-total_amount"),
+        ),
+        Scenario(
+            "analysis_day_filtered",
+            get(
+                "/api/materials/analysis/",
+                employee,
+                group_by="day",
+                category=category,
+                date_from="2023-01-01",
+                date_to="2023-03-31",
+            ),
+        ),
+    ]
+
+
+def read(response: HttpResponse) -> bytes:
+    if response.streaming:
+        return b"".join(response.streaming_content)
+    return response.content
+
+
+def measure(client: Client, scenario: Scenario, requests: int, warmup: int) -> dict:
+    for i in range(warmup):
+        read(scenario.send(client, i))
+
+    latencies = []
+    queries = duplicates = sql_time = 0
+    start = time.perf_counter()
+    for i in range(requests):
+        began = time.perf_counter()
+        response = scenario.send(client, i)
+        content = read(response)
+        latencies.append(time.perf_counter() - began)
+        if response.status_code != scenario.status:
+            raise AssertionError(f"{scenario.name}: {response.status_code} {content[:200]!r}")
+        stats = response.wsgi_request.query_stats
+        queries, duplicates, sql_time = (
+            queries + stats.count, duplicates + stats.duplicates, sql_time + stats.time_ms
+        )
+    elapsed = time.perf_counter() - start
+
+    percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": requests,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentiles[49] * 1e3, 2),
+        "p95_ms": round(percentiles[94] * 1e3, 2),
+        "p99_ms": round(percentiles[98] * 1e3, 2),
+        "queries": round(queries / requests, 2),
+        "duplicates": round(duplicates / requests, 2),
+        "sql_ms": round(sql_time / requests, 3),
+    }
+
+
+def main(records: int = 20000, requests: int = 200) -> None:
+    seed(records)
+    client = Client()
+    results = {}
+    for scenario in scenarios():
+        count = max(5, round(requests * scenario.scale))
+        results[scenario.name] = measure(client, scenario, count, warmup=min(count, 5))
+    report("API end-to-end", results)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
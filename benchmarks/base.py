@@ -0,0 +1,37 @@
+import json
+import os
+import sys
+import timeit
+import typing
+
+
+def setup_django(create_tables: bool = True) -> None:
+    """使用 benchmarks.settings 初始化 Django 并建表"""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    import django
+
+    django.setup()
+    if create_tables:
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0)
+
+
+def bench(func: typing.Callable[[], typing.Any], number: int, repeat: int = 5) -> float:
+    """返回 func 单次调用耗时(秒), 取 repeat 轮中最快的一轮"""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def report(title: str, results: typing.Dict[str, dict]) -> None:
+    """
+    打印结果; 设置环境变量 BENCHMARK_JSON 时输出 JSON 以便比较不同提交
+    """
+    if os.environ.get("BENCHMARK_JSON"):
+        json.dump({"benchmark": title, "results": results}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+    print(title)
+    for name, values in results.items():
+        line = ", ".join(f"{key}={value}" for key, value in values.items())
+        print(f"  {name}: {line}")
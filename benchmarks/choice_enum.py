@@ -0,0 +1,72 @@
+"""
+utils.ChoiceEnum 的微基准
+
+对比每次访问都经过 __getattribute__ 的旧实现(LegacyChoiceEnumMeta, 保留原样作为参照)
+与创建类时预先生成值和 choices 的 ChoiceEnumMeta, 并校验两者结果一致:
+
+* lookup_ns: 访问一次成员(如 User.LEVEL.管理员)
+* iterate_ns: 迭代一次 choices
+* attribute_ns: 访问一次非成员的类属性(如 __members__)
+
+    python -m benchmarks.choice_enum
+"""
+import typing
+from enum import Enum, EnumMeta
+
+from benchmarks.base import bench, report
+from utils import ChoiceEnum
+
+
+class LegacyChoiceEnumMeta(EnumMeta):
+    def __getattribute__(cls, name: str) -> typing.Any:
+        attr = super().__getattribute__(name)
+        if isinstance(attr, Enum):
+            return attr.value
+        return attr
+
+    def __iter__(cls):
+        if hasattr(cls, "__admin__"):
+            admin = cls.__admin__()
+            return (
+                (tag.value, admin.get(tag.name, tag.name)) for tag in super().__iter__()
+            )
+        return ((tag.value, tag.name) for tag in super().__iter__())
+
+    def iter(cls):
+        return ((tag.value, tag.name) for tag in super().__iter__())
+
+
+class LegacyChoiceEnum(Enum, metaclass=LegacyChoiceEnumMeta):
+    pass
+
+
+def define(base):
+    class LEVEL(base):
+        用户 = 0
+        员工 = 1
+        管理员 = 2
+
+        def __admin__():
+            return {"用户": "客户"}
+
+    return LEVEL
+
+
+def main(number: int = 200000) -> None:
+    results = {}
+    for name, enum in (("legacy", define(LegacyChoiceEnum)), ("current", define(ChoiceEnum))):
+        results[name] = {
+            "lookup_ns": round(bench(lambda: enum.管理员, number=number) * 1e9, 1),
+            "iterate_ns": round(bench(lambda: list(enum), number=number // 10) * 1e9, 1),
+            "attribute_ns": round(bench(lambda: enum.__members__, number=number) * 1e9, 1),
+        }
+        results[name]["_check"] = (enum.管理员, list(enum), list(enum.iter()))
+    assert results["legacy"].pop("_check") == results["current"].pop("_check")
+    results["speedup"] = {
+        key: round(results["legacy"][key] / results["current"][key], 2) for key in results["current"]
+    }
+    report("ChoiceEnum member lookup", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+生成基准测试使用的合成数据库(apps.materials.synthetic)
+
+数据写入 BENCHMARK_DB 指定的 SQLite 文件, 之后的基准设置同一个 BENCHMARK_DB 即可复用;
+同样的行数和种子总是生成同样的数据:
+
+* rows_per_s: 采购记录写入速度
+* generate_s / rollups_s: 写入采购记录和重建汇总表的耗时
+
+    BENCHMARK_DB=/tmp/bench.sqlite3 python -m benchmarks.fixture [行数] [种子]
+"""
+import os
+import sys
+import time
+
+from benchmarks.base import report, setup_django
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+from apps.materials import rollups  # noqa: E402
+from apps.materials.models import PurchaseRecord  # noqa: E402
+from apps.materials.synthetic import SyntheticData, generate  # noqa: E402
+
+
+def main(n: int = 1000000, seed: int = 0) -> None:
+    if not os.environ.get("BENCHMARK_DB"):
+        sys.exit("请用 BENCHMARK_DB 指定数据库文件")
+    if PurchaseRecord.objects.exists():
+        sys.exit(f"{os.environ['BENCHMARK_DB']} 中已有采购记录")
+    with connection.cursor() as cursor:
+        # 只用于基准的数据库, 写入中断后重新生成即可
+        cursor.execute("PRAGMA synchronous = OFF")
+        cursor.execute("PRAGMA journal_mode = MEMORY")
+
+    start = time.perf_counter()
+    created = generate(SyntheticData(seed=seed), n, chunk_size=50000)
+    generated = time.perf_counter() - start
+    start = time.perf_counter()
+    tables = rollups.rebuild()
+    rebuilt = time.perf_counter() - start
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    report(
+        "synthetic purchase records",
+        {
+            "records": {
+                "rows": created,
+                "seed": seed,
+                "rows_per_s": round(created / generated),
+                "generate_s": round(generated, 1),
+            },
+            "rollups": {**tables, "rollups_s": round(rebuilt, 1)},
+        },
+    )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,53 @@
+"""
+请求阶段统计(utils.instrumentation)的开销
+
+* stage_ns: 一次 with stage(...) 的耗时, 分别为不在统计中的请求里(关闭时的情形)和在统计中的请求里
+* request_us: 用户列表请求的耗时, 分别为关闭统计(中间件不加载)、只输出 Server-Timing、同时汇总直方图
+
+    python -m benchmarks.instrumentation
+"""
+from benchmarks.base import bench, report, setup_django
+
+setup_django()
+
+from django.test import Client, override_settings  # noqa: E402
+
+from apps.user.models import User  # noqa: E402
+from apps.user.utils import generate_jwt_token  # noqa: E402
+from utils import instrumentation  # noqa: E402
+from utils.instrumentation import Timings, stage  # noqa: E402
+
+
+def enter_stage():
+    with stage("bench"):
+        pass
+
+
+def main(number: int = 200000) -> None:
+    results = {"stage_ns": {"off": round(bench(enter_stage, number=number) * 1e9, 1)}}
+    token = instrumentation._current.set(Timings())
+    try:
+        results["stage_ns"]["on"] = round(bench(enter_stage, number=number) * 1e9, 1)
+    finally:
+        instrumentation._current.reset(token)
+
+    User.objects.bulk_create([User(phone=f"1{i:010d}", level=i % 3) for i in range(100)])
+    admin = User.objects.create(phone="13900000000", level=User.LEVEL.管理员)
+    headers = {"token": generate_jwt_token(admin)}
+    results["request_us"] = {}
+    for name, options in (
+        ("off", {"METRICS_ENABLED": False, "SERVER_TIMING": False}),
+        ("server_timing", {"METRICS_ENABLED": False, "SERVER_TIMING": True}),
+        ("metrics", {"METRICS_ENABLED": True, "SERVER_TIMING": True}),
+    ):
+        with override_settings(**options):
+            # 中间件在创建处理器时加载, 每种设置使用新的客户端
+            client = Client()
+            results["request_us"][name] = round(
+                bench(lambda: client.get("/api/user/users/", headers=headers), number=200) * 1e6, 1
+            )
+    report("utils.instrumentation overhead", results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+utils.restful.jsonify 编码大列表的基准
+
+对比原来的做法(to_dict 在 Python 中格式化后交给 JsonResponse 的标准库编码器)与
+to_dict(raw_data=True) 保留原始值、由 utils.jsoncodec 编码时一次格式化, 并校验输出内容一致:
+
+* encode_ms: 只编码已序列化好的列表
+* total_ms: to_dict 加编码
+
+    python -m benchmarks.jsonify [行数]
+"""
+import json
+import sys
+
+from benchmarks.base import bench, report, setup_django
+
+setup_django(create_tables=False)
+
+from django.http import JsonResponse  # noqa: E402
+from django.test import override_settings  # noqa: E402
+
+from benchmarks.serialization import make_records  # noqa: E402
+from constants.code import Code  # noqa: E402
+from utils import jsoncodec, restful  # noqa: E402
+
+
+def main(n: int = 5000) -> None:
+    records = make_records(n)
+
+    def serialize(raw_data: bool) -> list:
+        return [r.to_dict(relation=True, raw_data=raw_data) for r in records]
+
+    def legacy(results: list, raw_data: bool):
+        return JsonResponse(
+            {"results": results, "code": Code.OK}, json_dumps_params={"ensure_ascii": False}
+        )
+
+    def jsonify(results: list, raw_data: bool):
+        return restful.ok(results=results, raw_data=raw_data)
+
+    expected = json.loads(legacy(serialize(False), False).content)
+    cases = {"legacy": ("json", legacy, False)}
+    for backend in ("json", "orjson") if jsoncodec.orjson is not None else ("json",):
+        cases[f"{backend}_formatted"] = (backend, jsonify, False)
+        cases[f"{backend}_raw"] = (backend, jsonify, True)
+
+    results = {}
+    for name, (backend, respond, raw_data) in cases.items():
+        payload = serialize(raw_data)
+        with override_settings(JSON_BACKEND=backend):
+            assert json.loads(respond(payload, raw_data).content) == expected, name
+            total = bench(lambda: respond(serialize(raw_data), raw_data), number=1)
+            encode = bench(lambda: respond(payload, raw_data), number=1)
+        results[name] = {
+            "rows": n,
+            "encode_ms": round(encode * 1e3, 2),
+            "total_ms": round(total * 1e3, 2),
+        }
+    for values in results.values():
+        values["encode_speedup"] = round(results["legacy"]["encode_ms"] / values["encode_ms"], 2)
+        values["total_speedup"] = round(results["legacy"]["total_ms"] / values["total_ms"], 2)
+    report("restful.jsonify large list", results)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
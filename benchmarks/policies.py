@@ -0,0 +1,54 @@
+"""
+行级权限策略(utils.policies)的基准
+
+* scope_us: policies.scope 限定一个查询集的耗时(不执行查询)
+* 列表查询: 不限定(unscoped)、策略在 SQL 中限定(scoped)、取出全部行后在 Python 中过滤(post_filter)
+
+    python -m benchmarks.policies [用户数]
+"""
+import sys
+
+from benchmarks.base import bench, report, setup_django
+
+setup_django()
+
+from apps.user.models import User  # noqa: E402
+from utils.policies import policies  # noqa: E402
+
+
+def main(n: int = 20000) -> None:
+    User.objects.bulk_create(
+        [User(phone=f"1{i:010d}", level=i % 3) for i in range(n)], batch_size=1000
+    )
+    employee = User.objects.filter(level=User.LEVEL.员工).first()
+    customer = User.objects.filter(level=User.LEVEL.用户).first()
+    queryset = User.objects.order_by("id")
+    visible = {
+        # 与 apps.user.policies 中登记的策略一致
+        "employee": lambda user: user.level < User.LEVEL.管理员,
+        "customer": lambda user: user.pk == customer.pk,
+    }
+
+    results = {}
+    for name, current in (("employee", employee), ("customer", customer)):
+        scoped = list(policies.scope(queryset, current))
+        assert scoped == [user for user in queryset if visible[name](user)]
+        results[name] = {
+            "rows": len(scoped),
+            "scope_us": round(bench(lambda: policies.scope(queryset, current), number=2000) * 1e6, 2),
+            "unscoped_ms": round(bench(lambda: list(queryset.all()), number=1, repeat=3) * 1e3, 2),
+            "scoped_ms": round(
+                bench(lambda: list(policies.scope(queryset, current)), number=1, repeat=3) * 1e3, 2
+            ),
+            "post_filter_ms": round(
+                bench(
+                    lambda: [user for user in queryset.all() if visible[name](user)], number=1, repeat=3
+                ) * 1e3,
+                2,
+            ),
+        }
+    report("utils.policies row-level scoping", results)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
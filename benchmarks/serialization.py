@@ -0,0 +1,225 @@
+"""
+ModelSerializationMixin.to_dict 序列化计划的微基准
+
+对比逐字段判断的旧实现(legacy_to_dict, 保留原样作为参照)与编译计划后的 to_dict,
+并校验两者输出完全一致.
+
+    python -m benchmarks.serialization [行数]
+"""
+import datetime
+import sys
+import typing
+from decimal import Decimal
+
+from benchmarks.base import bench, report, setup_django
+
+setup_django(create_tables=False)
+
+from django.conf import settings  # noqa: E402
+from django.contrib.contenttypes.fields import GenericForeignKey  # noqa: E402
+from django.core.exceptions import ObjectDoesNotExist  # noqa: E402
+from django.core.files import File  # noqa: E402
+from django.db import models  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from apps.materials.models import Category, PurchaseRecord, Supplier  # noqa: E402
+from utils.functions import convert_timezone  # noqa: E402
+
+
+def legacy_to_dict(
+    self,
+    fields: typing.List[str] = None,
+    exclude: typing.List[str] = None,
+    relation: bool = False,
+    relation_data: bool = None,
+    raw_data: bool = False,
+):
+    """
+    将Model对象序列化
+
+    * int, str, float, bool 等对象正常解析
+    * DateTimeField 解析为 get_datetime_format 的格式,
+    * DateField 解析为 get_date_format 格式
+    * FileField, ImageField 等解析为路径字符串
+
+    :param self: 需要序列化的对象
+    :param fields: str[] 需要序列化的字段名, 不给值时默认序列化所有字段
+    :param exclude: str[] 不需要序列化的字段名
+    :param relation: Boolean 为真时序列化关系字段
+    :param relation_data: Boolean 为假时仅序列化关系字段的 id, 默认值等于 relation
+    :param raw_data: Boolean 为真时将不再将 datetime 等特殊对象转为字符串,而提供原始对象
+    :return: dict
+    """
+    if self is None:
+        return None
+
+    result = dict()  # 返回结果
+    exclude = getattr(self, "get_exclude", lambda x: [] if x is None else x)(
+        exclude
+    )
+    relation_data = relation_data if relation_data is not None else relation
+
+    def get_all_fields():
+        if fields is None:
+            for field in self._meta.get_fields():
+                if field.name in exclude:
+                    continue
+                yield field
+        else:
+            for field_name in fields:
+                if field_name in exclude:
+                    continue
+                yield self._meta.get_field(field_name)
+
+    def if_relation(func):
+        # 仅在relation为真时才执行
+        def inline(field):
+            if not relation:
+                return None
+            return func(field)
+
+        return inline
+
+    @if_relation
+    def m2m(field):
+        if isinstance(field, models.ManyToManyRel):
+            if field.related_name is None:
+                field_name = field.name + "_set"
+            else:
+                field_name = field.related_name
+        else:
+            field_name = field.name
+
+        # 自定义规则筛选
+        query_set = self.get_qs(field_name, getattr(self, field_name))
+
+        if relation_data:
+            result[field.name] = [legacy_to_dict(each) for each in query_set]
+        else:
+            result[field.name] = [each.id for each in query_set]
+
+    @if_relation
+    def o2m(field):
+        if getattr(field, "related_name", "") == "":
+            field_name = field.name
+        elif field.related_name is None:
+            field_name = field.name + "_set"
+        else:
+            field_name = field.related_name
+
+        # 自定义规则筛选
+        query_set = self.get_qs(field_name, getattr(self, field_name))
+
+        if relation_data:
+            result[field.name] = [legacy_to_dict(each) for each in query_set]
+        else:
+            result[field.name] = [each.id for each in query_set]
+
+    @if_relation
+    def o2o(field):
+        try:
+            if relation_data:
+                result[field.name] = legacy_to_dict(getattr(self, field.name))
+            else:
+                if getattr(field, "related_name", "") == "":
+                    result[field.name] = getattr(self, f"{field.name}_id")
+                else:
+                    result[field.name] = getattr(self, field.name).id
+        except ObjectDoesNotExist:
+            result[field.name] = None
+
+    @if_relation
+    def m2o(field):
+        if relation_data:
+            result[field.name] = legacy_to_dict(getattr(self, field.name))
+        else:
+            if isinstance(field, GenericForeignKey) is False:
+                result[field.name] = getattr(self, f"{field.name}_id")
+
+    def normal(field):
+        result[field.name] = getattr(self, field.name)
+        if raw_data:
+            return
+        # 将不能直接用json解析的对象转为字符串
+        if isinstance(result[field.name], datetime.datetime):
+            result[field.name] = convert_timezone(result[field.name]).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+        elif isinstance(result[field.name], datetime.date):
+            result[field.name] = result[field.name].strftime("%Y-%m-%d")
+        elif isinstance(result[field.name], datetime.time):
+            result[field.name] = result[field.name].strftime("%H:%M")
+        elif isinstance(result[field.name], Decimal):
+            result[field.name] = str(result[field.name])
+        elif isinstance(result[field.name], (File,)):
+            filepath = str(result[field.name])
+            if filepath.startswith("http") or filepath.startswith("//"):
+                result[field.name] = filepath
+            else:
+                result[field.name] = settings.MEDIA_URL + filepath
+
+    for field in get_all_fields():
+        if field.many_to_many:
+            m2m(field)
+        elif field.one_to_many:
+            o2m(field)
+        elif field.one_to_one:
+            o2o(field)
+        elif field.many_to_one:
+            m2o(field)
+        else:
+            normal(field)
+
+    return result
+
+
+def make_records(n: int) -> typing.List[PurchaseRecord]:
+    category = Category(id=1, name="蔬菜")
+    supplier = Supplier(id=1, name="供货商")
+    now = timezone.now()
+    records = []
+    for i in range(n):
+        record = PurchaseRecord(
+            id=i + 1,
+            date=datetime.date(2024, 1, 1) + datetime.timedelta(days=i % 365),
+            category=category,
+            supplier=supplier,
+            name=f"商品{i % 50}",
+            specification="500g",
+            unit="kg",
+            quantity=Decimal("3.00"),
+            unit_price=Decimal("4.50"),
+            actual_paid=Decimal("13.00"),
+            total_amount=Decimal("13.50"),
+            created_at=now,
+            updated_at=now,
+        )
+        records.append(record)
+    return records
+
+
+def main(n: int = 2000) -> None:
+    records = make_records(n)
+    results = {}
+    cases = {
+        "default": {},
+        "relation_ids": {"relation": True, "relation_data": False},
+        "raw_data": {"raw_data": True},
+    }
+    for name, kwargs in cases.items():
+        for record in records[:50]:
+            assert legacy_to_dict(record, **kwargs) == record.to_dict(**kwargs), name
+
+        legacy = bench(lambda: [legacy_to_dict(r, **kwargs) for r in records], number=1)
+        compiled = bench(lambda: [r.to_dict(**kwargs) for r in records], number=1)
+        results[name] = {
+            "rows": n,
+            "legacy_us_per_row": round(legacy / n * 1e6, 2),
+            "compiled_us_per_row": round(compiled / n * 1e6, 2),
+            "speedup": round(legacy / compiled, 2),
+        }
+    report("ModelSerializationMixin.to_dict", results)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,12 @@
+import os
+
+from spend_analysis.settings import *  # noqa: F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('BENCHMARK_DB', ':memory:'),
+    }
+}
+
+DEBUG = False
@@ -0,0 +1,90 @@
+"""
+FilterApiView 流式列表响应的基准
+
+同一页数据分别以普通响应与流式响应(stream=1)返回, 校验内容一致并对比:
+
+* first_byte_ms: 从调用视图到得到第一块输出的耗时
+* total_ms: 输出全部内容的耗时
+* peak_kb: 期间 Python 分配内存的峰值(tracemalloc), 每一块读取后即丢弃
+
+    python -m benchmarks.streaming [行数]
+"""
+import json
+import sys
+import time
+import tracemalloc
+
+from benchmarks.base import report, setup_django
+
+setup_django()
+
+from asgiref.sync import async_to_sync  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+
+from apps.materials.models import PurchaseRecord  # noqa: E402
+from apps.materials.views import PurchaseRecordListView  # noqa: E402
+from apps.user.models import TokenUser, User  # noqa: E402
+from benchmarks.serialization import make_records  # noqa: E402
+
+
+class ListView(PurchaseRecordListView):
+    """不检查登录(请求中直接放入员工), 使用页码分页的采购记录列表, 一页取出全部数据"""
+
+    pagination_mode = "page"
+    order_by = ["date", "created_at", "id"]
+
+    async def get(self, request, *args, **kwargs):
+        return await self.list(request)
+
+
+def chunks(params: dict):
+    request = RequestFactory().get("/", params)
+    request.user = TokenUser({"user_id": 0, "level": User.LEVEL.员工})
+    response = async_to_sync(ListView.as_view())(request)
+    if response.streaming:
+        yield from response.streaming_content
+    else:
+        yield response.content
+
+
+def measure(params: dict) -> dict:
+    start = time.perf_counter()
+    first_byte = None
+    for _ in chunks(params):
+        if first_byte is None:
+            first_byte = time.perf_counter() - start
+    total = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        for _ in chunks(params):
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "first_byte_ms": round(first_byte * 1e3, 2),
+        "total_ms": round(total * 1e3, 2),
+        "peak_kb": round(peak / 1024),
+    }
+
+
+def main(n: int = 20000) -> None:
+    records = make_records(n)
+    records[0].category.save()
+    records[0].supplier.save()
+    PurchaseRecord.objects.bulk_create(records)
+
+    params = {"page_size": n}
+    expected = json.loads(b"".join(chunks(params)))
+    assert json.loads(b"".join(chunks({**params, "stream": "1"})))["results"] == expected["results"]
+
+    results = {
+        "buffered": {"rows": n, **measure(params)},
+        "streaming": {"rows": n, **measure({**params, "stream": "1"})},
+    }
+    report("FilterApiView streaming list", results)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,67 @@
+"""
+已校验 token 缓存的基准
+
+同一 token 重复请求时, 对比每次都校验签名与使用 VerifiedTokenCache 的差别:
+
+* decode: decode_jwt_token 单次调用耗时
+* requests: 经过完整中间件栈的请求吞吐量(请求/秒), 视图只读取 request.user.id
+
+    python -m benchmarks.tokens [请求数]
+"""
+import sys
+
+from benchmarks.base import bench, report, setup_django
+
+setup_django()
+
+from django.http import JsonResponse  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import path  # noqa: E402
+
+from apps.user import utils as user_utils  # noqa: E402
+from apps.user.models import User  # noqa: E402
+
+
+def whoami(request):
+    return JsonResponse({"id": request.user.id})
+
+
+urlpatterns = [path("whoami/", whoami)]
+
+
+def main(n: int = 2000) -> None:
+    user = User.objects.create(phone="13800000000")
+    token = user_utils.generate_jwt_token(user)
+    client = Client()
+    cache = user_utils.auth_tokens.cache
+    maxsize = cache.maxsize
+
+    def request():
+        response = client.get("/whoami/", HTTP_TOKEN=token)
+        assert response.status_code == 200
+
+    results = {}
+    with override_settings(ROOT_URLCONF=__name__):
+        for name, size in (("no_cache", 0), ("cache", maxsize)):
+            cache.maxsize = size
+            cache.clear()
+            assert user_utils.decode_jwt_token(token)["user_id"] == user.id
+            decode = bench(lambda: user_utils.decode_jwt_token(token), number=n)
+            per_request = bench(request, number=n, repeat=3)
+            results[name] = {
+                "decode_us": round(decode * 1e6, 2),
+                "requests_per_sec": round(1 / per_request),
+                **{key: value for key, value in cache.stats().items() if key != "maxsize"},
+            }
+    cache.maxsize = maxsize
+    results["speedup"] = {
+        "decode": round(results["no_cache"]["decode_us"] / results["cache"]["decode_us"], 2),
+        "requests": round(
+            results["cache"]["requests_per_sec"] / results["no_cache"]["requests_per_sec"], 2
+        ),
+    }
+    report("decode_jwt_token verified-token cache", results)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -37,6 +37,13 @@ class Code:
     无权编辑预订 = 100431
     无权删除预订 = 100432
 
+    分组维度不正确 = 100433
+    统计指标不正确 = 100434
+    排序字段不正确 = 100435
+    游标不正确 = 100436
+    导出格式不正确 = 100437
+    无权查看性能分析 = 100438
+    性能分析不存在 = 100439
 
     _messages = {
         OK: "success",  # 成功
@@ -74,6 +81,13 @@ class Code:
         无权创建预订: "无权创建预订",
         无权编辑预订: "无权编辑预订",
         无权删除预订: "无权删除预订",
+        分组维度不正确: "分组维度不正确",
+        统计指标不正确: "统计指标不正确",
+        排序字段不正确: "排序字段不正确",
+        游标不正确: "游标不正确",
+        导出格式不正确: "导出格式不正确",
+        无权查看性能分析: "无权查看性能分析",
+        性能分析不存在: "性能分析不存在",
     }
 
     @classmethod
@@ -37,9 +37,13 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'apps.user',
+    'apps.materials',
 ]
 
 MIDDLEWARE = [
+    'utils.instrumentation.InstrumentationMiddleware',
+    'utils.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -47,6 +51,10 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.middleware.ExceptionMiddleware',
+    'utils.middleware.RequestParsingMiddleware',
+    'apps.user.middleware.ParsingJWTAuthMiddleware',
+    'utils.profiling.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'spend_analysis.urls'
@@ -80,6 +88,68 @@ DATABASES = {
 }
 
 
+# JWT (apps.user.utils, 非对称算法时 JWT_SECRET 为私钥, 另需设置 JWT_PUBLIC_KEY)
+
+JWT_SECRET = SECRET_KEY
+
+JWT_ALGORITHM = 'HS256'
+
+JWT_EXP_DELTA_HOURS = 24
+
+# 每个进程缓存的已校验 token 数, 0 为不缓存
+
+JWT_VERIFIED_CACHE_SIZE = 4096
+
+# 为真时鉴权中间件直接使用 token 中的 user_id/level/name, 不读取用户;
+# 用户级别等修改要到旧 token 过期后才生效
+
+JWT_CLAIMS_ONLY = False
+
+# 鉴权中间件的进程内用户缓存(apps.user.cache): 最多缓存的用户数, 有效秒数(0 为不缓存)
+
+USER_CACHE_SIZE = 1024
+
+USER_CACHE_TTL = 60
+
+
+# 请求体解析(utils.middleware.RequestParsingMiddleware)
+# 请求体(multipart 除外)的最大字节数, 读取时累计超过即中止; JSON 解析后端见 utils.jsoncodec
+
+REQUEST_BODY_MAX_SIZE = 2621440
+
+JSON_BACKEND = 'auto'
+
+
+# 视图查询预算(utils.query_budget): 超出时 'log' 记录警告日志, 'raise' 抛出异常;
+# 测试中用 override_settings(QUERY_BUDGET_ACTION='raise') 或 assert_query_budget 检查
+
+QUERY_BUDGET_ACTION = 'log'
+
+
+# 请求各阶段耗时(utils.instrumentation): 汇总为直方图并由 /metrics 输出(只允许 INTERNAL_IPS 访问);
+# 在响应中加入 Server-Timing 头. 都关闭时不加载统计中间件
+
+METRICS_ENABLED = False
+
+SERVER_TIMING = DEBUG
+
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
+
+# 按请求的性能分析(utils.profiling): 管理员带 X-Profile 头的请求, 以及按比例随机抽取的请求;
+# 分析方式为 cprofile 或 sample, 结果只保留最新的 PROFILING_MAX_FILES 个. 关闭时不加载中间件
+
+PROFILING_ENABLED = False
+
+PROFILING_SAMPLE_RATE = 0.0
+
+PROFILING_MODE = 'cprofile'
+
+PROFILING_DIR = BASE_DIR / 'profiles'
+
+PROFILING_MAX_FILES = 50
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
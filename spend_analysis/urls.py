@@ -15,8 +15,16 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from django.contrib import admin
-from django.urls import path
+from django.urls import include, path
+
+from utils.instrumentation import metrics_view
+from utils.profiling import ProfileDownloadView, ProfileListView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/user/', include('apps.user.urls')),
+    path('api/materials/', include('apps.materials.urls')),
+    path('metrics', metrics_view),
+    path('api/profiles/', ProfileListView.as_view()),
+    path('api/profiles/<str:name>', ProfileDownloadView.as_view()),
 ]
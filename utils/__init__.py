@@ -1,24 +1,34 @@
-import typing
 from enum import Enum, EnumMeta
 
 
 class ChoiceEnumMeta(EnumMeta):
-    def __getattribute__(cls, name: str) -> typing.Any:
-        attr = super().__getattribute__(name)
-        if isinstance(attr, Enum):
-            return attr.value
-        return attr
+    """
+    创建枚举类时即把成员替换为它的值保存在类属性中, MyEnum.NAME 是普通的类属性查找, 直接得到值;
+    迭代使用的 choices 同时预先生成
+    """
 
-    def __iter__(cls):
-        if hasattr(cls, "__admin__"):
-            admin = cls.__admin__()
-            return (
-                (tag.value, admin.get(tag.name, tag.name)) for tag in super().__iter__()
+    def __new__(metacls, cls, bases, classdict, **kwds):
+        enum_class = super().__new__(metacls, cls, bases, classdict, **kwds)
+        # _member_map_ 包含别名, 别名同样替换为值; choices 与 Enum 的迭代一致, 只包括正式成员
+        for name, member in enum_class._member_map_.items():
+            # EnumMeta.__setattr__ 不允许给成员重新赋值
+            type.__setattr__(enum_class, name, member.value)
+        members = [enum_class._member_map_[name] for name in enum_class._member_names_]
+        enum_class._raw_choices = tuple((member.value, member.name) for member in members)
+        if hasattr(enum_class, "__admin__"):
+            admin = enum_class.__admin__()
+            enum_class._choices = tuple(
+                (member.value, admin.get(member.name, member.name)) for member in members
             )
-        return ((tag.value, tag.name) for tag in super().__iter__())
+        else:
+            enum_class._choices = enum_class._raw_choices
+        return enum_class
+
+    def __iter__(cls):
+        return iter(cls._choices)
 
     def iter(cls):
-        return ((tag.value, tag.name) for tag in super().__iter__())
+        return iter(cls._raw_choices)
 
 
 class ChoiceEnum(Enum, metaclass=ChoiceEnumMeta):
@@ -0,0 +1,163 @@
+"""
+列表接口的总数统计策略
+
+* ExactCount: 每次执行 COUNT(*)
+* CachedCount: 按过滤条件(编译后的 SQL)缓存总数, 模型 save/delete 后失效
+* EstimatedCount: 使用数据库统计信息估算总数, 估算值低于阈值时仍精确统计
+
+FilterApiView 通过类属性 count_strategy 选择策略, 返回内容中的 count_type 标明总数的类型.
+"""
+import hashlib
+import json
+import time
+import typing
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.db import DatabaseError, connections, models
+from django.db.models.signals import post_delete, post_save
+
+
+class CountResult(typing.NamedTuple):
+    value: int
+    # exact / cached / estimated
+    kind: str
+
+
+def compile_query(queryset: models.QuerySet) -> typing.Optional[typing.Tuple[str, tuple]]:
+    """编译不含排序的查询, 查询必然为空时返回 None"""
+    try:
+        return queryset.order_by().query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+
+class CountStrategy:
+    kind: str = None
+
+    def count(self, queryset: models.QuerySet) -> CountResult:
+        raise NotImplementedError()
+
+    async def acount(self, queryset: models.QuerySet) -> CountResult:
+        """count 的异步版本, 默认在线程中执行 count"""
+        return await sync_to_async(self.count)(queryset)
+
+
+class ExactCount(CountStrategy):
+    kind = "exact"
+
+    def count(self, queryset: models.QuerySet) -> CountResult:
+        return CountResult(queryset.count(), self.kind)
+
+    async def acount(self, queryset: models.QuerySet) -> CountResult:
+        return CountResult(await queryset.acount(), self.kind)
+
+
+class CachedCount(CountStrategy):
+    """
+    总数缓存
+
+    缓存键包含模型的版本号, 模型任一实例 save/delete 后版本号递增, 旧缓存随之失效.
+    QuerySet.update/bulk_create 等不发送信号的批量写入需自行调用 invalidate,
+    或依赖 timeout 过期.
+
+    总数和版本号都保存在 django.core.cache 的默认缓存中. 多进程部署时默认缓存必须是各进程共享的后端
+    (Redis、Memcached 等); 默认的 LocMemCache 每个进程各有一份, 失效只在执行写入的进程中生效,
+    其他进程在 timeout 内仍返回旧的总数.
+    """
+    kind = "cached"
+
+    def __init__(self, timeout: int = 60):
+        self.timeout = timeout
+
+    @staticmethod
+    def version_key(model: typing.Type[models.Model]) -> str:
+        return f"count:version:{model._meta.label_lower}"
+
+    @classmethod
+    def get_version(cls, model: typing.Type[models.Model]) -> int:
+        # 以时间戳作为初始版本号, 缓存中的版本号被淘汰后不会与旧的缓存键重合
+        return cache.get_or_set(cls.version_key(model), time.time_ns(), timeout=None)
+
+    @classmethod
+    def invalidate(cls, model: typing.Type[models.Model]) -> None:
+        """使模型的所有总数缓存失效"""
+        try:
+            cache.incr(cls.version_key(model))
+        except ValueError:
+            cache.set(cls.version_key(model), time.time_ns(), timeout=None)
+
+    @classmethod
+    def watch(cls, model: typing.Type[models.Model]) -> None:
+        """模型写入时自动失效, 重复调用无副作用"""
+        uid = f"count-cache:{model._meta.label_lower}"
+        post_save.connect(invalidate_on_write, sender=model, dispatch_uid=uid)
+        post_delete.connect(invalidate_on_write, sender=model, dispatch_uid=uid)
+
+    def count(self, queryset: models.QuerySet) -> CountResult:
+        compiled = compile_query(queryset)
+        if compiled is None:
+            return CountResult(0, ExactCount.kind)
+        self.watch(queryset.model)
+        sql, params = compiled
+        digest = hashlib.md5(f"{queryset.db}:{sql}:{params!r}".encode()).hexdigest()
+        key = f"count:{queryset.model._meta.label_lower}:{self.get_version(queryset.model)}:{digest}"
+        value = cache.get(key)
+        if value is None:
+            value = queryset.count()
+            cache.set(key, value, timeout=self.timeout)
+            return CountResult(value, ExactCount.kind)
+        return CountResult(value, self.kind)
+
+
+class EstimatedCount(CountStrategy):
+    """
+    使用查询计划/统计信息估算总数
+
+    * PostgreSQL: EXPLAIN 的 Plan Rows
+    * SQLite: 仅对无过滤条件的查询读取 ANALYZE 生成的 sqlite_stat1
+    无法估算或估算值小于 threshold 时执行精确统计, 此时 count_type 为 exact
+    """
+    kind = "estimated"
+
+    def __init__(self, threshold: int = 100000):
+        self.threshold = threshold
+
+    def estimate(self, queryset: models.QuerySet) -> typing.Optional[int]:
+        query = queryset.query
+        if query.distinct or query.is_sliced or query.group_by is not None:
+            return None
+        compiled = compile_query(queryset)
+        if compiled is None:
+            return 0
+        connection = connections[queryset.db]
+        try:
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    sql, params = compiled
+                    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                    plan = cursor.fetchone()[0]
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    return int(plan[0]["Plan"]["Plan Rows"])
+                if connection.vendor == "sqlite" and not query.where:
+                    cursor.execute(
+                        "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+                        [queryset.model._meta.db_table],
+                    )
+                    row = cursor.fetchone()
+                    return int(row[0].split()[0]) if row else None
+        except DatabaseError:
+            return None
+        return None
+
+    def count(self, queryset: models.QuerySet) -> CountResult:
+        estimate = self.estimate(queryset)
+        if estimate is None or estimate < self.threshold:
+            return CountResult(queryset.count(), ExactCount.kind)
+        return CountResult(estimate, self.kind)
+
+
+def invalidate_on_write(sender, **kwargs):
+    CachedCount.invalidate(sender)
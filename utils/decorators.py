@@ -2,6 +2,7 @@ from typing import Callable, Optional
 import functools
 from importlib import import_module
 
+from asgiref.sync import iscoroutinefunction
 from django.views import View
 from django.http.response import HttpResponse
 from django.urls import URLPattern, URLResolver
@@ -10,7 +11,8 @@ from django.core.exceptions import ImproperlyConfigured
 
 from apps.user.user_permissions.base_permissions import PermissionsError
 from utils import restful
-from apps.user.user_permissions import UserAction
+from utils.instrumentation import stage
+from apps.user.user_permissions import get_user_action
 from utils.types import Request
 
 
@@ -23,6 +25,7 @@ def permit(
     限制视图函数被调用.
     field: 对指定参数的检验, 若存在, 则进行权限验证
     is_view: 是否把View视图类传递到权限类里获取相关参数进行权限验证
+    权限类由 get_user_action 每个请求只构造一次, 叠加的 permit 与视图共用
     """
 
     def inner(handler: Callable) -> Callable:
@@ -45,15 +48,16 @@ def permit(
             view: View = get_view(View, *args, **kwargs)
             request: Request = view.request
             try:
-                func = getattr(UserAction(request.user), func_name)
-                if is_view and field:  # 针对某个字段并且需要传递view对象
-                    func(view) if request.DATA.get(field) else None
-                elif is_view:  # 仅需要传递view对象
-                    func(view)
-                elif field: # 仅需要针对某个字段
-                    func() if request.DATA.get(field) else None
-                else:
-                    func()
+                with stage("permit"):
+                    func = getattr(get_user_action(request), func_name)
+                    if is_view and field:  # 针对某个字段并且需要传递view对象
+                        func(view) if request.DATA.get(field) else None
+                    elif is_view:  # 仅需要传递view对象
+                        func(view)
+                    elif field: # 仅需要针对某个字段
+                        func() if request.DATA.get(field) else None
+                    else:
+                        func()
             except PermissionsError as exception:
                 return restful.forbidden(code=exception.code, message=exception.message)
             return handler(*args, **kwargs)
@@ -139,6 +143,16 @@ def decorator_include(decorators, arg, namespace=None):
 
 
 def login_required(func):
+    if iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(request, *args, **kwargs):
+            # 异步视图中读取用户不能阻塞事件循环, 取出后替换 request.user, 之后的同步代码不再查询
+            user = request.user = await request.auser()
+            if not user.is_authenticated:
+                return restful.unauthorized(message="请先登录后再请求")
+            return await func(request, *args, **kwargs)
+        return async_wrapper
+
     @functools.wraps(func)
     def wrapper(request, *args, **kwargs):
         user = request.user
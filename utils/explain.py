@@ -0,0 +1,54 @@
+"""
+执行计划检查
+
+对查询集执行 EXPLAIN, 找出全表扫描(seq_scan)和不能利用索引顺序的额外排序(filesort),
+用于确认索引覆盖了接口/后台的实际查询.
+"""
+import re
+import typing
+
+from django.db import NotSupportedError, connections, models
+
+SEQ_SCAN = "seq_scan"
+FILESORT = "filesort"
+
+# 各数据库执行计划中对应的行
+PATTERNS: typing.Dict[str, typing.Tuple[typing.Tuple[str, typing.Pattern], ...]] = {
+    "sqlite": (
+        # SCAN t USING [COVERING] INDEX i 是按索引顺序扫描, 不算全表扫描
+        (SEQ_SCAN, re.compile(r"\bSCAN (?:TABLE )?\w+(?!.*\bINDEX\b)")),
+        (FILESORT, re.compile(r"\bUSE TEMP B-TREE FOR (?:RIGHT PART OF |LAST \d+ TERMS OF )?ORDER BY")),
+    ),
+    "postgresql": (
+        (SEQ_SCAN, re.compile(r"\bSeq Scan on \w+")),
+        # Incremental Sort 只对索引已排好的前缀之后的列排序, 不算
+        (FILESORT, re.compile(r"(?<!Incremental )\bSort\s+\(")),
+    ),
+}
+
+
+class Finding(typing.NamedTuple):
+    # seq_scan / filesort
+    kind: str
+    # 执行计划中的原文
+    detail: str
+
+
+class Explained(typing.NamedTuple):
+    plan: str
+    findings: typing.List[Finding]
+
+
+def explain(queryset: models.QuerySet) -> Explained:
+    """执行 EXPLAIN 并标出全表扫描与额外排序"""
+    vendor = connections[queryset.db].vendor
+    if vendor not in PATTERNS:
+        raise NotSupportedError(f"不支持检查 {vendor} 的执行计划")
+    plan = queryset.explain()
+    findings = [
+        Finding(kind, line.strip())
+        for line in plan.splitlines()
+        for kind, pattern in PATTERNS[vendor]
+        if pattern.search(line)
+    ]
+    return Explained(plan, findings)
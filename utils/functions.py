@@ -11,6 +11,8 @@ from django.core.paginator import Page
 from django.shortcuts import _get_queryset
 from django.core.handlers.wsgi import WSGIRequest
 
+from utils.paginator import CursorPage
+
 def get_uuid4():
     return str(uuid.uuid4()).replace("-", "")
 
@@ -45,18 +47,35 @@ def filter_dict(
 
 
 def pagination(
-    request, queryset: Page, page: int, count: int, orders_count: int, params=""
+    request,
+    queryset: typing.Union[Page, CursorPage],
+    page: typing.Optional[int],
+    count: int,
+    orders_count: typing.Optional[int],
+    params="",
 ):
-    """API接口分页参数"""
+    """API接口分页参数, queryset 为 CursorPage 时生成游标链接, 此时 page 不使用"""
     _pagination = {"count": orders_count}
     url = request.build_absolute_uri().split("?")[0]
+    if isinstance(queryset, CursorPage):
+        if queryset.has_next():
+            _pagination["next"] = f"{url}?cursor={queryset.next_cursor}&page_size={count}&{params}"
+        else:
+            _pagination["next"] = False
+
+        if queryset.has_previous():
+            _pagination["previous"] = f"{url}?cursor={queryset.previous_cursor}&page_size={count}&{params}"
+        else:
+            _pagination["previous"] = False
+        return _pagination
+
     if queryset.has_next():
-        _pagination["next"] = f"{url}?p={page+1}&page_size={count}&{params}"
+        _pagination["next"] = f"{url}?page={page+1}&page_size={count}&{params}"
     else:
         _pagination["next"] = queryset.has_next()
 
     if queryset.has_previous():
-        _pagination["previous"] = f"{url}?p={page-1}&page_size={count}&{params}"
+        _pagination["previous"] = f"{url}?page={page-1}&page_size={count}&{params}"
     else:
         _pagination["previous"] = queryset.has_previous()
 
@@ -0,0 +1,228 @@
+"""
+请求各阶段耗时的统计
+
+InstrumentationMiddleware 为每个请求记录各阶段耗时, 阶段由代码中的 stage 标出:
+
+    with stage("count"):
+        total = self.count_strategy.count(queryset)
+
+目前的阶段: auth(校验 token)、user(读取当前用户)、parse(解析请求体)、permit(权限检查)、
+filter/count/page/serialize(FilterApiView.list 的过滤、统计总数、取当前页、序列化)、encode(JSON 编码)、
+db(全部 SQL, 取自 utils.query_budget 的 request.query_stats). 阶段可以嵌套, 如 permit 中首次读取用户时
+user 的耗时同时计入两者; 流式响应在返回响应之后的输出不计入.
+
+* settings.METRICS_ENABLED: 在进程内汇总为直方图, 由 metrics_view 以 Prometheus 文本格式输出;
+  多进程部署时每个进程各自统计
+* settings.SERVER_TIMING: 在响应中加入 Server-Timing 头, 浏览器开发者工具中可直接查看
+
+两者都关闭时中间件不会加载, stage 只多一次 ContextVar 读取
+"""
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+import typing
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import Http404, HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+# 直方图的桶上限, 秒
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: typing.Sequence[float] = BUCKETS):
+        self.buckets = tuple(buckets)
+        # 各桶的计数(非累计), 最后一个为 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> typing.Tuple[typing.List[int], float, int]:
+        """(累计计数, 总和, 次数)"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative, running = [], 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+class Metrics:
+    """进程内的直方图(按名称和标签区分)及缓存统计"""
+
+    HELP = {
+        "http_request_duration_seconds": "Request duration by view",
+        "http_request_stage_duration_seconds": "Time spent in each request stage",
+    }
+
+    def __init__(self):
+        self.histograms: typing.Dict[str, typing.Dict[typing.Tuple[typing.Tuple[str, str], ...], Histogram]] = {}
+        self.caches: typing.Dict[str, typing.Callable[[], typing.Dict[str, typing.Any]]] = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        key = tuple(sorted(labels.items()))
+        family = self.histograms.get(name)
+        if family is None or key not in family:
+            with self._lock:
+                family = self.histograms.setdefault(name, {})
+                family.setdefault(key, Histogram())
+        return family[key]
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        self.histogram(name, **labels).observe(value)
+
+    def register_cache(self, name: str, stats: typing.Callable[[], typing.Dict[str, typing.Any]]) -> None:
+        """
+        :param stats: 返回 hits/misses/size/maxsize 的函数, 如 UserCache.stats
+        """
+        self.caches[name] = stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self.histograms.clear()
+
+    @staticmethod
+    def format_labels(labels: typing.Iterable[typing.Tuple[str, str]]) -> str:
+        pairs = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> str:
+        """Prometheus 文本格式"""
+        lines = []
+        for name, family in sorted(self.histograms.items()):
+            lines.append(f"# HELP {name} {self.HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(family.items()):
+                cumulative, total, count = histogram.snapshot()
+                bounds = [repr(bound) for bound in histogram.buckets] + ["+Inf"]
+                for bound, value in zip(bounds, cumulative):
+                    lines.append(f"{name}_bucket{self.format_labels(key + (('le', bound),))} {value}")
+                lines.append(f"{name}_sum{self.format_labels(key)} {total}")
+                lines.append(f"{name}_count{self.format_labels(key)} {count}")
+        if self.caches:
+            stats = {name: collect() for name, collect in sorted(self.caches.items())}
+            for field, kind in (("hits", "counter"), ("misses", "counter"), ("size", "gauge"), ("maxsize", "gauge")):
+                name = f"cache_{field}_total" if kind == "counter" else f"cache_{field}"
+                lines.append(f"# TYPE {name} {kind}")
+                for cache, values in stats.items():
+                    if field in values:
+                        lines.append(f"{name}{self.format_labels([('cache', cache)])} {values[field]}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+
+class Timings:
+    """一个请求中各阶段的累计耗时(秒)"""
+
+    def __init__(self):
+        self.stages: typing.Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+
+# 当前请求的 Timings, 未启用时为 None; 异步视图中经 sync_to_async 执行的代码同样能取到
+_current: contextvars.ContextVar[typing.Optional[Timings]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+class Stage:
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str, timings: Timings):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+# 不在统计中的请求共用的空上下文
+_NOT_TIMED = contextlib.nullcontext()
+
+
+def stage(name: str) -> typing.ContextManager:
+    """把 with 块的耗时计入当前请求的 name 阶段"""
+    timings = _current.get()
+    if timings is None:
+        return _NOT_TIMED
+    return Stage(name, timings)
+
+
+class InstrumentationMiddleware(MiddlewareMixin):
+    """放在 MIDDLEWARE 的最前面, 总耗时包括其他中间件"""
+
+    def __init__(self, get_response):
+        if not (settings.METRICS_ENABLED or settings.SERVER_TIMING):
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timings = Timings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        timings = Timings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timings, time.perf_counter() - start)
+
+    @staticmethod
+    def finish(request, response, timings: Timings, total: float):
+        stats = getattr(request, "query_stats", None)
+        if stats is not None and stats.count:
+            timings.add("db", stats.time)
+        if settings.METRICS_ENABLED:
+            match = getattr(request, "resolver_match", None)
+            view = match.view_name if match is not None else "unmatched"
+            metrics.observe("http_request_duration_seconds", total, view=view, method=request.method)
+            for name, seconds in timings.stages.items():
+                metrics.observe("http_request_stage_duration_seconds", seconds, stage=name)
+        if settings.SERVER_TIMING:
+            entries = [f"{name};dur={seconds * 1e3:.3f}" for name, seconds in timings.stages.items()]
+            entries.append(f"total;dur={total * 1e3:.3f}")
+            response.headers["Server-Timing"] = ", ".join(entries)
+        return response
+
+
+def metrics_view(request):
+    """Prometheus 抓取的接口, 只允许 settings.INTERNAL_IPS 中的地址访问"""
+    if not settings.METRICS_ENABLED or request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        raise Http404()
+    return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,102 @@
+"""
+JSON 编解码后端
+
+settings.JSON_BACKEND:
+
+* "auto"(默认): 安装了 orjson 时使用 orjson, 否则使用标准库 json
+* "orjson": 使用 orjson, 未安装时报错
+* "json": 使用标准库 json
+
+默认与 DjangoJSONEncoder 的输出一致(datetime 为 ISO 8601, time 保留秒等), 与原来的 JsonResponse 相同.
+dumps(obj, raw_data=True) 时 Decimal/date/datetime/time/文件按 ModelSerializationMixin.to_dict 的格式输出
+(见 utils.serialization), 供序列化时用 to_dict(raw_data=True) 保留原始对象的接口选用, 由编码器一次完成格式化,
+结果与 to_dict 默认输出一致.
+"""
+import json
+import typing
+from collections import UserDict, UserList
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+
+from utils.serialization import _converters, get_converter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKENDS = ("auto", "orjson", "json")
+
+
+def use_orjson() -> bool:
+    backend = getattr(settings, "JSON_BACKEND", "auto")
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(f"JSON_BACKEND 只能是 {', '.join(BACKENDS)}")
+    if backend == "orjson" and orjson is None:
+        raise ImproperlyConfigured("JSON_BACKEND 为 orjson, 但未安装 orjson")
+    return backend != "json" and orjson is not None
+
+
+def loads(data: typing.Union[bytes, str]) -> typing.Any:
+    """解析 JSON, 结果与 json.loads 一致"""
+    if use_orjson():
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            # orjson 不接受 NaN/Infinity、超出 64 位的整数等标准库可以解析的内容, 交给标准库,
+            # 真正不合法时也得到标准库的错误信息
+            pass
+    return json.loads(data)
+
+
+_django_encoder = DjangoJSONEncoder()
+
+# 内置类型的子类转为对应的内置类型. orjson 直接读取 list/dict 子类的底层存储, 而 UserList 的数据在 .data 中
+# (如表单错误 ErrorList), 会被编码为 [], 所以编码时把子类都交给 default
+_builtin_bases = ((dict, dict), (UserDict, dict), (list, list), (UserList, list), (str, str), (int, int))
+
+
+def default(obj: typing.Any) -> typing.Any:
+    """编码器无法直接处理的对象, 与 DjangoJSONEncoder 一致"""
+    for base, convert in _builtin_bases:
+        if isinstance(obj, base):
+            return convert(obj)
+    return _django_encoder.default(obj)
+
+
+def raw_data_default(obj: typing.Any) -> typing.Any:
+    """同 default, 但 Decimal/date/datetime/time/文件按 to_dict 的格式输出"""
+    try:
+        converter = _converters[obj.__class__]
+    except KeyError:
+        converter = get_converter(obj.__class__)
+    if converter is not None:
+        return converter(obj)
+    return default(obj)
+
+
+if orjson is not None:
+    # datetime 及内置类型的子类交给 default, 输出与标准库编码器一致; 允许非字符串的字典键, 与标准库一致
+    ORJSON_OPTIONS = (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_SUBCLASS | orjson.OPT_NON_STR_KEYS
+    )
+
+
+def dumps(obj: typing.Any, raw_data: bool = False) -> bytes:
+    """
+    编码为 UTF-8 的 JSON(不转义非 ASCII 字符)
+
+    :param raw_data: 为真时 Decimal/datetime 等按 to_dict 的格式输出, 用于 to_dict(raw_data=True) 的结果
+    """
+    encode_default = raw_data_default if raw_data else default
+    if use_orjson():
+        try:
+            return orjson.dumps(obj, default=encode_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # 超出 64 位的整数等 orjson 不支持的内容交给标准库
+            pass
+    return json.dumps(
+        obj, ensure_ascii=False, separators=(",", ":"), default=encode_default
+    ).encode("utf-8")
@@ -1,17 +1,123 @@
-import json
 import traceback
+import typing
+from io import BytesIO
 
+from django.conf import settings
+from django.core.exceptions import BadRequest, RequestDataTooBig
 from django.http import HttpResponseBadRequest
 from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import cached_property
 
 # from apps.user.user_permissions.base_permissions import PermissionsError
-from utils import restful
+from utils import jsoncodec, restful
+from utils.instrumentation import stage
 from utils.api_exception import ApiError
 
+# 读取请求体时每次读取的字节数
+BODY_CHUNK_SIZE = 64 * 1024
 
-class RequestParsingMiddleware(MiddlewareMixin):
+
+class RequestParsingError(BadRequest):
+    """请求体无法解析, 由 ExceptionMiddleware 转为 400 响应"""
+
+
+def read_body(request, max_size: int) -> bytes:
+    """
+    分块读取请求体, 累计超过 max_size 字节时立即中止, 不依赖 Content-Length.
+    读取后 request.body 仍可正常使用
+    """
+    if hasattr(request, "_body"):
+        if len(request._body) > max_size:
+            raise RequestDataTooBig("Request body exceeded settings.REQUEST_BODY_MAX_SIZE.")
+        return request._body
+    if int(request.META.get("CONTENT_LENGTH") or 0) > max_size:
+        raise RequestDataTooBig("Request body exceeded settings.REQUEST_BODY_MAX_SIZE.")
+
+    chunks, size = [], 0
+    while True:
+        chunk = request.read(BODY_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_size:
+            raise RequestDataTooBig("Request body exceeded settings.REQUEST_BODY_MAX_SIZE.")
+        chunks.append(chunk)
+    request._body = b"".join(chunks)
+    request._stream = BytesIO(request._body)
+    return request._body
+
+
+class ParsedRequestMixin:
+    """
+    request.JSON / request.DATA 在首次访问时才解析请求体;
+    被鉴权拒绝或根本不读取参数的请求不再付出解析的开销
+    """
+
+    @cached_property
+    def JSON(self):
+        if self.content_type != "application/json":
+            return None
+        with stage("parse"):
+            body = read_body(self, settings.REQUEST_BODY_MAX_SIZE)
+            try:
+                return jsoncodec.loads(body)
+            except ValueError as ve:
+                raise RequestParsingError("Unable to parse JSON data. Error: {0}".format(ve))
+
+    @cached_property
+    def DATA(self):
+        if self.content_type == "application/json":
+            return self.JSON
+        with stage("parse"):
+            if self.method != "GET" and not self.content_type.startswith("multipart/"):
+                # 与 JSON 相同限制请求体大小; multipart 由 Django 流式解析, 文件交给上传处理器,
+                # 其余字段受 DATA_UPLOAD_MAX_MEMORY_SIZE 限制
+                read_body(self, settings.REQUEST_BODY_MAX_SIZE)
+            if self.method not in ("GET", "POST"):
+                # if you want to know why do that,
+                # read https://abersheeran.com/articles/Django-Parse-non-POST-Request/
+                if hasattr(self, "_post"):
+                    del self._post
+                    del self._files
+
+                _shadow = self.method
+                self.method = "POST"
+                self._load_post_and_files()
+                self.method = _shadow
+            return self.POST
+
+
+# 原请求类 -> 混入 ParsedRequestMixin 后的类
+_request_classes: typing.Dict[type, type] = {}
+
+
+def parsed_request_class(cls: type) -> type:
+    try:
+        return _request_classes[cls]
+    except KeyError:
+        _request_classes[cls] = type(cls.__name__, (ParsedRequestMixin, cls), {})
+        return _request_classes[cls]
+
+
+class AsyncMiddlewareMixin(MiddlewareMixin):
+    """
+    与 MiddlewareMixin 相同, 但 ASGI 下 process_request/process_response 直接在事件循环中调用,
+    不再经 sync_to_async 转到线程执行. 只适用于这两个钩子中没有数据库查询等阻塞操作的中间件;
+    process_exception 仍由 Django 以同步方式调用
+    """
+
+    async def __acall__(self, request):
+        response = None
+        if hasattr(self, "process_request"):
+            response = self.process_request(request)
+        response = response or await self.get_response(request)
+        if hasattr(self, "process_response"):
+            response = self.process_response(request, response)
+        return response
+
+
+class RequestParsingMiddleware(AsyncMiddlewareMixin):
     def process_request(self, request):
-        request.JSON = None
         if (
             request.content_type == "application/octet-stream"
             and int(request.META.get("CONTENT_LENGTH", "0")) > 0
@@ -20,31 +126,11 @@ class RequestParsingMiddleware(MiddlewareMixin):
                 "Get content-type: application/octet-stream,"
                 + " you must change content-type."
             )
-
-        if request.content_type != "application/json":
-            if request.method not in ("GET", "POST"):
-                # if you want to know why do that,
-                # read https://abersheeran.com/articles/Django-Parse-non-POST-Request/
-                if hasattr(request, "_post"):
-                    del request._post
-                    del request._files
-
-                _shadow = request.method
-                request.method = "POST"
-                request._load_post_and_files()
-                request.method = _shadow
-            request.DATA = request.POST
-        else:
-            try:
-                request.JSON = json.loads(request.body)
-                request.DATA = request.JSON
-            except ValueError as ve:
-                return HttpResponseBadRequest(
-                    "Unable to parse JSON data. Error: {0}".format(ve)
-                )
+        if not isinstance(request, ParsedRequestMixin):
+            request.__class__ = parsed_request_class(request.__class__)
 
 
-class ExceptionMiddleware(MiddlewareMixin):
+class ExceptionMiddleware(AsyncMiddlewareMixin):
     def process_exception(self, request, exception):
         """https://zhuanlan.zhihu.com/p/55594369"""
         # traceback.print_exc()  # 打印报错
@@ -55,4 +141,6 @@ class ExceptionMiddleware(MiddlewareMixin):
         #     return restful.forbidden(exception.code, message=exception.message)
         if exception_class == ApiError:
             return restful.bad_request(exception.code, message=exception.message)
+        if exception_class == RequestParsingError:
+            return HttpResponseBadRequest(str(exception))
         raise exception
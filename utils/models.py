@@ -1,14 +1,8 @@
-import datetime
 import typing
-from decimal import Decimal
 
-from django.contrib.contenttypes.fields import GenericForeignKey
-from django.core.exceptions import ObjectDoesNotExist
-from django.conf import settings
 from django.db import models
-from django.core.files import File
 
-from .functions import convert_timezone
+from .serialization import compile_plan, serialize
 
 
 class ModelSerializationMixin:
@@ -46,124 +40,15 @@ class ModelSerializationMixin:
         if self is None:
             return None
 
-        result = dict()  # 返回结果
         exclude = getattr(self, "get_exclude", lambda x: [] if x is None else x)(
             exclude
         )
         relation_data = relation_data if relation_data is not None else relation
-
-        def get_all_fields():
-            if fields is None:
-                for field in self._meta.get_fields():
-                    if field.name in exclude:
-                        continue
-                    yield field
-            else:
-                for field_name in fields:
-                    if field_name in exclude:
-                        continue
-                    yield self._meta.get_field(field_name)
-
-        def if_relation(func):
-            # 仅在relation为真时才执行
-            def inline(field):
-                if not relation:
-                    return None
-                return func(field)
-
-            return inline
-
-        @if_relation
-        def m2m(field):
-            if isinstance(field, models.ManyToManyRel):
-                if field.related_name is None:
-                    field_name = field.name + "_set"
-                else:
-                    field_name = field.related_name
-            else:
-                field_name = field.name
-
-            # 自定义规则筛选
-            query_set = self.get_qs(field_name, getattr(self, field_name))
-
-            if relation_data:
-                result[field.name] = [self._to_dict(each) for each in query_set]
-            else:
-                result[field.name] = [each.id for each in query_set]
-
-        @if_relation
-        def o2m(field):
-            if getattr(field, "related_name", "") == "":
-                field_name = field.name
-            elif field.related_name is None:
-                field_name = field.name + "_set"
-            else:
-                field_name = field.related_name
-
-            # 自定义规则筛选
-            query_set = self.get_qs(field_name, getattr(self, field_name))
-
-            if relation_data:
-                result[field.name] = [self._to_dict(each) for each in query_set]
-            else:
-                result[field.name] = [each.id for each in query_set]
-
-        @if_relation
-        def o2o(field):
-            try:
-                if relation_data:
-                    result[field.name] = self._to_dict(getattr(self, field.name))
-                else:
-                    if getattr(field, "related_name", "") == "":
-                        result[field.name] = getattr(self, f"{field.name}_id")
-                    else:
-                        result[field.name] = getattr(self, field.name).id
-            except ObjectDoesNotExist:
-                result[field.name] = None
-
-        @if_relation
-        def m2o(field):
-            if relation_data:
-                result[field.name] = self._to_dict(getattr(self, field.name))
-            else:
-                if isinstance(field, GenericForeignKey) is False:
-                    result[field.name] = getattr(self, f"{field.name}_id")
-
-        def normal(field):
-            result[field.name] = getattr(self, field.name)
-            if raw_data:
-                return
-            # 将不能直接用json解析的对象转为字符串
-            if isinstance(result[field.name], datetime.datetime):
-                result[field.name] = convert_timezone(result[field.name]).strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                )
-            elif isinstance(result[field.name], datetime.date):
-                result[field.name] = result[field.name].strftime("%Y-%m-%d")
-            elif isinstance(result[field.name], datetime.time):
-                result[field.name] = result[field.name].strftime("%H:%M")
-            elif isinstance(result[field.name], Decimal):
-                result[field.name] = str(result[field.name])
-            elif isinstance(result[field.name], (File,)):
-                filepath = str(result[field.name])
-                if filepath.startswith("http") or filepath.startswith("//"):
-                    result[field.name] = filepath
-                else:
-                    result[field.name] = settings.MEDIA_URL + filepath
-
-        for field in get_all_fields():
-            if field.many_to_many:
-                m2m(field)
-            elif field.one_to_many:
-                o2m(field)
-            elif field.one_to_one:
-                o2o(field)
-            elif field.many_to_one:
-                m2o(field)
-            else:
-                normal(field)
-
-        return result
+        # 字段遍历与类型判断按参数编译为序列化计划并缓存, 见 utils.serialization
+        plan = compile_plan(
+            type(self), fields, exclude, relation, relation_data, raw_data
+        )
+        return serialize(self, plan)
 
     def to_dict(
         self,
@@ -5,22 +5,29 @@
 """
 import typing
 import datetime
-import traceback
 
-import jwt
-from jwt.algorithms import RSAAlgorithm
+from utils.tokens import TokenService, jwk_key
 
 ISSUER = "la_xin"  # 拉新(拉新客户)
 EXP_TIME = 1 * 24 * 60 * 60 * 60 - 1
 
 # 或许需要改成从环境变量中读取
-RSAPublicKey = RSAAlgorithm.from_jwk(
+PUBLIC_JWK = (
     '{ "kty": "RSA", "e": "AQAB", "alg": "RS256", "n": "saI0peWv6iVMZIA22DiEOM0cfZy0YUDHxN2BFqm8X1EyBkrBhS0dVRjsfg0oh_05o_TgC7QOC2UEWhC9M8wYGIiCEhfxGYJtwJjz7Ht6zTTW8FsTzD-8AwoPE9boGHgEAjaC4_GaFgfXGnVoVMztiXq81RB9_3-Uwr4LHWDeVhnHVTptu1AJ6tr-UlYZE1P8vdGl5dWI_41ReTkOGTnoccjnM6nckV6hqKtpT2e04TbPZ8GVN4MCiRQ3Z-1xFZs9DgWod81EnjvwAuwPptFZFlIGO3bau5eIka-89hGdOcchRbjoETKWHTKC-SkB41rBNCa5lO4hVm9JcBviQMC9Tw" }'
 )
-RSAPrivateKey = RSAAlgorithm.from_jwk(
+PRIVATE_JWK = (
     '{   "kty": "RSA",   "d": "L0Z-QJDKqsRWeoDtF8qi1gMwy_WCxEdbY3eYPZHbAns3lxkaO_lvzxAdEMcrvFWWm542aqb2_e1apSXDVR_CYfUiuPIKRsHBt_p9ILkUS7z-X2W99SQZQ63PqXYOu0RlvLkJSOUqHybjBrWsmLUZmvdBfmsvPWqVCudNSfpX8g3jx3BF0mkKfAc6y64NlrHrSYZEocu6o5Pq9-nZbkFSjO_8hb4DPQ2NC0alqNjgxRY4A07wDFo-tJUlbsaBUXqqTPpVPeHFFIGJMCarbvRjNPHdJyIUhMsWDCqLsgb4zrp79IczDzI9WZKA0rsdC6xJmQ2vxDXbQQZq7zEJnWw_kQ",   "e": "AQAB",   "alg": "RS256",   "n": "saI0peWv6iVMZIA22DiEOM0cfZy0YUDHxN2BFqm8X1EyBkrBhS0dVRjsfg0oh_05o_TgC7QOC2UEWhC9M8wYGIiCEhfxGYJtwJjz7Ht6zTTW8FsTzD-8AwoPE9boGHgEAjaC4_GaFgfXGnVoVMztiXq81RB9_3-Uwr4LHWDeVhnHVTptu1AJ6tr-UlYZE1P8vdGl5dWI_41ReTkOGTnoccjnM6nckV6hqKtpT2e04TbPZ8GVN4MCiRQ3Z-1xFZs9DgWod81EnjvwAuwPptFZFlIGO3bau5eIka-89hGdOcchRbjoETKWHTKC-SkB41rBNCa5lO4hVm9JcBviQMC9Tw" }'
 )
 
+# 密钥在第一次签发/校验时才解析, 导入本模块(如 utils.restful 读取 EXP_TIME)不再解析 RSA 密钥
+tokens = TokenService(
+    "RS256",
+    jwk_key(PRIVATE_JWK),
+    jwk_key(PUBLIC_JWK),
+    lifetime=datetime.timedelta(seconds=EXP_TIME),
+    audience=ISSUER,
+)
+
 
 def generate_jwt(
     mobile: typing.Optional[str]=None,
@@ -35,23 +42,14 @@ def generate_jwt(
         data["mobile"] = mobile
     else:
         data["openid"] = openid
-    data["aud"] = ISSUER
-    data["iat"] = datetime.datetime.utcnow()
-    data["exp"] = datetime.datetime.utcnow() + datetime.timedelta(seconds=EXP_TIME)
-    return jwt.encode(data, key=RSAPrivateKey, algorithm="RS256")
+    return tokens.encode(data)
 
 
 def parse_jwt(jwt_str: str) -> typing.Optional[dict]:
     """
     解析JWT对应的信息，解析失败则返回None
     """
-    try:
-        data = jwt.decode(
-            jwt_str, key=RSAPublicKey, algorithms="RS256", audience=ISSUER
-        )
-        return data
-    except jwt.PyJWTError:
-        return
+    return tokens.decode(jwt_str)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+"""
+分页器
+
+游标(keyset)分页:
+与 django.core.paginator.Paginator 的 OFFSET 分页不同, 游标记录上一页边界行的排序键,
+下一页直接用 WHERE 条件定位, 翻到多深的页都只扫描一页的数据, 也不需要 COUNT(*).
+"""
+import base64
+import binascii
+import json
+import typing
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Paginator
+from django.db import models
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from constants.code import Code
+from utils.api_exception import ApiError
+
+
+class CountedPaginator(Paginator):
+    """使用预先统计好的总数, 避免 Paginator 再执行一次 COUNT(*)"""
+
+    def __init__(self, object_list, per_page, total: int, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.total = total
+
+    @cached_property
+    def count(self) -> int:
+        return self.total
+
+
+class CursorPage:
+    """游标分页的一页, 接口与 django.core.paginator.Page 的常用部分保持一致"""
+
+    def __init__(
+        self,
+        object_list: list,
+        next_cursor: typing.Optional[str],
+        previous_cursor: typing.Optional[str],
+    ):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self) -> bool:
+        return self.next_cursor is not None
+
+    def has_previous(self) -> bool:
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """
+    游标分页器
+
+    排序字段必须是模型自身非空的字段; 若排序不含主键, 会自动追加主键以保证排序唯一.
+    游标中同时记录了排序规则, 排序规则变化后旧游标视为不合法.
+    """
+
+    NEXT = "n"
+    PREVIOUS = "p"
+
+    def __init__(
+        self,
+        queryset: models.QuerySet,
+        ordering: typing.Sequence[str],
+        per_page: int,
+    ):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = self.get_ordering(queryset.model, ordering)
+        self.fields: typing.List[typing.Tuple[models.Field, bool]] = [
+            (self.get_field(queryset.model, name.lstrip("-")), name.startswith("-"))
+            for name in self.ordering
+        ]
+
+    @staticmethod
+    def get_field(model: typing.Type[models.Model], name: str) -> models.Field:
+        if name == "pk":
+            return model._meta.pk
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        # 可以为空的字段无法用 > / < 比较定位, 翻页时会漏掉或重复 NULL 的行
+        if field is None or not field.concrete or field.is_relation or field.null:
+            raise ApiError(Code.排序字段不正确, message=Code.message(Code.排序字段不正确))
+        return field
+
+    @classmethod
+    def get_ordering(
+        cls, model: typing.Type[models.Model], ordering: typing.Sequence[str]
+    ) -> typing.List[str]:
+        """补全主键, 使排序唯一"""
+        ordering = list(ordering)
+        pk_names = {"pk", model._meta.pk.name, model._meta.pk.attname}
+        if not any(name.lstrip("-") in pk_names for name in ordering):
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append("-pk" if descending else "pk")
+        return ordering
+
+    def encode(self, obj: models.Model, direction: str) -> str:
+        values = [field.value_to_string(obj) for field, _ in self.fields]
+        data = json.dumps(
+            {"o": self.ordering, "d": direction, "v": values}, separators=(",", ":")
+        )
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode(self, cursor: str) -> typing.Tuple[str, list]:
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            if data["o"] != self.ordering or data["d"] not in (self.NEXT, self.PREVIOUS):
+                raise ValueError(cursor)
+            values = [
+                field.to_python(value)
+                for (field, _), value in zip(self.fields, data["v"], strict=True)
+            ]
+        except (ValueError, TypeError, KeyError, binascii.Error, ValidationError):
+            raise ApiError(Code.游标不正确, message=Code.message(Code.游标不正确))
+        return data["d"], values
+
+    def seek(self, values: list, backwards: bool) -> Q:
+        """
+        定位到游标之后(backwards 为真时为之前)的行:
+        (a > x) OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        """
+        condition, equal = Q(), {}
+        for (field, descending), value in zip(self.fields, values):
+            lookup = "lt" if descending != backwards else "gt"
+            condition |= Q(**equal, **{f"{field.attname}__{lookup}": value})
+            equal[field.attname] = value
+        return condition
+
+    def get_queryset(self, values: typing.Optional[list], backwards: bool) -> models.QuerySet:
+        """取一页数据的查询, 多查一行用于判断该方向上是否还有数据"""
+        ordering = self.ordering
+        if backwards:
+            ordering = [
+                name[1:] if name.startswith("-") else f"-{name}" for name in ordering
+            ]
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            # 首个排序字段的范围条件便于数据库直接使用索引
+            first, descending = self.fields[0]
+            bound = "lte" if descending != backwards else "gte"
+            queryset = queryset.filter(
+                Q(**{f"{first.attname}__{bound}": values[0]}), self.seek(values, backwards)
+            )
+        return queryset[: self.per_page + 1]
+
+    def page(self, cursor: typing.Optional[str] = None) -> CursorPage:
+        """取游标指向的一页"""
+        direction, values = self.decode(cursor) if cursor else (self.NEXT, None)
+        backwards = direction == self.PREVIOUS
+        return self.make_page(list(self.get_queryset(values, backwards)), values, backwards)
+
+    async def apage(self, cursor: typing.Optional[str] = None) -> CursorPage:
+        """page 的异步版本, 使用异步 ORM 查询"""
+        direction, values = self.decode(cursor) if cursor else (self.NEXT, None)
+        backwards = direction == self.PREVIOUS
+        rows = [row async for row in self.get_queryset(values, backwards)]
+        return self.make_page(rows, values, backwards)
+
+    def make_page(self, rows: list, values: typing.Optional[list], backwards: bool) -> CursorPage:
+        """由 get_queryset 查得的行生成一页"""
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage(rows, None, None)
+        has_next = has_more if not backwards else True
+        has_previous = has_more if backwards else values is not None
+        return CursorPage(
+            rows,
+            self.encode(rows[-1], self.NEXT) if has_next else None,
+            self.encode(rows[0], self.PREVIOUS) if has_previous else None,
+        )
@@ -0,0 +1,127 @@
+"""
+行级权限策略
+
+按 (角色, 模型, 操作) 登记 Q 模板, 列表等查询在 SQL 中按当前用户限定可见范围:
+
+    policies.register(User, "view", {
+        User.LEVEL.管理员: ALL,
+        User.LEVEL.员工: Q(level__lt=User.LEVEL.管理员),
+        User.LEVEL.用户: Q(pk=CurrentUser("id")),
+    })
+    policies.scope(User.objects.all(), request.user)
+
+* 模板中用 CurrentUser("属性名") 引用当前用户的属性, 查询时才代入
+* 登记时即编译: 检查查询路径是否存在, 并区分出不引用用户的部分, 查询时原样复用, 只重建引用了用户的节点
+* 角色为用户的 level, 未登录用户没有角色; 模型登记过策略时, 未列出的角色看不到任何数据,
+  没有登记策略的模型不受限制
+
+各应用的策略在 AppConfig.ready 中导入 <app>.policies 登记.
+"""
+import typing
+
+from django.db import models
+from django.db.models import Q
+from django.db.models.sql import Query
+
+# 不限制
+ALL = Q()
+
+
+class CurrentUser:
+    """Q 模板中的占位符, 查询时替换为当前用户的属性"""
+
+    def __init__(self, attr: str):
+        self.attr = attr
+
+    def resolve(self, user) -> typing.Any:
+        return getattr(user, self.attr)
+
+    def __repr__(self):
+        return f"CurrentUser({self.attr!r})"
+
+
+class CompiledPolicy:
+    def __init__(self, model: typing.Type[models.Model], template: Q):
+        self.template = template
+        # 引用了用户的节点(id), 只有这些节点需要在查询时重建
+        self.dynamic_nodes: typing.Set[int] = set()
+        self.compile(Query(model), template)
+
+    def compile(self, query: Query, node: Q) -> bool:
+        """检查查询路径(拼写错误在启动时即报 FieldError), 记录引用了用户的节点"""
+        dynamic = False
+        for child in node.children:
+            if isinstance(child, Q):
+                dynamic = self.compile(query, child) or dynamic
+            else:
+                query.solve_lookup_type(child[0])
+                dynamic = dynamic or isinstance(child[1], CurrentUser)
+        if dynamic:
+            self.dynamic_nodes.add(id(node))
+        return dynamic
+
+    def render(self, node: Q, user) -> Q:
+        """代入用户属性, 不引用用户的子树原样复用"""
+        children = []
+        for child in node.children:
+            if isinstance(child, Q):
+                if id(child) in self.dynamic_nodes:
+                    child = self.render(child, user)
+            elif isinstance(child[1], CurrentUser):
+                child = (child[0], child[1].resolve(user))
+            children.append(child)
+        return Q(*children, _connector=node.connector, _negated=node.negated)
+
+    def q(self, user) -> Q:
+        if id(self.template) in self.dynamic_nodes:
+            return self.render(self.template, user)
+        return self.template
+
+
+def user_role(user) -> typing.Any:
+    """用户的角色, 未登录时为 None"""
+    if user is None or not user.is_authenticated:
+        return None
+    return user.level
+
+
+class PolicyRegistry:
+    def __init__(self, get_role: typing.Callable[[typing.Any], typing.Any] = user_role):
+        self.get_role = get_role
+        # (模型, 操作) -> {角色: 编译后的策略}
+        self._policies: typing.Dict[
+            typing.Tuple[typing.Type[models.Model], str], typing.Dict[typing.Any, CompiledPolicy]
+        ] = {}
+
+    def register(
+        self, model: typing.Type[models.Model], action: str, templates: typing.Mapping[typing.Any, Q]
+    ) -> None:
+        """
+        :param model: 模型
+        :param action: 操作, 如 view
+        :param templates: 角色 -> Q 模板, 未列出的角色看不到任何数据
+        """
+        self._policies[(model, action)] = {
+            role: CompiledPolicy(model, template) for role, template in templates.items()
+        }
+
+    def is_registered(self, model: typing.Type[models.Model], action: str = "view") -> bool:
+        return (model, action) in self._policies
+
+    def q(self, model: typing.Type[models.Model], user, action: str = "view") -> typing.Optional[Q]:
+        """用户对模型可见范围的条件; 没有登记策略时为 ALL, 无权查看时为 None"""
+        roles = self._policies.get((model, action))
+        if roles is None:
+            return ALL
+        policy = roles.get(self.get_role(user))
+        return None if policy is None else policy.q(user)
+
+    def scope(self, queryset: models.QuerySet, user, action: str = "view") -> models.QuerySet:
+        """按策略限定查询集"""
+        q = self.q(queryset.model, user, action)
+        if q is None:
+            return queryset.none()
+        return queryset.filter(q) if q else queryset
+
+
+policies = PolicyRegistry()
@@ -0,0 +1,303 @@
+"""
+按请求的性能分析
+
+ProfilingMiddleware 在以下情况分析单个请求从视图前的钩子到视图返回的过程:
+
+* 管理员的请求带有 X-Profile 头, 值为 cprofile 或 sample(其他值使用 settings.PROFILING_MODE);
+  非管理员的请求忽略该头
+* 按 settings.PROFILING_SAMPLE_RATE 的比例随机抽取请求
+
+两种分析方式:
+
+* cprofile: 确定性分析, 保存为 pstats 文件(.prof), 用 python -m pstats 或 snakeviz 查看
+* sample: 每 SAMPLE_INTERVAL 秒采样一次调用栈, 开销小, 保存为 speedscope 文件(.speedscope.json),
+  用 https://www.speedscope.app 查看
+
+结果保存在 settings.PROFILING_DIR, 只保留最新的 PROFILING_MAX_FILES 个文件, 文件名在响应头 X-Profile-Id 中;
+管理员通过 ProfileListView/ProfileDownloadView 列出和下载.
+每个进程同一时间只分析一个请求, 其余请求照常处理. ASGI 下只分析事件循环线程, 经 sync_to_async
+在其他线程执行的代码不在结果中, 同时在事件循环中处理的其他请求则会混入结果
+"""
+import cProfile
+import datetime
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import typing
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse
+from django.utils.decorators import method_decorator
+from django.utils.deprecation import MiddlewareMixin
+from django.views import View
+
+from apps.user.models import User
+from constants.code import Code
+from utils import restful
+from utils.decorators import login_required
+
+HEADER = "X-Profile"
+# sample 方式的采样间隔, 秒
+SAMPLE_INTERVAL = 0.001
+
+
+class CProfiler:
+    extension = "prof"
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> None:
+        self.profile.disable()
+
+    def dump(self, path: Path, name: str) -> None:
+        self.profile.dump_stats(path)
+
+
+class Sampler:
+    """在后台线程中定时读取目标线程的调用栈"""
+
+    extension = "speedscope.json"
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        # (文件, 函数名, 首行) -> 序号
+        self.frames: typing.Dict[typing.Tuple[str, str, int], int] = {}
+        self.samples: typing.List[typing.List[int]] = []
+        self.weights: typing.List[float] = []
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self.run, name="profiling-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def run(self) -> None:
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                key = (code.co_filename, code.co_name, code.co_firstlineno)
+                stack.append(self.frames.setdefault(key, len(self.frames)))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def dump(self, path: Path, name: str) -> None:
+        frames = [
+            {"name": function, "file": filename, "line": line}
+            for filename, function, line in self.frames
+        ]
+        data = {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(self.weights),
+                    "samples": self.samples,
+                    "weights": self.weights,
+                }
+            ],
+            "name": name,
+            "exporter": "spend_analysis",
+        }
+        path.write_text(json.dumps(data), encoding="utf-8")
+
+
+PROFILERS: typing.Dict[str, typing.Callable[[], typing.Any]] = {"cprofile": CProfiler, "sample": Sampler}
+
+
+class ProfileStore:
+    """本地目录中的分析结果, 只保留最新的 max_files 个"""
+
+    NAME_PATTERN = re.compile(r"^[\w.-]+$")
+
+    def __init__(self, directory: typing.Optional[Path] = None, max_files: typing.Optional[int] = None):
+        """
+        :param directory: 默认 settings.PROFILING_DIR
+        :param max_files: 默认 settings.PROFILING_MAX_FILES
+        """
+        self._directory = directory
+        self._max_files = max_files
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> Path:
+        return Path(self._directory if self._directory is not None else settings.PROFILING_DIR)
+
+    @property
+    def max_files(self) -> int:
+        return self._max_files if self._max_files is not None else settings.PROFILING_MAX_FILES
+
+    def save(self, request, profiler, elapsed: float) -> str:
+        """保存分析结果, 返回文件名"""
+        now = time.time()
+        path = re.sub(r"[^A-Za-z0-9]+", "_", request.path).strip("_")[:60] or "root"
+        name = "{}-{:03d}-{}-{}-{}-{}ms.{}".format(
+            time.strftime("%Y%m%d-%H%M%S", time.localtime(now)),
+            int(now * 1000) % 1000,
+            os.getpid(),
+            request.method,
+            path,
+            round(elapsed * 1000),
+            profiler.extension,
+        )
+        directory = self.directory
+        directory.mkdir(parents=True, exist_ok=True)
+        profiler.dump(directory / name, f"{request.method} {request.get_full_path()}")
+        self.prune()
+        return name
+
+    def files(self) -> typing.List[Path]:
+        """按时间从新到旧"""
+        directory = self.directory
+        if not directory.is_dir():
+            return []
+        return sorted(
+            (path for path in directory.iterdir() if path.is_file() and self.NAME_PATTERN.match(path.name)),
+            key=lambda path: path.name,
+            reverse=True,
+        )
+
+    def prune(self) -> None:
+        with self._lock:
+            for path in self.files()[self.max_files:]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:  # 其他进程已删除
+                    pass
+
+    def list(self) -> typing.List[dict]:
+        result = []
+        for path in self.files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            created_at = datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc)
+            result.append({"name": path.name, "size": stat.st_size, "created_at": created_at})
+        return result
+
+    def path(self, name: str) -> typing.Optional[Path]:
+        """文件名对应的路径, 不存在或文件名不合法时返回 None"""
+        if not self.NAME_PATTERN.match(name) or name.startswith("."):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+profiles = ProfileStore()
+
+# 每个进程同一时间只分析一个请求: 分析器按线程挂钩, 同一线程中不能同时运行两个
+_busy = threading.Lock()
+
+
+def is_admin(user) -> bool:
+    return bool(user is not None and user.is_authenticated and getattr(user, "level", None) == User.LEVEL.管理员)
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    """放在 MIDDLEWARE 的最后(鉴权中间件之后), 以便按 request.user 检查 X-Profile 头"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed()
+        super().__init__(get_response)
+
+    @staticmethod
+    def mode(header: typing.Optional[str], admin: bool) -> typing.Optional[str]:
+        if header and admin:
+            return header.lower() if header.lower() in PROFILERS else settings.PROFILING_MODE
+        rate = settings.PROFILING_SAMPLE_RATE
+        if rate > 0 and random.random() < rate:
+            return settings.PROFILING_MODE
+        return None
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        header = request.headers.get(HEADER)
+        mode = self.mode(header, bool(header) and is_admin(getattr(request, "user", None)))
+        if mode is None or not _busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = PROFILERS[mode]()
+            start = time.perf_counter()
+            profiler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.stop()
+            name = profiles.save(request, profiler, time.perf_counter() - start)
+        finally:
+            _busy.release()
+        response.headers["X-Profile-Id"] = name
+        return response
+
+    async def __acall__(self, request):
+        header = request.headers.get(HEADER)
+        admin = False
+        if header and hasattr(request, "auser"):
+            admin = is_admin(await request.auser())
+        mode = self.mode(header, admin)
+        if mode is None or not _busy.acquire(blocking=False):
+            return await self.get_response(request)
+        try:
+            profiler = PROFILERS[mode]()
+            start = time.perf_counter()
+            profiler.start()
+            try:
+                response = await self.get_response(request)
+            finally:
+                profiler.stop()
+            name = await sync_to_async(profiles.save)(request, profiler, time.perf_counter() - start)
+        finally:
+            _busy.release()
+        response.headers["X-Profile-Id"] = name
+        return response
+
+
+class ProfileListView(View):
+    @method_decorator(login_required)
+    def get(self, request):
+        """分析结果列表, 从新到旧; 仅管理员"""
+        if not is_admin(request.user):
+            return restful.forbidden(Code.无权查看性能分析, message=Code.message(Code.无权查看性能分析))
+        return restful.ok(results=profiles.list())
+
+
+class ProfileDownloadView(View):
+    @method_decorator(login_required)
+    def get(self, request, name: str):
+        """下载分析结果文件; 仅管理员"""
+        if not is_admin(request.user):
+            return restful.forbidden(Code.无权查看性能分析, message=Code.message(Code.无权查看性能分析))
+        path = profiles.path(name)
+        if path is None:
+            return restful.notfound(Code.性能分析不存在, message=Code.message(Code.性能分析不存在))
+        return FileResponse(path.open("rb"), as_attachment=True, filename=name)
@@ -0,0 +1,288 @@
+"""
+按视图限制每个请求的 SQL 条数、SQL 总耗时和重复语句数
+
+QueryBudgetMiddleware 记录每个请求执行的查询, 包括其他中间件中的查询; 流式响应记录到内容输出完毕.
+结果保存在 request.query_stats. 视图设置了预算且超出时, 按 settings.QUERY_BUDGET_ACTION 记录警告日志
+或抛出 QueryBudgetExceeded. 流式响应在内容输出完毕后才检查, 此时状态码和部分内容已经发出, 抛出异常只会截断响应,
+所以总是记录警告日志.
+
+预算用 query_budget 标记函数视图、视图类或视图类的处理方法, 或设置视图类的 query_budget 属性:
+
+    class UserListView(FilterApiView):
+        query_budget = QueryBudget(queries=3, duplicates=0)
+
+    @query_budget(queries=2)
+    def post(self, request): ...
+
+测试中用 assert_query_budget(response) 检查单个响应(流式响应要先读完内容),
+registered_budgets() 列出所有设置了预算的 URL, 用于逐个请求检查
+"""
+import collections
+import contextvars
+import logging
+import time
+import typing
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.urls import URLPattern, URLResolver, get_resolver
+from django.utils.deprecation import MiddlewareMixin
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class QueryBudget(typing.NamedTuple):
+    """单个请求的上限, None 为不限制"""
+    queries: typing.Optional[int] = None
+    # SQL 总耗时, 毫秒
+    time_ms: typing.Optional[float] = None
+    # 重复执行的语句数: 同一条 SQL(不计参数)每多执行一次算一条, N+1 查询表现为大量重复
+    duplicates: typing.Optional[int] = None
+
+
+class QueryStats:
+    """一个请求中执行的查询"""
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.statements: typing.Counter[str] = collections.Counter()
+
+    @property
+    def time_ms(self) -> float:
+        return self.time * 1e3
+
+    @property
+    def duplicates(self) -> int:
+        return self.count - len(self.statements)
+
+    def record(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def exceeded(self, budget: QueryBudget) -> typing.List[str]:
+        """超出预算的各项说明, 没有超出时为空"""
+        problems = []
+        if budget.queries is not None and self.count > budget.queries:
+            problems.append(f"{self.count} queries > {budget.queries}")
+        if budget.time_ms is not None and self.time_ms > budget.time_ms:
+            problems.append(f"{self.time_ms:.1f}ms > {budget.time_ms}ms")
+        if budget.duplicates is not None and self.duplicates > budget.duplicates:
+            repeated = [
+                f"{count}x {sql[:200]}" for sql, count in self.statements.most_common(3) if count > 1
+            ]
+            problems.append(
+                f"{self.duplicates} duplicates > {budget.duplicates} ({' | '.join(repeated)})"
+            )
+        return problems
+
+
+# 当前请求的 QueryStats; 异步视图中经 sync_to_async 执行的查询同样能取到
+_current: contextvars.ContextVar[typing.Optional[QueryStats]] = contextvars.ContextVar(
+    "query_stats", default=None
+)
+
+
+def _execute(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.record(execute, sql, params, many, context)
+
+
+def install(connection) -> None:
+    """为数据库连接(每个线程各有一个)加上记录查询的 execute_wrapper"""
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def _install_on_connect(sender, connection, **kwargs):
+    install(connection)
+
+
+connection_created.connect(_install_on_connect)
+
+
+def query_budget(
+    queries: typing.Optional[int] = None,
+    time_ms: typing.Optional[float] = None,
+    duplicates: typing.Optional[int] = None,
+):
+    """为函数视图、视图类或视图类的处理方法设置查询预算"""
+    budget = QueryBudget(queries, time_ms, duplicates)
+
+    def decorator(view):
+        view.query_budget = budget
+        return view
+
+    return decorator
+
+
+def get_budget(view, method: str) -> typing.Optional[QueryBudget]:
+    """
+    :param view: URL 对应的视图函数(视图类为 as_view() 的返回值)
+    :param method: 请求方法; 视图类的处理方法上的预算优先于类上的
+    """
+    view_class = getattr(view, "view_class", None)
+    if view_class is not None:
+        handler = getattr(view_class, method.lower(), None)
+        return getattr(handler, "query_budget", None) or getattr(view_class, "query_budget", None)
+    return getattr(view, "query_budget", None)
+
+
+def request_budget(request) -> typing.Optional[QueryBudget]:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return None
+    return get_budget(match.func, request.method)
+
+
+def check(request, stats: QueryStats, raise_exception: bool = False, streaming: bool = False) -> None:
+    """
+    :param raise_exception: 超出时总是抛出 QueryBudgetExceeded
+    :param streaming: 流式响应输出完毕后的检查, 超出时只记录日志(raise_exception 为真时除外)
+    """
+    budget = request_budget(request)
+    if budget is None:
+        return
+    problems = stats.exceeded(budget)
+    if not problems:
+        return
+    message = f"{request.method} {request.path}: {'; '.join(problems)}"
+    if raise_exception or (settings.QUERY_BUDGET_ACTION == "raise" and not streaming):
+        raise QueryBudgetExceeded(message)
+    logger.warning("query budget exceeded: %s", message)
+
+
+class QueryBudgetMiddleware(MiddlewareMixin):
+    """放在 MIDDLEWARE 的最前面, 以便记录其他中间件中的查询"""
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats = self.start(request)
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = self.start(request)
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, stats)
+
+    @staticmethod
+    def start(request) -> QueryStats:
+        # 模块导入前已建立的连接不会触发 connection_created
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+        request.query_stats = QueryStats()
+        return request.query_stats
+
+    def finish(self, request, response, stats: QueryStats):
+        if not response.streaming:
+            check(request, stats)
+        elif response.is_async:
+            response.streaming_content = self.arecord(request, response.streaming_content, stats)
+        else:
+            response.streaming_content = self.record(request, response.streaming_content, stats)
+        return response
+
+    @staticmethod
+    def record(request, content, stats: QueryStats):
+        """逐块输出流式响应, 生成每一块时记录查询, 全部输出后检查预算"""
+        iterator = iter(content)
+        while True:
+            token = _current.set(stats)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                _current.reset(token)
+            yield chunk
+        check(request, stats, streaming=True)
+
+    @staticmethod
+    async def arecord(request, content, stats: QueryStats):
+        iterator = aiter(content)
+        while True:
+            token = _current.set(stats)
+            try:
+                chunk = await anext(iterator)
+            except StopAsyncIteration:
+                break
+            finally:
+                _current.reset(token)
+            yield chunk
+        check(request, stats, streaming=True)
+
+
+class BudgetedRoute(typing.NamedTuple):
+    route: str
+    name: typing.Optional[str]
+    # 函数视图为 None
+    method: typing.Optional[str]
+    budget: QueryBudget
+
+
+def registered_budgets(urlconf: typing.Optional[str] = None) -> typing.List[BudgetedRoute]:
+    """URL 配置中所有设置了预算的 (路由, 请求方法)"""
+    result = []
+
+    def walk(patterns, prefix: str, namespace: typing.Optional[str]):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                inner = pattern.namespace
+                if namespace and inner:
+                    inner = f"{namespace}:{inner}"
+                walk(pattern.url_patterns, prefix + str(pattern.pattern), inner or namespace)
+                continue
+            if not isinstance(pattern, URLPattern):
+                continue
+            route = prefix + str(pattern.pattern)
+            name = pattern.name and (f"{namespace}:{pattern.name}" if namespace else pattern.name)
+            view_class = getattr(pattern.callback, "view_class", None)
+            if view_class is None:
+                budget = get_budget(pattern.callback, "GET")
+                if budget is not None:
+                    result.append(BudgetedRoute(route, name, None, budget))
+                continue
+            for method in view_class.http_method_names:
+                if method == "options" or not hasattr(view_class, method):
+                    continue
+                budget = get_budget(pattern.callback, method)
+                if budget is not None:
+                    result.append(BudgetedRoute(route, name, method.upper(), budget))
+
+    walk(get_resolver(urlconf).url_patterns, "", None)
+    return result
+
+
+def assert_query_budget(response) -> None:
+    """检查测试客户端(Client/AsyncClient)响应对应的请求是否超出其视图的预算"""
+    request = getattr(response, "wsgi_request", None) or getattr(response, "asgi_request", None)
+    if request is None:
+        raise AssertionError("只能检查测试客户端(Client/AsyncClient)返回的响应")
+    if request_budget(request) is None:
+        raise AssertionError(f"{request.method} {request.path} 没有设置查询预算")
+    stats = getattr(request, "query_stats", None)
+    if stats is None:
+        raise AssertionError(f"{request.method} {request.path} 没有查询记录, MIDDLEWARE 中需要 QueryBudgetMiddleware")
+    check(request, stats, raise_exception=True)
@@ -1,34 +1,95 @@
-from typing import Union
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, Union
 
 from django.forms import Form, ModelForm
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 
 from constants.code import Code
+from utils import jsoncodec
+from utils.instrumentation import stage
+from utils.export import BLOCK_SIZE, StreamBuffer
 from utils.myjwt import EXP_TIME
 
 
-def jsonify(code: int, body=None, *, status: int, **kwargs) -> JsonResponse:
+class FastJsonResponse(JsonResponse):
+    """与 JsonResponse 相同, 但用 utils.jsoncodec 编码, 不限定内容必须是字典"""
+
+    def __init__(self, data, raw_data: bool = False, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        with stage("encode"):
+            content = jsoncodec.dumps(data, raw_data)
+        HttpResponse.__init__(self, content=content, **kwargs)
+
+
+def jsonify(code: int, body=None, *, status: int, raw_data: bool = False, **kwargs) -> JsonResponse:
     """
     :param body: 如果不是None, 则只将此参数作为回复内容。
     :param status: HTTP状态码, 详见 https://developer.mozilla.org/zh-CN/docs/Web/HTTP/Status
+    :param raw_data: 返回内容含 to_dict(raw_data=True) 的结果时为真, Decimal/datetime 等按 to_dict 的格式输出
     :param kwargs: 将被转为字典作为返回内容
     :return:
+
+    使用 utils.jsoncodec 编码, Decimal/datetime 等可直接放入返回内容, 默认输出与 DjangoJSONEncoder 一致
     """
     kwargs["code"] = code
-    if body is None:
-        res = JsonResponse(
-            kwargs, status=status, json_dumps_params={"ensure_ascii": False}
-        )
-    else:
-        res = JsonResponse(
-            body, status=status, safe=False, json_dumps_params={"ensure_ascii": False}
-        )
+    res = FastJsonResponse(kwargs if body is None else body, raw_data, status=status)
 
     if kwargs.get("token"):
         res.set_cookie("token", kwargs.get("token"), max_age=EXP_TIME)
     return res
 
 
+def stream_results(envelope: dict, results: Iterable, raw_data: bool = False) -> Iterator[bytes]:
+    """先输出 envelope, 再逐项编码 results, 拼成 {**envelope, "results": [...]}"""
+    buffer = StreamBuffer()
+    yield stream_head(envelope)
+    separator = b""
+    for item in results:
+        buffer.write(separator)
+        buffer.write(jsoncodec.dumps(item, raw_data))
+        separator = b","
+        if buffer.size >= BLOCK_SIZE:
+            yield buffer.pop()
+    buffer.write(b"]}")
+    yield buffer.pop()
+
+
+async def astream_results(envelope: dict, results: AsyncIterable, raw_data: bool = False) -> AsyncIterator[bytes]:
+    """stream_results 的异步版本, results 为异步可迭代对象"""
+    buffer = StreamBuffer()
+    yield stream_head(envelope)
+    separator = b""
+    async for item in results:
+        buffer.write(separator)
+        buffer.write(jsoncodec.dumps(item, raw_data))
+        separator = b","
+        if buffer.size >= BLOCK_SIZE:
+            yield buffer.pop()
+    buffer.write(b"]}")
+    yield buffer.pop()
+
+
+def stream_head(envelope: dict) -> bytes:
+    # envelope 至少含有 code, 编码结果以 } 结尾
+    return jsoncodec.dumps(envelope)[:-1] + b',"results":['
+
+
+def stream_jsonify(
+    code: int, results: Union[Iterable, AsyncIterable], *, status: int, raw_data: bool = False, **kwargs
+) -> StreamingHttpResponse:
+    """
+    流式返回列表, 内容与 jsonify(code, status=status, results=list(results), **kwargs) 相同:
+    先输出 kwargs, results 在输出时才迭代, 逐项编码, 内存占用与 results 的长度无关.
+    results 为异步可迭代对象时以异步方式输出, 用于 ASGI.
+
+    开始输出后不能再修改状态码, results 迭代出错时客户端只能得到不完整的 JSON
+    """
+    kwargs["code"] = code
+    stream = astream_results if hasattr(results, "__aiter__") else stream_results
+    return StreamingHttpResponse(
+        stream(kwargs, results, raw_data), status=status, content_type="application/json"
+    )
+
+
 def ok(body=None, **kwargs) -> JsonResponse:
     """
     everything be ok!
@@ -36,6 +97,13 @@ def ok(body=None, **kwargs) -> JsonResponse:
     return jsonify(Code.OK, body, status=200, **kwargs)
 
 
+def stream_ok(results: Union[Iterable, AsyncIterable], **kwargs) -> StreamingHttpResponse:
+    """
+    everything be ok! 流式返回 results
+    """
+    return stream_jsonify(Code.OK, results, status=200, **kwargs)
+
+
 def created(body=None, **kwargs) -> JsonResponse:
     """
     创建资源成功
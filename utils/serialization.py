@@ -0,0 +1,290 @@
+"""
+ModelSerializationMixin 的序列化计划
+
+同一模型在相同参数(fields, exclude, relation, relation_data, raw_data)下要序列化的字段、
+每个字段的取值方式都是固定的, 因此只在第一次序列化时遍历 _meta 生成一份
+[(键名, 取值函数), ...] 的计划并缓存, 之后每一行只需依次调用取值函数.
+"""
+import datetime
+import operator
+import typing
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.files import File
+from django.db import models
+
+from .functions import convert_timezone
+
+Getter = typing.Callable[[typing.Any], typing.Any]
+Plan = typing.Tuple[typing.Tuple[str, Getter], ...]
+
+
+# strftime 较慢, 四位数年份时改用等价的格式化; 更早的年份各平台补零规则不一, 仍用 strftime
+def _datetime(value: datetime.datetime) -> str:
+    value = convert_timezone(value)
+    if value.year < 1000:
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return "%04d-%02d-%02d %02d:%02d:%02d" % (
+        value.year, value.month, value.day, value.hour, value.minute, value.second
+    )
+
+
+def _date(value: datetime.date) -> str:
+    if value.year < 1000:
+        return value.strftime("%Y-%m-%d")
+    return value.isoformat()
+
+
+def _time(value: datetime.time) -> str:
+    return "%02d:%02d" % (value.hour, value.minute)
+
+
+def _file(value: File) -> str:
+    filepath = str(value)
+    if filepath.startswith("http") or filepath.startswith("//"):
+        return filepath
+    return settings.MEDIA_URL + filepath
+
+
+# 按值的类型缓存转换函数, None 表示原样返回; 判断顺序与 isinstance 链一致
+_converters: typing.Dict[type, typing.Optional[typing.Callable]] = {}
+
+
+def get_converter(cls: type) -> typing.Optional[typing.Callable]:
+    """将不能直接用json解析的对象转为字符串的函数"""
+    try:
+        return _converters[cls]
+    except KeyError:
+        pass
+    if issubclass(cls, datetime.datetime):
+        converter = _datetime
+    elif issubclass(cls, datetime.date):
+        converter = _date
+    elif issubclass(cls, datetime.time):
+        converter = _time
+    elif issubclass(cls, Decimal):
+        converter = str
+    elif issubclass(cls, File):
+        converter = _file
+    else:
+        converter = None
+    _converters[cls] = converter
+    return converter
+
+
+def normal_getter(name: str, raw_data: bool) -> Getter:
+    get = operator.attrgetter(name)
+    if raw_data:
+        return get
+
+    def getter(obj):
+        value = get(obj)
+        try:
+            converter = _converters[value.__class__]
+        except KeyError:
+            converter = get_converter(value.__class__)
+        return value if converter is None else converter(value)
+
+    return getter
+
+
+def related_set_name(field) -> str:
+    """反向/多对多关系在实例上的属性名"""
+    if isinstance(field, models.ManyToManyRel):
+        return field.name + "_set" if field.related_name is None else field.related_name
+    if field.many_to_many:
+        return field.name
+    if getattr(field, "related_name", "") == "":
+        return field.name
+    if field.related_name is None:
+        return field.name + "_set"
+    return field.related_name
+
+
+def many_getter(field, relation_data: bool) -> Getter:
+    """多对多/一对多关系"""
+    field_name = related_set_name(field)
+
+    def getter(obj):
+        # 自定义规则筛选
+        query_set = obj.get_qs(field_name, getattr(obj, field_name))
+        if relation_data:
+            return [obj._to_dict(each) for each in query_set]
+        return [each.id for each in query_set]
+
+    return getter
+
+
+def one_to_one_getter(field, relation_data: bool) -> Getter:
+    name = field.name
+    forward = getattr(field, "related_name", "") == ""
+
+    def getter(obj):
+        try:
+            if relation_data:
+                return obj._to_dict(getattr(obj, name))
+            if forward:
+                return getattr(obj, f"{name}_id")
+            return getattr(obj, name).id
+        except ObjectDoesNotExist:
+            return None
+
+    return getter
+
+
+def many_to_one_getter(field, relation_data: bool) -> typing.Optional[Getter]:
+    name = field.name
+    if relation_data:
+        return lambda obj: obj._to_dict(getattr(obj, name))
+    if isinstance(field, GenericForeignKey):
+        return None
+    return operator.attrgetter(f"{name}_id")
+
+
+def select_fields(
+    model: typing.Type[models.Model],
+    fields: typing.Optional[typing.Sequence[str]],
+    exclude: typing.Container[str],
+) -> list:
+    """需要序列化的字段, fields 为 None 时为模型的全部字段"""
+    if fields is None:
+        return [f for f in model._meta.get_fields() if f.name not in exclude]
+    return [model._meta.get_field(n) for n in fields if n not in exclude]
+
+
+_plans: typing.Dict[tuple, Plan] = {}
+
+
+def compile_plan(
+    model: typing.Type[models.Model],
+    fields: typing.Optional[typing.Sequence[str]],
+    exclude: typing.Iterable[str],
+    relation: bool,
+    relation_data: bool,
+    raw_data: bool,
+) -> Plan:
+    """生成(或取出缓存的)序列化计划, 输出与逐字段判断的实现完全一致"""
+    key = (
+        model,
+        None if fields is None else tuple(fields),
+        frozenset(exclude),
+        bool(relation),
+        bool(relation_data),
+        bool(raw_data),
+    )
+    try:
+        return _plans[key]
+    except KeyError:
+        pass
+
+    plan = []
+    for field in select_fields(model, fields, key[2]):
+        if field.many_to_many or field.one_to_many:
+            getter = many_getter(field, relation_data) if relation else None
+        elif field.one_to_one:
+            getter = one_to_one_getter(field, relation_data) if relation else None
+        elif field.many_to_one:
+            getter = many_to_one_getter(field, relation_data) if relation else None
+        else:
+            getter = normal_getter(field.name, raw_data)
+        if getter is not None:
+            plan.append((field.name, getter))
+
+    _plans[key] = tuple(plan)
+    return _plans[key]
+
+
+def serialize(obj, plan: Plan) -> dict:
+    return {name: getter(obj) for name, getter in plan}
+
+
+def plan_queryset(
+    queryset: models.QuerySet,
+    *,
+    fields: typing.Optional[typing.Sequence[str]] = None,
+    exclude: typing.Optional[typing.Sequence[str]] = None,
+    relation: bool = False,
+    relation_data: typing.Optional[bool] = None,
+) -> models.QuerySet:
+    """
+    按 to_dict 将要访问的字段为查询集加上 select_related/prefetch_related/only,
+    使序列化 N 行只需常数次查询
+
+    * 多对一/一对一且需要关联数据: select_related, 关联对象只取其普通字段
+    * 反向一对一: select_related (否则取 id 也要查询)
+    * 多对多/一对多: prefetch_related; 模型重写了 get_qs 时按自定义规则查询, 不预取
+    * 模型未重写 get_exclude 时, 用 only() 只查询会被序列化的列
+    """
+    from .models import ModelSerializationMixin
+
+    model = queryset.model
+    relation_data = relation_data if relation_data is not None else relation
+    default_exclude = model.get_exclude is ModelSerializationMixin.get_exclude
+    default_qs = model.get_qs is ModelSerializationMixin.get_qs
+    exclude = exclude or []
+
+    select, prefetch, columns = [], [], []
+    for field in select_fields(model, fields, exclude):
+        if field.many_to_many or field.one_to_many:
+            if relation and default_qs:
+                prefetch.append(related_set_name(field))
+        elif field.one_to_one or field.many_to_one:
+            if not relation:
+                continue
+            if isinstance(field, GenericForeignKey):
+                if relation_data:
+                    prefetch.append(field.name)
+                columns.extend([field.ct_field, field.fk_field])
+                continue
+            forward = getattr(field, "related_name", "") == ""
+            if forward:
+                columns.append(field.name)
+            if relation_data or not forward:
+                select.append(field.name)
+                columns.extend(
+                    f"{field.name}__{f.name}"
+                    for f in field.related_model._meta.concrete_fields
+                    if not f.is_relation
+                )
+        elif getattr(field, "concrete", False):
+            columns.append(field.name)
+
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    if default_exclude and (fields is not None or exclude):
+        queryset = queryset.only(*columns)
+    return queryset
+
+
+def serialize_queryset(
+    queryset: models.QuerySet,
+    *,
+    fields: typing.Optional[typing.Sequence[str]] = None,
+    exclude: typing.Optional[typing.Sequence[str]] = None,
+    relation: bool = False,
+    relation_data: typing.Optional[bool] = None,
+    raw_data: bool = False,
+) -> typing.List[dict]:
+    """序列化整个查询集, 参数与 ModelSerializationMixin.to_dict 相同"""
+    queryset = plan_queryset(
+        queryset,
+        fields=fields,
+        exclude=exclude,
+        relation=relation,
+        relation_data=relation_data,
+    )
+    return [
+        obj.to_dict(
+            fields=fields,
+            exclude=exclude,
+            relation=relation,
+            relation_data=relation_data,
+            raw_data=raw_data,
+        )
+        for obj in queryset
+    ]
@@ -0,0 +1,159 @@
+"""
+JWT 签发与校验
+
+TokenService 统一了登录 token(apps.user.utils)和第三方 token(utils.myjwt):
+
+* 算法可插拔, PyJWT 支持的 HS256/RS256/ES256 等均可
+* 密钥以函数给出, 第一次签发/校验时才加载, 导入模块时不解析密钥
+* 同一个 token 会被客户端重复发送成千上万次, 签名校验通过后把 payload 按 token 摘要缓存,
+  之后每个进程对同一 token 只需校验一次签名; 缓存命中时仍按 exp 判断是否过期, 与 jwt.decode 一致
+"""
+import datetime
+import hashlib
+import json
+import threading
+import time
+import typing
+from collections import OrderedDict
+
+import jwt
+from django.conf import settings
+from django.utils.functional import cached_property
+
+KeyLoader = typing.Callable[[], typing.Any]
+
+
+class VerifiedTokenCache:
+    """已通过签名校验的 token: 摘要 -> (payload, exp), LRU 淘汰"""
+
+    def __init__(self, maxsize: int):
+        """
+        :param maxsize: 最多缓存的 token 数, 为 0 时不缓存
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._tokens: typing.OrderedDict[bytes, typing.Tuple[dict, typing.Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        # 只保存摘要, 缓存中不留下可直接使用的 token
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> typing.Optional[dict]:
+        """取已校验的 payload(副本), 未缓存或已过期时返回 None"""
+        key = self.digest(token)
+        with self._lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                payload, exp = entry
+                # jwt.decode 在 exp <= 当前时间时判定为过期
+                if exp is None or exp > time.time():
+                    self._tokens.move_to_end(key)
+                    self.hits += 1
+                    return dict(payload)
+                del self._tokens[key]
+            self.misses += 1
+        return None
+
+    def set(self, token: str, payload: dict) -> None:
+        """缓存签名校验通过的 payload; 校验失败的 token 不应放入"""
+        if self.maxsize <= 0:
+            return
+        exp = payload.get("exp")
+        entry = (dict(payload), float(exp) if exp is not None else None)
+        key = self.digest(token)
+        with self._lock:
+            self._tokens[key] = entry
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.maxsize:
+                self._tokens.popitem(last=False)
+
+    def clear(self) -> None:
+        """更换密钥后需要清空"""
+        with self._lock:
+            self._tokens.clear()
+            self.hits = self.misses = 0
+
+    def stats(self) -> typing.Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._tokens),
+                "maxsize": self.maxsize,
+            }
+
+
+def setting_key(name: str, fallback: typing.Optional[str] = None) -> KeyLoader:
+    """从 settings 读取密钥, 未设置 name 时读取 fallback"""
+
+    def load():
+        value = getattr(settings, name, None)
+        if value is None and fallback is not None:
+            value = getattr(settings, fallback)
+        return value
+
+    return load
+
+
+def jwk_key(data: str) -> KeyLoader:
+    """从 JWK(JSON 字符串)解析密钥"""
+    return lambda: jwt.PyJWK(json.loads(data)).key
+
+
+class TokenService:
+    def __init__(
+        self,
+        algorithm: str,
+        signing_key: KeyLoader,
+        verifying_key: typing.Optional[KeyLoader] = None,
+        *,
+        lifetime: datetime.timedelta,
+        audience: typing.Optional[str] = None,
+        cache_size: int = 1024,
+    ):
+        """
+        :param algorithm: 签名算法
+        :param signing_key: 加载签名密钥的函数
+        :param verifying_key: 加载校验密钥的函数, 对称算法时省略, 与签名密钥相同
+        :param lifetime: token 有效期
+        :param audience: 签发时写入并在校验时要求的 aud
+        :param cache_size: 缓存的已校验 token 数
+        """
+        self.algorithm = algorithm
+        self.lifetime = lifetime
+        self.audience = audience
+        self.cache = VerifiedTokenCache(cache_size)
+        self._load_signing_key = signing_key
+        self._load_verifying_key = verifying_key or signing_key
+
+    @cached_property
+    def signing_key(self):
+        return self._load_signing_key()
+
+    @cached_property
+    def verifying_key(self):
+        return self._load_verifying_key()
+
+    def encode(self, claims: dict) -> str:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        payload = {**claims, "iat": now, "exp": now + self.lifetime}
+        if self.audience is not None:
+            payload["aud"] = self.audience
+        return jwt.encode(payload, self.signing_key, algorithm=self.algorithm)
+
+    def decode(self, token: str) -> typing.Optional[dict]:
+        """校验 token 并返回 payload, 签名不正确、已过期等返回 None"""
+        payload = self.cache.get(token)
+        if payload is not None:
+            return payload
+        try:
+            payload = jwt.decode(
+                token, self.verifying_key, algorithms=[self.algorithm], audience=self.audience
+            )
+        except jwt.PyJWTError:
+            return None
+        self.cache.set(token, payload)
+        return payload
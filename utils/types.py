@@ -12,6 +12,7 @@ __all__ = ["Request"]
 class Request(WSGIRequest):
     user: Union[User, AnonymousUser]
     DATA: Dict[str, Any]
+    JSON: Any
 
 
 HTTPHandler = Callable[..., HttpResponse]
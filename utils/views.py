@@ -1,13 +1,22 @@
+import itertools
 import typing
 
 from django.forms import Form
 from django.db import models
 from django.db.models import ObjectDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
 from django.http import Http404
 from django.views import View
 
+from constants.code import Code
+from utils.api_exception import ApiError
 from utils.functions import pagination
+from utils.instrumentation import stage
+from utils.counting import CountResult, CountStrategy, ExactCount
+from utils.paginator import CountedPaginator, CursorPaginator
+from utils.policies import policies
+from utils.query_budget import QueryBudget
 
 from .types import Request
 from . import restful
@@ -18,17 +27,21 @@ class PaginatorMixin:
     MAX_NUM_PER_PAGE = 10
     IGNORE_EMPTY = True
 
-    def get_paginator(self, objects, count=None, page=None, ignore=None):
+    def get_paginator(self, objects, count=None, page=None, ignore=None, total=None):
         """
         分页器, page不合法时返回第一页, page超出最大页数时返回最后一页
         :param objects:
         :param page: 指定第几页
         :param count: 指定一页最大有多少数据, 默认为 self.MAX_NUM_PER_PAG
         :param ignore: 是否忽略页码错误，True则在错误时返回最后一页信息，否则抛出一个Http404
+        :param total: 已统计好的总数, 给出时分页器不再执行 COUNT(*)
         :return: Page对象: https://docs.djangoproject.com/zh-hans/2.2/topics/pagination/
         """
         ignore = self.IGNORE_EMPTY if ignore is None else False
-        paginator = Paginator(objects, count or self.MAX_NUM_PER_PAGE)
+        if total is None:
+            paginator = Paginator(objects, count or self.MAX_NUM_PER_PAGE)
+        else:
+            paginator = CountedPaginator(objects, count or self.MAX_NUM_PER_PAGE, total)
         try:
             page = paginator.page(page)
         except PageNotAnInteger:
@@ -69,16 +82,39 @@ class FilterApiView(View, PaginatorMixin):
     QueryForm: typing.Type[Form] = None
     # 用于 list 方法中的数据排序
     order_by: typing.Sequence[str] = ["-id"]
+    # 分页方式: "page" 为页码分页; "cursor" 为游标分页, 仅在请求参数 with_count 为真时统计总数;
+    # "none" 不分页, 以流式响应返回全部数据
+    pagination_mode: str = "page"
+    # 为真时 list 以流式响应返回, 请求参数 stream 为真时也会开启
+    streaming: bool = False
+    # 流式响应时每次从数据库读取并交给 serialization 的行数
+    STREAM_CHUNK_SIZE = 500
+    # get_init_queryset 按 utils.policies 中登记的该操作的策略限定当前用户可见的数据, None 表示不限定
+    policy_action: typing.Optional[str] = "view"
+    # 总数统计策略, 见 utils.counting
+    count_strategy: CountStrategy = ExactCount()
+    # 每个请求的查询预算, 由 utils.query_budget.QueryBudgetMiddleware 检查
+    query_budget: typing.Optional[QueryBudget] = None
+    # serialization 返回 to_dict(raw_data=True) 的结果时设为真, Decimal/datetime 等由 JSON 编码器按 to_dict 的格式输出
+    raw_data: bool = False
+
+    # 生成上下页链接时不保留的请求参数
+    PAGINATION_PARAMS = ("page", "page_size", "cursor")
 
     def __init__(self, **kwargs: typing.Any):
         super().__init__(**kwargs)
         self.page_size = None
         self.page = None
+        self.cursor = None
+        self.with_count = False
 
     def dispatch(self, request: Request, *args, **kwargs):
         self.request = request
         self.page = int(request.GET.get("page", 1))
         self.page_size = int(request.GET.get("page_size", 30))
+        self.cursor = request.GET.get("cursor") or None
+        self.with_count = request.GET.get("with_count", "").lower() in ("1", "true")
+        self.streaming = self.streaming or request.GET.get("stream", "").lower() in ("1", "true")
         order_by: typing.Optional[str] = request.GET.get("order_by")
         self.order_by: list = order_by.split(",") if order_by else self.order_by
         return super().dispatch(request, *args, **kwargs)
@@ -88,41 +124,232 @@ class FilterApiView(View, PaginatorMixin):
 
     def list(self, request: Request):
         """"""
-        queryset = self.get_init_queryset()
-
-        if self.QueryForm is not None:
-            form = self.QueryForm(request.GET)
-            if form.is_valid() is False:
-                return restful.bad_request(message=form.errors)
-
-            for filter_name, filter_value in form.cleaned_data.items():
-                if filter_value in [None, ""]:  # 考虑到models.BooleanField字段, 不对boolean类型判断
-                    continue
-                if not hasattr(self, f"filter_{filter_name}"):
-                    continue
-                try:
-                    queryset = getattr(self, f"filter_{filter_name}")(
-                        filter_value, queryset
-                    )
-                except (ObjectDoesNotExist, AssertionError) as e:
-                    return restful.bad_request(message=str(e))
+        try:
+            with stage("filter"):
+                queryset = self.filter_queryset(
+                    self.get_init_queryset(), self.get_query_data(request)
+                )
+        except ApiError as e:
+            return restful.bad_request(e.code, message=e.message)
+
+        if self.pagination_mode == "cursor":
+            return self.cursor_list(queryset)
+        if self.pagination_mode == "none":
+            return self.unpaginated_list(queryset)
 
         queryset = queryset.all().order_by(*self.order_by)
+        with stage("count"):
+            total = self.count_strategy.count(queryset)
         this_page_objs = self.get_paginator(
-            queryset, count=self.page_size, page=self.page
+            queryset, count=self.page_size, page=self.page, total=total.value
         )
-        total = queryset.count()
         this_paginator = pagination(
-            self.request, this_page_objs, self.page, self.page_size, total
+            self.request, this_page_objs, self.page, self.page_size, total.value,
+            params=self.get_link_params(),
+        )
+        this_paginator["count_type"] = total.kind
+        return self.respond(this_paginator, this_page_objs.object_list)
+
+    def cursor_list(self, queryset):
+        """游标分页的 list, 深翻页不再随偏移量变慢"""
+        try:
+            paginator = CursorPaginator(queryset.all(), self.order_by, self.page_size)
+            with stage("page"):
+                this_page_objs = paginator.page(self.cursor)
+        except ApiError as e:
+            return restful.bad_request(e.code, message=e.message)
+
+        if self.with_count:
+            with stage("count"):
+                total = self.count_strategy.count(queryset)
+        else:
+            total = CountResult(None, None)
+        this_paginator = pagination(
+            self.request, this_page_objs, None, self.page_size, total.value,
+            params=self.get_link_params(),
         )
-        this_page_result = self.serialization(this_page_objs.object_list)
-        this_paginator.update({"results": this_page_result})
-        return restful.ok(**this_paginator)
+        this_paginator["count_type"] = total.kind
+        return self.respond(this_paginator, this_page_objs.object_list)
+
+    def unpaginated_list(self, queryset):
+        """不分页, 流式返回全部数据"""
+        queryset = queryset.all().order_by(*self.order_by)
+        with stage("count"):
+            total = self.count_strategy.count(queryset)
+        envelope = {"count": total.value, "next": False, "previous": False, "count_type": total.kind}
+        return restful.stream_ok(self.iter_serialization(queryset), raw_data=self.raw_data, **envelope)
+
+    def respond(self, envelope: dict, object_list):
+        """返回 envelope 及序列化后的 object_list"""
+        if self.streaming:
+            return restful.stream_ok(self.iter_serialization(object_list), raw_data=self.raw_data, **envelope)
+        if isinstance(object_list, models.QuerySet):
+            with stage("page"):
+                object_list = list(object_list)
+        with stage("serialize"):
+            envelope["results"] = self.serialization(object_list)
+        return restful.ok(raw_data=self.raw_data, **envelope)
+
+    def iter_serialization(self, object_list) -> typing.Iterator:
+        """每次取 STREAM_CHUNK_SIZE 行交给 serialization, 逐项产出; 查询集用 iterator 读取, 不缓存全部行"""
+        if isinstance(object_list, models.QuerySet):
+            object_list = object_list.iterator(chunk_size=self.STREAM_CHUNK_SIZE)
+        object_list = iter(object_list)
+        while chunk := list(itertools.islice(object_list, self.STREAM_CHUNK_SIZE)):
+            yield from self.serialization(chunk)
+
+    def get_link_params(self) -> str:
+        """上下页链接中需要保留的过滤/排序参数"""
+        params = self.request.GET.copy()
+        for name in self.PAGINATION_PARAMS:
+            params.pop(name, None)
+        return params.urlencode()
+
+    def get_query_data(self, request: Request) -> dict:
+        """用 QueryForm 校验查询参数, 参数不合法时抛出 ApiError"""
+        if self.QueryForm is None:
+            return {}
+        form = self.QueryForm(request.GET)
+        if form.is_valid() is False:
+            raise ApiError(Code.CLIENT_ERROR, message=form.errors)
+        return form.cleaned_data
+
+    def filter_queryset(self, queryset, query_data: dict):
+        """依次调用 filter_<参数名> 方法过滤查询集, 过滤失败时抛出 ApiError"""
+        for filter_name, filter_value in query_data.items():
+            if filter_value in [None, ""]:  # 考虑到models.BooleanField字段, 不对boolean类型判断
+                continue
+            if not hasattr(self, f"filter_{filter_name}"):
+                continue
+            try:
+                queryset = getattr(self, f"filter_{filter_name}")(
+                    filter_value, queryset
+                )
+            except (ObjectDoesNotExist, AssertionError) as e:
+                raise ApiError(Code.CLIENT_ERROR, message=str(e))
+        return queryset
 
     def serialization(self, object_list) -> list:
         """序列化该列表页数据"""
         raise NotImplementedError()
 
     def get_init_queryset(self):
-        """初始化查询"""
-        return self.Model.objects
+        """初始化查询, 已按行级权限策略限定"""
+        return self.scope_queryset(self.Model.objects.all())
+
+    def scope_queryset(self, queryset):
+        """按行级权限策略限定查询集, 在 SQL 中过滤"""
+        if self.policy_action is None:
+            return queryset
+        return policies.scope(queryset, getattr(self.request, "user", None), self.policy_action)
+
+
+class AsyncFilterApiView(FilterApiView):
+    """
+    FilterApiView 的异步版本, 用于 ASGI 部署: 总数、一页数据、游标翻页与流式输出都使用异步 ORM
+    (acount/异步迭代), 等待数据库时不占用请求线程. 子类的请求处理方法必须是 async def.
+
+    filter_<参数名>、get_init_queryset 和 serialization 仍是同步方法, 其中不能查询数据库,
+    关联数据应在 get_init_queryset 中用 select_related/prefetch_related 取出
+    """
+
+    async def get(self, request: Request, *args, **kwargs):
+        return await self.list(request)
+
+    async def load_user(self, request: Request) -> None:
+        """异步读取当前用户并替换 request.user, 之后的权限策略等同步代码不再查询数据库"""
+        if hasattr(request, "auser"):
+            request.user = await request.auser()
+
+    async def list(self, request: Request):
+        await self.load_user(request)
+        try:
+            with stage("filter"):
+                queryset = self.filter_queryset(
+                    self.get_init_queryset(), self.get_query_data(request)
+                )
+        except ApiError as e:
+            return restful.bad_request(e.code, message=e.message)
+
+        if self.pagination_mode == "cursor":
+            return await self.cursor_list(queryset)
+        if self.pagination_mode == "none":
+            return await self.unpaginated_list(queryset)
+
+        queryset = queryset.all().order_by(*self.order_by)
+        with stage("count"):
+            total = await self.count_strategy.acount(queryset)
+        this_page_objs = self.get_paginator(
+            queryset, count=self.page_size, page=self.page, total=total.value
+        )
+        this_paginator = pagination(
+            self.request, this_page_objs, self.page, self.page_size, total.value,
+            params=self.get_link_params(),
+        )
+        this_paginator["count_type"] = total.kind
+        return await self.respond(this_paginator, this_page_objs.object_list)
+
+    async def cursor_list(self, queryset):
+        try:
+            paginator = CursorPaginator(queryset.all(), self.order_by, self.page_size)
+            with stage("page"):
+                this_page_objs = await paginator.apage(self.cursor)
+        except ApiError as e:
+            return restful.bad_request(e.code, message=e.message)
+
+        if self.with_count:
+            with stage("count"):
+                total = await self.count_strategy.acount(queryset)
+        else:
+            total = CountResult(None, None)
+        this_paginator = pagination(
+            self.request, this_page_objs, None, self.page_size, total.value,
+            params=self.get_link_params(),
+        )
+        this_paginator["count_type"] = total.kind
+        return await self.respond(this_paginator, this_page_objs.object_list)
+
+    async def unpaginated_list(self, queryset):
+        queryset = queryset.all().order_by(*self.order_by)
+        with stage("count"):
+            total = await self.count_strategy.acount(queryset)
+        envelope = {"count": total.value, "next": False, "previous": False, "count_type": total.kind}
+        return self.stream(envelope, queryset)
+
+    async def respond(self, envelope: dict, object_list):
+        if self.streaming:
+            return self.stream(envelope, object_list)
+        if isinstance(object_list, models.QuerySet):
+            with stage("page"):
+                object_list = [obj async for obj in object_list]
+        with stage("serialize"):
+            envelope["results"] = self.serialization(object_list)
+        return restful.ok(raw_data=self.raw_data, **envelope)
+
+    def stream(self, envelope: dict, object_list):
+        """
+        流式返回. ASGI 下异步输出; WSGI 服务器只能同步迭代响应, 若给出异步迭代器 Django 会先读完全部内容,
+        因此 WSGI 下仍用同步的 iter_serialization, 在输出时查询
+        """
+        if isinstance(self.request, ASGIRequest):
+            results = self.aiter_serialization(object_list)
+        else:
+            results = self.iter_serialization(object_list)
+        return restful.stream_ok(results, raw_data=self.raw_data, **envelope)
+
+    async def aiter_serialization(self, object_list) -> typing.AsyncIterator:
+        """iter_serialization 的异步版本, 查询集用 aiterator 读取"""
+        if not isinstance(object_list, models.QuerySet):
+            for item in self.iter_serialization(object_list):
+                yield item
+            return
+        chunk = []
+        async for obj in object_list.aiterator(chunk_size=self.STREAM_CHUNK_SIZE):
+            chunk.append(obj)
+            if len(chunk) >= self.STREAM_CHUNK_SIZE:
+                for item in self.serialization(chunk):
+                    yield item
+                chunk = []
+        if chunk:
+            for item in self.serialization(chunk):
+                yield item